@@ -1,4 +1,26 @@
-from reddit_detective.network import RedditNetwork
-from reddit_detective.relationships import Comments, CommentsReplies, Submissions
+# The public classes are imported on first access (PEP 562),
+# so that "import reddit_detective" does not pay for importing praw and neo4j
+_LAZY = {
+    "RedditNetwork": "reddit_detective.network",
+    "Comments": "reddit_detective.relationships",
+    "CommentsReplies": "reddit_detective.relationships",
+    "Moderators": "reddit_detective.moderators",
+    "Submissions": "reddit_detective.relationships",
+}
+
+__all__ = ["RedditNetwork", "Comments", "CommentsReplies", "Moderators", "Submissions", "VERSION"]
 
 VERSION = "0.1.4"
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
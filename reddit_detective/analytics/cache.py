@@ -0,0 +1,131 @@
+"""
+A result cache for analytics.metrics and analytics.utils
+
+Results are keyed on the function, its arguments and the version of the graph.
+RedditNetwork bumps the version of its driver whenever it writes,
+so a cached result is used until the graph actually changes.
+
+The key holds a serial number of the driver instead of the driver itself,
+so the cache does not keep drivers (or MemoryGraphs) alive.
+
+The version lives in this process. If another process writes to the same database,
+set a ttl so that the results expire anyway:
+    configure_cache(maxsize=4096, ttl=300)
+"""
+import functools
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_versions = weakref.WeakKeyDictionary()  # Driver -> version
+_serials = weakref.WeakKeyDictionary()  # Driver -> serial number, never reused unlike id(driver)
+_next_serial = itertools.count()
+_versions_lock = threading.Lock()
+
+
+def graph_version(driver):
+    return _versions.get(driver, 0)
+
+
+def bump_graph_version(driver):
+    with _versions_lock:
+        _versions[driver] = _versions.get(driver, 0) + 1
+
+
+def _graph_key(driver):
+    with _versions_lock:
+        serial = _serials.get(driver)
+        if serial is None:
+            serial = _serials[driver] = next(_next_serial)
+        return serial, _versions.get(driver, 0)
+
+
+def _copy(value):
+    # Callers may alter the lists they get, the cached ones should stay the same
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return value
+
+
+class QueryCache:
+    """
+    LRU cache with an optional time to live (in seconds)
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return (True, value) for a hit, (False, None) for a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, _copy(value)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (_copy(value), expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = QueryCache()
+
+
+def configure_cache(maxsize=1024, ttl=None):
+    _cache.clear()
+    _cache.maxsize = maxsize
+    _cache.ttl = ttl
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def cache_info():
+    return {"hits": _cache.hits, "misses": _cache.misses, "size": len(_cache),
+            "maxsize": _cache.maxsize, "ttl": _cache.ttl}
+
+
+def cached(func):
+    """
+    Decorator for the functions taking the driver as their first argument
+    """
+    @functools.wraps(func)
+    def wrapper(driver, *args, **kwargs):
+        key = (func.__module__, func.__qualname__, _graph_key(driver), args, tuple(sorted(kwargs.items())))
+        hit, value = _cache.get(key)
+        if hit:
+            return value
+        value = func(driver, *args, **kwargs)
+        _cache.put(key, value)
+        return value
+    return wrapper
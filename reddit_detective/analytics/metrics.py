@@ -1,10 +1,15 @@
-from neo4j import BoltDriver
+from typing import TYPE_CHECKING
 
+from reddit_detective.analytics.cache import cached
 from reddit_detective.analytics.utils import (get_redditors, get_user_comments_times,
-    get_submission_comments_times, get_subreddit_comments_times)
+    get_submission_comments_times, get_subreddit_comments_times, get_materialized, get_comment_counts)
 
+if TYPE_CHECKING:
+    from neo4j import BoltDriver
 
-def interaction_score(driver: BoltDriver, username):
+
+@cached
+def interaction_score(driver: "BoltDriver", username):
     """
     For a user in the Graph, shows
         # comments received / # comments received + # comments made
@@ -17,33 +22,31 @@ def interaction_score(driver: BoltDriver, username):
 
     Score close to 1: User is a "starter"
     Score close to 0: User is a "consumer"
+
+    Reads the materialized counters of the user if there are any
+
+    driver can be a MemoryGraph too (see reddit_detective.sinks)
     """
-    s = driver.session()
-    comments_received = list(s.run("""
-MATCH (:Redditor {username: "%s"})-[:AUTHORED]-(:Submission)-[:UNDER]-(c:Comment)
-WITH c
-RETURN count(c)
-""" % username))[0][0]  # Converted Result object to integer
-    comments_made = list(s.run("""
-MATCH (:Redditor {username: "%s"})-[:AUTHORED]-(c:Comment)
-WITH c
-RETURN count(c)
-""" % username))[0][0]
+    counts = get_materialized(driver, "Redditor", "username", username, ["comments_received", "comments_made"])
+    if counts is not None:
+        return counts["comments_received"] / (counts["comments_received"] + counts["comments_made"])
+    comments_received, comments_made = get_comment_counts(driver, username)
     return comments_received / (comments_received + comments_made)
 
 
-def interaction_score_normalized(driver: BoltDriver, username):
+@cached
+def interaction_score_normalized(driver: "BoltDriver", username):
     users_score = interaction_score(driver, username)
     total_score = sum([interaction_score(driver, user) for user in get_redditors(driver)])
     return users_score / total_score
 
 
-def _cyborg_score(driver: BoltDriver, name, util_func) -> tuple:
+def _cyborg_score(driver: "BoltDriver", name, util_func, label=None, key=None, ids=True) -> tuple:
     """
     Calculates the ratio of cyborg-like comments to all comments of the user.
 
     Tuple's first element is the score, second element is a list of
-    ids of the cyborg-like comments.
+    ids of the cyborg-like comments (None with ids=False).
 
     Inspired from "Analyzing behavioral trends in community driven
     discussion platforms like Reddit"
@@ -57,22 +60,35 @@ def _cyborg_score(driver: BoltDriver, name, util_func) -> tuple:
 
     A Cyborg-like comment can also be an advertisement,
     AutoModerator post or a copy-paste.
+
+    With ids=False, if the node (label, key: name) has fresh materialized counters,
+    the score is read from them without walking paths
     """
+    if not ids and label is not None:
+        counts = get_materialized(driver, label, key, name, ["total_comments", "cyborg_comments"])
+        if counts is not None:
+            return counts["cyborg_comments"] / counts["total_comments"], None
     cyborg_comms = []
-    ids, times = util_func(driver, name)
-    for i in range(len(ids)):
+    comment_ids, times = util_func(driver, name)
+    for i in range(len(comment_ids)):
         if times[i] <= 6:
-            cyborg_comms.append(ids[i])
-    return len(cyborg_comms) / len(ids), cyborg_comms
+            cyborg_comms.append(comment_ids[i])
+    return len(cyborg_comms) / len(comment_ids), cyborg_comms if ids else None
 
 
-def cyborg_score_user(driver: BoltDriver, username):
-    return _cyborg_score(driver, username, util_func=get_user_comments_times)
+@cached
+def cyborg_score_user(driver: "BoltDriver", username, ids=True):
+    return _cyborg_score(driver, username, util_func=get_user_comments_times, label="Redditor", key="username",
+                         ids=ids)
 
 
-def cyborg_score_submission(driver: BoltDriver, submission_id):
-    return _cyborg_score(driver, submission_id, util_func=get_submission_comments_times)
+@cached
+def cyborg_score_submission(driver: "BoltDriver", submission_id, ids=True):
+    return _cyborg_score(driver, submission_id, util_func=get_submission_comments_times,
+                         label="Submission", key="id", ids=ids)
 
 
-def cyborg_score_subreddit(driver: BoltDriver, subreddit_name):
-    return _cyborg_score(driver, subreddit_name, util_func=get_subreddit_comments_times)
+@cached
+def cyborg_score_subreddit(driver: "BoltDriver", subreddit_name, ids=True):
+    return _cyborg_score(driver, subreddit_name, util_func=get_subreddit_comments_times,
+                         label="Subreddit", key="name", ids=ids)
@@ -0,0 +1,149 @@
+"""
+Which subreddits share commenters?
+
+Builds a sparse Redditor x Subreddit activity matrix
+(number of comments of the Redditor under the submissions of the Subreddit)
+and computes the overlap of every pair of subreddits with sparse matrix products,
+instead of walking Redditor-Comment-Submission-Subreddit paths pair by pair in Cypher.
+
+    Jaccard: # common commenters / # commenters of either subreddit
+    Cosine: cosine similarity of the comment count vectors of the subreddits
+
+For very large user sets, minhash=k approximates Jaccard with k hash functions:
+    exact: the product costs the sum over Redditors of (# of their subreddits)^2,
+        which grows fast when many Redditors comment in many subreddits
+    minhash: the signatures cost O(k * (R + nnz)), R Redditors and nnz Redditor-Subreddit pairs,
+        then the agreement of every pair of the S subreddits costs O(k * S^2),
+        dense over S, block_size rows at a time
+
+Needs numpy and scipy: pip install reddit_detective[analytics]
+"""
+import numpy as np
+from scipy import sparse
+
+from reddit_detective.analytics.snapshot import GraphSnapshot
+
+_METRICS = ["jaccard", "cosine"]
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_ACTIVITY = """
+MATCH (r:Redditor)-[:AUTHORED]->(:Comment)-[:UNDER]->(:Submission)-[:UNDER]->(sr:Subreddit)
+RETURN r.id AS redditor, sr.name AS subreddit, count(*) AS comments
+"""
+
+
+def activity_matrix(source):
+    """
+    Return (Redditor x Subreddit comment counts as a CSR matrix, list of subreddit names)
+
+    source is a GraphSnapshot, or a driver to aggregate the matrix in a single query
+    """
+    if isinstance(source, GraphSnapshot):
+        matrix = source.authored_comments @ source.comment_submission @ source.submission_subreddit
+        return matrix.tocsr(), list(source.names["Subreddit"])
+    redditors, subreddits = {}, {}
+    rows, cols, counts = [], [], []
+    with source.session() as s:
+        for redditor, subreddit, comments in s.run(_ACTIVITY):
+            rows.append(redditors.setdefault(redditor, len(redditors)))
+            cols.append(subreddits.setdefault(subreddit, len(subreddits)))
+            counts.append(comments)
+    matrix = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float64), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+        shape=(len(redditors), len(subreddits))
+    )
+    return matrix, list(subreddits)
+
+
+def _exact_similarity(activity, metric):
+    if metric == "jaccard":
+        binary = activity.copy()
+        binary.data[:] = 1
+        common = (binary.T @ binary).tocoo()
+        sizes = np.asarray(binary.sum(axis=0)).ravel()
+        values = common.data / (sizes[common.row] + sizes[common.col] - common.data)
+    else:
+        common = (activity.T @ activity).tocoo()
+        norms = np.sqrt(np.asarray(activity.multiply(activity).sum(axis=0)).ravel())
+        values = common.data / (norms[common.row] * norms[common.col])
+    return sparse.csr_matrix((values, (common.row, common.col)), shape=common.shape)
+
+
+def minhash_signatures(activity, num_hashes=128, seed=0):
+    """
+    For every subreddit (column), the minimum of each hash function over its commenters
+    Returns a num_hashes x Subreddit matrix, empty subreddits get the max hash value
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=num_hashes, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=num_hashes, dtype=np.uint64)
+    csc = activity.tocsc()
+    users = np.arange(activity.shape[0], dtype=np.uint64)
+    signatures = np.full((num_hashes, activity.shape[1]), _MAX_HASH, dtype=np.uint64)
+    non_empty = np.flatnonzero(np.diff(csc.indptr))
+    if len(non_empty) == 0:
+        return signatures
+    for i in range(num_hashes):
+        # Wrapping uint64 arithmetic is fine, we only need a well mixed value per user
+        hashes = ((a[i] * users + b[i]) % _MERSENNE_PRIME) & _MAX_HASH
+        per_entry = hashes[csc.indices]
+        signatures[i, non_empty] = np.minimum.reduceat(per_entry, csc.indptr[non_empty])
+    return signatures
+
+
+def _top_k(row_values, row_columns, row, k):
+    mask = row_columns != row
+    values, columns = row_values[mask], row_columns[mask]
+    if k is not None and len(values) > k:
+        keep = np.argpartition(-values, k - 1)[:k]
+        values, columns = values[keep], columns[keep]
+    order = np.argsort(-values, kind="stable")
+    return values[order], columns[order]
+
+
+def subreddit_overlap(source, metric="jaccard", top_k=10, min_users=1, minhash=None, seed=0, block_size=1024):
+    """
+    For every subreddit, return the top_k most overlapping subreddits as
+        {subreddit name: [(other subreddit name, score), ...]}, scores in descending order
+
+    source: a GraphSnapshot or a driver (see activity_matrix)
+    metric: "jaccard" or "cosine"
+    top_k: None returns every subreddit with a non-zero overlap
+    min_users: Subreddits with fewer commenters are left out
+    minhash: Number of hash functions to approximate Jaccard with, None computes it exactly
+    """
+    if metric not in _METRICS:
+        raise ValueError(f"reddit_detective only accepts {_METRICS} as metrics")
+    if minhash is not None and metric != "jaccard":
+        raise ValueError("MinHash only approximates the jaccard metric")
+    activity, names = activity_matrix(source)
+    users = np.diff(activity.tocsc().indptr)
+    kept = np.flatnonzero(users >= min_users)
+    activity = activity[:, kept].tocsr()
+    names = [names[i] for i in kept]
+
+    overlaps = {}
+    if minhash is None:
+        similarity = _exact_similarity(activity, metric)
+        for row, name in enumerate(names):
+            start, end = similarity.indptr[row], similarity.indptr[row + 1]
+            values, columns = _top_k(similarity.data[start:end], similarity.indices[start:end], row, top_k)
+            overlaps[name] = [(names[col], float(value)) for value, col in zip(values, columns)]
+        return overlaps
+
+    signatures = minhash_signatures(activity, minhash, seed)
+    columns_all = np.arange(len(names))
+    for block_start in range(0, len(names), block_size):
+        block = signatures[:, block_start:block_start + block_size]
+        # Ratio of hash functions agreeing on the minimum estimates the Jaccard similarity
+        agreement = np.zeros((block.shape[1], len(names)))
+        for i in range(minhash):
+            agreement += block[i][:, None] == signatures[i][None, :]
+        agreement /= minhash
+        for offset, row_values in enumerate(agreement):
+            row = block_start + offset
+            non_zero = row_values > 0
+            values, columns = _top_k(row_values[non_zero], columns_all[non_zero], row, top_k)
+            overlaps[names[row]] = [(names[col], float(value)) for value, col in zip(values, columns)]
+    return overlaps
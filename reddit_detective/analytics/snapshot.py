@@ -0,0 +1,253 @@
+"""
+An in-memory snapshot of the graph for whole-graph analytics
+
+The Redditor/Submission/Comment/Subreddit graph is streamed out of Neo4j once
+and kept as sparse CSR matrices with id-to-index maps.
+Every metric of reddit_detective.analytics.metrics can then be computed
+for all nodes at once, without another round trip to the database.
+
+Needs numpy and scipy: pip install reddit_detective[analytics]
+
+Matrices (rows x columns, 1 where the relationship exists):
+    authored_submissions    Redditor x Submission
+    authored_comments       Redditor x Comment
+    comment_submission      Comment x Submission (UNDER)
+    submission_subreddit    Submission x Subreddit (UNDER)
+    replies                 Redditor x Redditor, number of comments the row Redditor
+                            made under the submissions of the column Redditor
+"""
+import numpy as np
+from scipy import sparse
+
+_NODE_TYPES = ["Redditor", "Submission", "Comment", "Subreddit"]
+
+# labels(n) does not keep the order of labels, we need the main type
+_MAIN_TYPE = """CASE
+    WHEN %(n)s:Redditor THEN "Redditor"
+    WHEN %(n)s:Submission THEN "Submission"
+    WHEN %(n)s:Comment THEN "Comment"
+    WHEN %(n)s:Subreddit THEN "Subreddit"
+END"""
+
+_EXPORT_NODES = """
+MATCH (n)
+WHERE n:Redditor OR n:Submission OR n:Comment OR n:Subreddit
+RETURN %s AS type, n.id AS id, coalesce(n.username, n.name) AS name, n.created_utc AS created_utc
+""" % (_MAIN_TYPE % {"n": "n"})
+
+_EXPORT_RELATIONSHIPS = """
+MATCH (a)-[r:AUTHORED|UNDER]->(b)
+RETURN %s AS a_type, a.id AS a_id, type(r) AS type, %s AS b_type, b.id AS b_id
+""" % (_MAIN_TYPE % {"n": "a"}, _MAIN_TYPE % {"n": "b"})
+
+# (start type, relationship type, end type) -> matrix attribute
+_MATRICES = {
+    ("Redditor", "AUTHORED", "Submission"): "authored_submissions",
+    ("Redditor", "AUTHORED", "Comment"): "authored_comments",
+    ("Comment", "UNDER", "Submission"): "comment_submission",
+    ("Submission", "UNDER", "Subreddit"): "submission_subreddit"
+}
+
+_CYBORG_SECONDS = 6  # See analytics.metrics._cyborg_score
+
+
+def _binary_matrix(rows, cols, shape):
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+        shape=shape
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+class GraphSnapshot:
+    """
+    nodes: iterable of (type, id, name, created_utc)
+        name is the username for Redditors and the name for Subreddits
+    relationships: iterable of (start type, start id, relationship type, end type, end id)
+    """
+    def __init__(self, nodes, relationships):
+        self.ids = {type_: [] for type_ in _NODE_TYPES}
+        self.names = {type_: [] for type_ in _NODE_TYPES}
+        self.index = {type_: {} for type_ in _NODE_TYPES}
+        created = {type_: [] for type_ in _NODE_TYPES}
+        for type_, id_, name, created_utc in nodes:
+            if type_ not in self.index or id_ in self.index[type_]:
+                continue
+            self.index[type_][id_] = len(self.ids[type_])
+            self.ids[type_].append(id_)
+            self.names[type_].append(name)
+            created[type_].append(np.nan if created_utc is None else created_utc)
+        self.created_utc = {type_: np.asarray(created[type_], dtype=np.float64) for type_ in _NODE_TYPES}
+        # Redditors and Subreddits are searched by username/name in analytics.metrics
+        self.redditor_index = {name: i for i, name in enumerate(self.names["Redditor"])}
+        self.subreddit_index = {name: i for i, name in enumerate(self.names["Subreddit"])}
+
+        pairs = {attr: ([], []) for attr in _MATRICES.values()}
+        for a_type, a_id, rel_type, b_type, b_id in relationships:
+            attr = _MATRICES.get((a_type, rel_type, b_type))
+            if attr is None:
+                continue
+            a, b = self.index[a_type].get(a_id), self.index[b_type].get(b_id)
+            if a is None or b is None:
+                continue
+            pairs[attr][0].append(a)
+            pairs[attr][1].append(b)
+        for (a_type, _, b_type), attr in _MATRICES.items():
+            rows, cols = pairs[attr]
+            shape = (len(self.ids[a_type]), len(self.ids[b_type]))
+            setattr(self, attr, _binary_matrix(rows, cols, shape))
+
+        self.replies = (self.authored_comments @ self.comment_submission @ self.authored_submissions.T).tocsr()
+        self.replies.setdiag(0)  # Comments under your own submission are not replies to anyone
+        self.replies.eliminate_zeros()
+
+    @classmethod
+    def from_driver(cls, driver):
+        """
+        Stream the graph out of Neo4j with two queries
+        """
+        with driver.session() as s:
+            nodes = [tuple(record) for record in s.run(_EXPORT_NODES)]
+            relationships = [tuple(record) for record in s.run(_EXPORT_RELATIONSHIPS)]
+        return cls(nodes, relationships)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.ids.values())
+
+    def __str__(self):
+        counts = ", ".join(f"{type_}={len(self.ids[type_])}" for type_ in _NODE_TYPES)
+        return f"GraphSnapshot({counts})"
+
+    # Comment timings
+
+    def seconds_past(self):
+        """
+        For each comment, the same value analytics.utils calls seconds_past:
+            (comment.created_utc - submission.created_utc) / 1000
+        NaN for comments not linked to a submission
+        """
+        has_submission = np.diff(self.comment_submission.indptr) > 0
+        submission_of = np.zeros(len(self.ids["Comment"]), dtype=np.int64)
+        submission_of[has_submission] = self.comment_submission.indices[self.comment_submission.indptr[:-1][has_submission]]
+        past = (self.created_utc["Comment"] - self.created_utc["Submission"][submission_of]) / 1000 \
+            if len(self.ids["Submission"]) else np.full(len(self.ids["Comment"]), np.nan)
+        return np.where(has_submission, past, np.nan)
+
+    def _cyborg_comments(self):
+        past = self.seconds_past()
+        timed = ~np.isnan(past)
+        return timed.astype(np.float64), (timed & (past <= _CYBORG_SECONDS)).astype(np.float64)
+
+    # Vectorized metrics, one value per node
+
+    def comments_made(self):
+        return np.asarray(self.authored_comments.sum(axis=1)).ravel()
+
+    def comments_received(self):
+        comments_per_submission = np.asarray(self.comment_submission.sum(axis=0)).ravel()
+        return self.authored_submissions @ comments_per_submission
+
+    def interaction_scores(self):
+        """
+        Interaction score of every Redditor, NaN for Redditors without comments
+        """
+        received = self.comments_received()
+        return _ratio(received, received + self.comments_made())
+
+    def interaction_scores_normalized(self):
+        scores = self.interaction_scores()
+        return scores / np.nansum(scores)
+
+    def cyborg_scores(self, type_):
+        """
+        Cyborg score of every Redditor, Submission or Subreddit
+        (NaN for the ones without timed comments)
+        """
+        timed, cyborg = self._cyborg_comments()
+        if type_ == "Redditor":
+            per_node = self.authored_comments
+        elif type_ == "Submission":
+            per_node = self.comment_submission.T
+        elif type_ == "Subreddit":
+            per_node = self.submission_subreddit.T @ self.comment_submission.T
+        else:
+            raise ValueError("type_ should be either Redditor, Submission or Subreddit")
+        return _ratio(per_node @ cyborg, per_node @ timed)
+
+    # Same signatures as analytics.metrics, without the driver
+
+    def interaction_score(self, username):
+        return float(self.interaction_scores()[self.redditor_index[username]])
+
+    def interaction_score_normalized(self, username):
+        return float(self.interaction_scores_normalized()[self.redditor_index[username]])
+
+    def _cyborg_score(self, comment_rows):
+        past = self.seconds_past()[comment_rows]
+        timed = ~np.isnan(past)
+        cyborg = timed & (past <= _CYBORG_SECONDS)
+        ids = self.ids["Comment"]
+        return int(cyborg.sum()) / int(timed.sum()), [ids[i] for i in np.asarray(comment_rows)[cyborg]]
+
+    def cyborg_score_user(self, username):
+        row = self.authored_comments.getrow(self.redditor_index[username])
+        return self._cyborg_score(row.indices)
+
+    def cyborg_score_submission(self, submission_id):
+        column = self.comment_submission.getcol(self.index["Submission"][submission_id])
+        return self._cyborg_score(column.tocsc().indices)
+
+    def cyborg_score_subreddit(self, subreddit_name):
+        submissions = self.submission_subreddit.getcol(self.subreddit_index[subreddit_name]).tocsc().indices
+        comments = self.comment_submission[:, submissions].tocsr()
+        return self._cyborg_score(np.flatnonzero(np.diff(comments.indptr)))
+
+    # Redditor graph (see self.replies)
+
+    def degrees(self):
+        """
+        Return (in-degree, out-degree) of every Redditor in the reply graph,
+        counting distinct Redditors
+        """
+        binary = self.replies.copy()
+        binary.data[:] = 1
+        return np.asarray(binary.sum(axis=0)).ravel(), np.asarray(binary.sum(axis=1)).ravel()
+
+    def pagerank(self, damping=0.85, tol=1e-10, max_iter=100):
+        """
+        PageRank of every Redditor in the reply graph, weighted by number of replies
+        A Redditor receiving replies from important Redditors is important
+        """
+        n = self.replies.shape[0]
+        if n == 0:
+            return np.zeros(0)
+        out_weight = np.asarray(self.replies.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        inv_out = np.zeros(n)
+        inv_out[~dangling] = 1 / out_weight[~dangling]
+        transition = (sparse.diags(inv_out) @ self.replies).T.tocsr()
+        rank = np.full(n, 1 / n)
+        for _ in range(max_iter):
+            new_rank = damping * (transition @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+            converged = np.abs(new_rank - rank).sum() < tol
+            rank = new_rank
+            if converged:
+                break
+        return rank
+
+    def reciprocity(self):
+        """
+        Ratio of reply edges (a replied to b) whose reverse (b replied to a) exists too
+        """
+        binary = self.replies.copy()
+        binary.data[:] = 1
+        if binary.nnz == 0:
+            return 0.0
+        return float(binary.multiply(binary.T).sum() / binary.nnz)
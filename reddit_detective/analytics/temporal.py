@@ -0,0 +1,240 @@
+"""
+When are subreddits and redditors active?
+
+Streams the created_utc of comments and submissions in bulk, as two columns
+(owner, time) where the owner is the Subreddit (or the Redditor) of the item,
+and computes temporal profiles of every owner at once with NumPy:
+
+    Hour of day and day of week histograms (UTC)
+    Timelines: number of items per time bin, as a sparse owner x bin matrix
+    Rolling windows: the most items an owner has in any window of the given length
+    Bursts: owners whose busiest window has far more items than their average rate gives
+    Gaps: distribution of the seconds between consecutive items of an owner
+
+    profiles = activity_profiles(driver, by="Subreddit")  # or a GraphSnapshot
+    hours = profiles.hour_of_day()  # Subreddit x 24 counts, rows in the order of profiles.names
+    peak, start, bursting = profiles.bursts(window=3600, factor=5)
+
+Needs numpy and scipy: pip install reddit_detective[analytics]
+"""
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+from reddit_detective.analytics.snapshot import GraphSnapshot
+
+_KINDS = ["Comment", "Submission"]
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday, Monday is 0
+_DAY = 86400
+_HOUR = 3600
+# 1 second to a year, log spaced
+_GAP_BINS = np.concatenate([[0.0], np.logspace(0, np.log10(365 * _DAY), 24)])
+
+_ITEMS = {
+    ("Redditor", "Comment"): """
+MATCH (r:Redditor)-[:AUTHORED]->(n:Comment)
+RETURN r.username AS owner, n.created_utc AS created_utc
+""",
+    ("Redditor", "Submission"): """
+MATCH (r:Redditor)-[:AUTHORED]->(n:Submission)
+RETURN r.username AS owner, n.created_utc AS created_utc
+""",
+    ("Subreddit", "Comment"): """
+MATCH (n:Comment)-[:UNDER]->(:Submission)-[:UNDER]->(sr:Subreddit)
+RETURN sr.name AS owner, n.created_utc AS created_utc
+""",
+    ("Subreddit", "Submission"): """
+MATCH (n:Submission)-[:UNDER]->(sr:Subreddit)
+RETURN sr.name AS owner, n.created_utc AS created_utc
+""",
+}
+
+
+def _snapshot_items(snapshot: GraphSnapshot, by, kind):
+    """
+    Return (owner indices, times) of the items of a kind, read from the matrices of the snapshot
+    """
+    if by == "Redditor":
+        matrix = snapshot.authored_comments if kind == "Comment" else snapshot.authored_submissions
+        matrix = matrix.T.tocsr()  # Item x Redditor
+    elif kind == "Comment":
+        matrix = (snapshot.comment_submission @ snapshot.submission_subreddit).tocsr()
+    else:
+        matrix = snapshot.submission_subreddit
+    items = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    return matrix.indices.astype(np.int64), snapshot.created_utc[kind][items]
+
+
+def _driver_items(driver, by, kinds):
+    names = {}
+    owners = array("q")
+    times = array("d")
+    with driver.session() as s:
+        for kind in kinds:
+            for owner, created_utc in s.run(_ITEMS[(by, kind)]):
+                if created_utc is None:
+                    continue
+                owners.append(names.setdefault(owner, len(names)))
+                times.append(created_utc)
+    return list(names), np.frombuffer(owners, dtype=np.int64), np.frombuffer(times, dtype=np.float64)
+
+
+def activity_profiles(source, by="Subreddit", kinds=None):
+    """
+    source: A GraphSnapshot, or a driver to stream the items with a query per kind
+    by: "Subreddit" or "Redditor"
+    kinds: Items counted, "Comment" and/or "Submission" (both by default)
+    """
+    if by not in ["Subreddit", "Redditor"]:
+        raise ValueError("by should be either Subreddit or Redditor")
+    kinds = list(kinds) if kinds is not None else list(_KINDS)
+    if isinstance(source, GraphSnapshot):
+        columns = [_snapshot_items(source, by, kind) for kind in kinds]
+        owners = np.concatenate([owners for owners, _ in columns]) if columns else np.zeros(0, dtype=np.int64)
+        times = np.concatenate([times for _, times in columns]) if columns else np.zeros(0)
+        return ActivityProfiles(list(source.names[by]), owners, times)
+    return ActivityProfiles(*_driver_items(source, by, kinds))
+
+
+class ActivityProfiles:
+    """
+    names: Owner names, the rows of every result are in this order
+    owners: Owner index of each item
+    times: created_utc of each item (items without it are left out)
+    """
+    def __init__(self, names, owners, times):
+        owners = np.asarray(owners, dtype=np.int64)
+        times = np.asarray(times, dtype=np.float64)
+        known = ~np.isnan(times)
+        owners, times = owners[known], times[known]
+        order = np.lexsort((times, owners))  # By owner, then by time
+        self.names = names
+        self.owners = owners[order]
+        self.times = times[order]
+        self.counts = np.bincount(self.owners, minlength=len(names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _histogram(self, owners, values, size):
+        flat = np.bincount(owners * size + values, minlength=len(self.names) * size)
+        return flat.reshape(len(self.names), size)
+
+    def hour_of_day(self):
+        """
+        Owner x 24 counts, UTC hours
+        """
+        hours = (np.floor(self.times / _HOUR) % 24).astype(np.int64)
+        return self._histogram(self.owners, hours, 24)
+
+    def day_of_week(self):
+        """
+        Owner x 7 counts, Monday is 0
+        """
+        days = ((np.floor(self.times / _DAY) + _EPOCH_WEEKDAY) % 7).astype(np.int64)
+        return self._histogram(self.owners, days, 7)
+
+    def timeline(self, bin_seconds=_DAY):
+        """
+        Return (Owner x bin counts as a CSR matrix, start time of the first bin)
+        """
+        if not len(self.times):
+            return sparse.csr_matrix((len(self.names), 0)), 0.0
+        start = np.floor(self.times.min() / bin_seconds) * bin_seconds
+        bins = ((self.times - start) // bin_seconds).astype(np.int64)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(bins)), (self.owners, bins)), shape=(len(self.names), int(bins.max()) + 1)
+        )
+        matrix.sum_duplicates()
+        return matrix, float(start)
+
+    def _window_counts(self, window):
+        """
+        For each item, the number of items of its owner in [its time, its time + window)
+        """
+        if not len(self.times):
+            return np.zeros(0, dtype=np.int64)
+        # Owners are far apart on a single axis, so that a window never reaches the next owner
+        span = self.times.max() - self.times.min() + window + 1
+        keys = self.owners * span + (self.times - self.times.min())
+        return np.searchsorted(keys, keys + window, side="left") - np.arange(len(keys))
+
+    def _segment_argmax(self, values):
+        """
+        Index of the highest value of each owner's items, -1 for owners without items
+        """
+        best = np.full(len(self.names), -1, dtype=np.int64)
+        if not len(values):
+            return best
+        order = np.lexsort((-values, self.owners))  # By owner, highest value first
+        firsts = np.flatnonzero(np.r_[True, self.owners[order][1:] != self.owners[order][:-1]])
+        best[self.owners[order][firsts]] = order[firsts]
+        return best
+
+    def rolling_max(self, window=_HOUR):
+        """
+        The most items each owner has in any window of window seconds
+        """
+        counts = self._window_counts(window)
+        best = self._segment_argmax(counts)
+        return np.where(best >= 0, counts[best] if len(counts) else 0, 0)
+
+    def bursts(self, window=_HOUR, factor=5.0, min_items=5):
+        """
+        Return (items in the busiest window, start time of that window, whether it's a burst) per owner
+
+        A burst is a window with at least min_items items and factor times the items
+        the owner's average rate (items / active seconds) gives for a window
+        """
+        counts = self._window_counts(window)
+        best = self._segment_argmax(counts)
+        has_items = best >= 0
+        peak = np.where(has_items, counts[best] if len(counts) else 0, 0)
+        peak_start = np.where(has_items, self.times[best] if len(self.times) else np.nan, np.nan)
+
+        first = np.full(len(self.names), np.nan)
+        last = np.full(len(self.names), np.nan)
+        if len(self.times):
+            starts = np.flatnonzero(np.r_[True, self.owners[1:] != self.owners[:-1]])
+            ends = np.r_[starts[1:], len(self.owners)] - 1
+            first[self.owners[starts]] = self.times[starts]
+            last[self.owners[ends]] = self.times[ends]
+        active = np.maximum(last - first, window)
+        with np.errstate(invalid="ignore"):
+            expected = self.counts * window / active
+            bursting = has_items & (peak >= min_items) & (peak >= factor * expected)
+        return peak, peak_start, bursting
+
+    def gaps(self):
+        """
+        Return (owner index, seconds since the owner's previous item) for every item but the first of each owner
+        """
+        same_owner = self.owners[1:] == self.owners[:-1]
+        return self.owners[1:][same_owner], np.diff(self.times)[same_owner]
+
+    def gap_histogram(self, bins=None):
+        """
+        Owner x bin counts of the gaps between consecutive items,
+        bins are edges in seconds (log spaced from 1 second to a year by default)
+        """
+        bins = np.asarray(bins if bins is not None else _GAP_BINS, dtype=np.float64)
+        owners, gaps = self.gaps()
+        index = np.clip(np.searchsorted(bins, gaps, side="right") - 1, 0, len(bins) - 2)
+        return self._histogram(owners, index, len(bins) - 1)
+
+    def median_gaps(self):
+        """
+        Median gap of every owner, NaN for owners with less than two items
+        """
+        owners, gaps = self.gaps()
+        order = np.lexsort((gaps, owners))
+        owners, gaps = owners[order], gaps[order]
+        counts = np.bincount(owners, minlength=len(self.names))
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        medians = np.full(len(self.names), np.nan)
+        has_gaps = counts > 0
+        low = starts + (counts - 1) // 2
+        high = starts + counts // 2
+        medians[has_gaps] = (gaps[low[has_gaps]] + gaps[high[has_gaps]]) / 2
+        return medians
@@ -1,8 +1,50 @@
-from neo4j import BoltDriver
+from typing import TYPE_CHECKING
 from collections import OrderedDict
 
+from reddit_detective.analytics.cache import cached
+from reddit_detective.materialized import epoch_property
+from reddit_detective.sinks import MemoryGraph
 
-def get_redditors(driver: BoltDriver) -> list:
+if TYPE_CHECKING:
+    from neo4j import BoltDriver
+
+# Every function takes either a Neo4j driver or a MemoryGraph (see reddit_detective.sinks),
+# MemoryGraph is walked directly instead of being queried with Cypher
+
+
+def _memory_comments_times(graph: MemoryGraph, pairs):
+    # (comment, submission) pairs -> ids and seconds past, same as the Cypher queries
+    comments = OrderedDict()
+    for comment, submission in pairs:
+        seconds_past = (graph.properties[comment]["created_utc"] - graph.properties[submission]["created_utc"]) / 1000
+        comments[graph.ids[comment]] = seconds_past
+    return list(comments.keys()), list(comments.values())
+
+
+def _memory_comments_of(graph: MemoryGraph, label, name):
+    """
+    Yield (comment, submission) pairs of the comments of a Redditor, Submission or Subreddit node
+    """
+    if label == "Redditor":
+        for redditor in graph.find("Redditor", "username", name):
+            for comment in graph.successors(redditor, "AUTHORED", "Comment"):
+                for submission in graph.successors(comment, "UNDER", "Submission"):
+                    yield comment, submission
+    elif label == "Submission":
+        for submission in graph.find("Submission", "id", name):
+            for comment in graph.predecessors(submission, "UNDER", "Comment"):
+                yield comment, submission
+    else:
+        for subreddit in graph.find("Subreddit", "name", name):
+            for submission in graph.predecessors(subreddit, "UNDER", "Submission"):
+                for comment in graph.predecessors(submission, "UNDER", "Comment"):
+                    yield comment, submission
+
+
+@cached
+def get_redditors(driver: "BoltDriver") -> list:
+    if isinstance(driver, MemoryGraph):
+        return [driver.properties[node].get("username") for node in driver.nodes("Redditor")]
     s = driver.session()
     users = list(s.run("""
 MATCH (r:Redditor) WITH r RETURN r.username
@@ -10,7 +52,9 @@ MATCH (r:Redditor) WITH r RETURN r.username
     return [user[0] for user in users]
 
 
-def get_user_comments_times(driver: BoltDriver, username):
+def get_user_comments_times(driver: "BoltDriver", username):
+    if isinstance(driver, MemoryGraph):
+        return _memory_comments_times(driver, _memory_comments_of(driver, "Redditor", username))
     s = driver.session()
     comments = list(s.run("""
 MATCH (:Redditor {username: "%s"})-[:AUTHORED]-(c:Comment)-[:UNDER]-(s:Submission)
@@ -21,7 +65,9 @@ RETURN c.id AS id, (c.created_utc - s.created_utc) / 1000 AS seconds_past
     return list(comments.keys()), list(comments.values())
 
 
-def get_submission_comments_times(driver: BoltDriver, submission_id):
+def get_submission_comments_times(driver: "BoltDriver", submission_id):
+    if isinstance(driver, MemoryGraph):
+        return _memory_comments_times(driver, _memory_comments_of(driver, "Submission", submission_id))
     s = driver.session()
     comments = list(s.run("""
 MATCH (s:Submission {id: "%s"})-[:UNDER]-(c:Comment)
@@ -32,7 +78,9 @@ RETURN c.id AS id, (c.created_utc - s.created_utc) / 1000 AS seconds_past
     return list(comments.keys()), list(comments.values())
 
 
-def get_subreddit_comments_times(driver: BoltDriver, subreddit_name):
+def get_subreddit_comments_times(driver: "BoltDriver", subreddit_name):
+    if isinstance(driver, MemoryGraph):
+        return _memory_comments_times(driver, _memory_comments_of(driver, "Subreddit", subreddit_name))
     s = driver.session()
     comments = list(s.run("""
 MATCH (:Subreddit {name: "%s"})-[:UNDER]-(s:Submission)-[:UNDER]-(c:Comment)
@@ -41,3 +89,82 @@ RETURN c.id AS id, (c.created_utc - s.created_utc) / 1000 AS seconds_past
 """ % subreddit_name))
     comments = dict(comments)
     return list(comments.keys()), list(comments.values())
+
+
+def get_materialized(driver: "BoltDriver", label, key, value, props):
+    """
+    Return the given materialized counters of a node as a dict,
+    None if the node has no such counters or they are stale (see reddit_detective.materialized)
+    """
+    if isinstance(driver, MemoryGraph):
+        nodes = driver.find(label, key, value)
+        if not nodes or any(driver.properties[nodes[0]].get(prop) is None for prop in props):
+            return None
+        return {prop: driver.properties[nodes[0]][prop] for prop in props}
+    s = driver.session()
+    epochs = list(dict.fromkeys(epoch_property(label, prop) for prop in props))
+    returns = ", ".join(f"n.{prop} AS {prop}" for prop in props + epochs)
+    records = list(s.run("""
+MATCH (n:%s {%s: "%s"})
+OPTIONAL MATCH (e:MetricsEpoch)
+RETURN %s, e.epoch AS epoch
+""" % (label, key, value, returns)))
+    if not records:
+        return None
+    record = records[0]
+    if any(record[prop] is None for prop in props) or any(record[epoch] != record["epoch"] for epoch in epochs):
+        return None
+    return {prop: record[prop] for prop in props}
+
+
+def get_comment_counts(driver: "BoltDriver", username):
+    """
+    Return (# comments received, # comments made) of a user
+    """
+    if isinstance(driver, MemoryGraph):
+        received, made = 0, 0
+        for redditor in driver.find("Redditor", "username", username):
+            for submission in driver.successors(redditor, "AUTHORED", "Submission"):
+                received += len(driver.predecessors(submission, "UNDER", "Comment"))
+            made += len(driver.successors(redditor, "AUTHORED", "Comment"))
+        return received, made
+    s = driver.session()
+    comments_received = list(s.run("""
+MATCH (:Redditor {username: "%s"})-[:AUTHORED]-(:Submission)-[:UNDER]-(c:Comment)
+WITH c
+RETURN count(c)
+""" % username))[0][0]  # Converted Result object to integer
+    comments_made = list(s.run("""
+MATCH (:Redditor {username: "%s"})-[:AUTHORED]-(c:Comment)
+WITH c
+RETURN count(c)
+""" % username))[0][0]
+    return comments_received, comments_made
+
+
+@cached
+def get_reply_weights(driver: "BoltDriver", username, incoming=False):
+    """
+    Return {username: # replies} of the redditors the user replied to
+    (incoming=True: of the redditors who replied to the user)
+
+    Reads the REPLIED_TO relationships (see reddit_detective.replied_to), a single hop
+    """
+    if isinstance(driver, MemoryGraph):
+        weights = {}
+        for redditor in driver.find("Redditor", "username", username):
+            others = driver.predecessors(redditor, "REPLIED_TO") if incoming \
+                else driver.successors(redditor, "REPLIED_TO")
+            for other in others:
+                name = driver.properties[other].get("username")
+                pair = (other, redditor) if incoming else (redditor, other)
+                weights[name] = weights.get(name, 0) + driver.weights[pair]
+        return weights
+    s = driver.session()
+    pattern = "(r:Redditor)-[e:REPLIED_TO]->(:Redditor {username: \"%s\"})" if incoming \
+        else "(:Redditor {username: \"%s\"})-[e:REPLIED_TO]->(r:Redditor)"
+    records = list(s.run("""
+MATCH %s
+RETURN r.username AS username, e.weight AS weight
+""" % (pattern % username)))
+    return {record["username"]: record["weight"] for record in records}
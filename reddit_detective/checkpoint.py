@@ -0,0 +1,69 @@
+"""
+A local journal for chunked writes, so that an interrupted run can resume
+from the last committed chunk.
+
+The journal is a JSON lines file:
+    {"chunk_size": 1000, "codes": [...]}    The whole plan, written before the first chunk.
+                                            Codes are records (see reddit_detective.codes),
+                                            so they are resumed with their types
+    {"committed": 0}                        Appended after chunk 0 is committed
+    {"committed": 1}
+    ...
+
+Storing the codes in the journal is what saves us from crawling again when resuming.
+A chunk committed to Neo4j right before a crash might not be journaled yet,
+it will be run again when resuming, which is harmless since every code is a MERGE or a SET.
+"""
+import json
+import os
+
+from reddit_detective.codes import code_record, code_from_record
+from reddit_detective.exceptions import CheckpointError
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _lines(self):
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        return  # A line torn by a crash, nothing after it was committed
+
+    def load(self):
+        """
+        Return (codes, chunk_size, committed chunk indexes) of the journaled run
+        """
+        lines = self._lines()
+        plan = next(lines, None)
+        if plan is None or "codes" not in plan:
+            # The crash happened while the plan was written, so no chunk was run
+            raise CheckpointError(f"{self.path} has no plan to resume, remove it to start over")
+        committed = {line["committed"] for line in lines}
+        return [code_from_record(record) for record in plan["codes"]], plan["chunk_size"], committed
+
+    def _append(self, dict_, mode="a"):
+        with open(self.path, mode) as f:
+            f.write(json.dumps(dict_) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, codes, chunk_size):
+        self._append({"chunk_size": chunk_size, "codes": [code_record(code) for code in codes]}, mode="w")
+
+    def commit(self, chunk_index):
+        self._append({"committed": chunk_index})
+
+    def finish(self):
+        """
+        The run is complete, the same path can be used for the next run
+        """
+        os.remove(self.path)
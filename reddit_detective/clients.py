@@ -0,0 +1,171 @@
+"""
+A pool of Reddit API clients (one per OAuth app) to be used in place of a single praw.Reddit
+
+Every request of a PRAW object goes through the praw.Reddit instance that created it,
+so one OAuth app's rate limit caps the whole crawl.
+ClientPool has the methods data models and karma functions call on their api
+(subreddit, submission, redditor, comment) and creates every object with the client
+that has the most quota left:
+
+    pool = ClientPool.from_credentials([
+        {"client_id": "id1", "client_secret": "secret1"},
+        {"client_id": "id2", "client_secret": "secret2"},
+    ], user_agent="reddit-detective")
+    net = RedditNetwork(driver, [Comments(Redditor(pool, "Anub_Rekhan", limit=5))])
+    net.add_karma(pool)
+
+The remaining quota of a client comes from the rate limit headers of its last response
+(praw.Reddit.auth.limits). Objects handed out since then are counted against it too,
+since PRAW objects are lazy and fetch after they are created.
+A client with min_remaining requests or fewer left is throttled
+and skipped until its rate limit window resets.
+If every client is throttled, the one to reset first is used (and PRAW waits for it).
+
+praw.Reddit is not thread safe: threads fetching at once should each have their own client,
+see worker_clients.
+"""
+import threading
+import time
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import praw
+
+# Assumed quota of a client that has not made a request yet
+_UNKNOWN_REMAINING = 1000
+# Length of Reddit's rate limit window in seconds
+_WINDOW = 600
+
+
+class _PooledClient:
+    def __init__(self, api):
+        self.api = api
+        self.routed = 0  # Objects created with this client in total
+        self.pending = 0  # Objects created since the last update of the limits
+        self.last_used = None
+        self.throttled_until = None
+
+    def limits(self):
+        try:
+            return self.api.auth.limits
+        except (AttributeError, AssertionError):
+            return {}
+
+    def refresh(self):
+        """
+        Return the estimated remaining quota, forget pending objects once the limits change
+        """
+        limits = self.limits()
+        used = limits.get("used")
+        if used != self.last_used:
+            self.last_used = used
+            self.pending = 0
+        remaining = limits.get("remaining")
+        if remaining is None:
+            return _UNKNOWN_REMAINING - self.pending
+        reset = limits.get("reset_timestamp")
+        if reset is not None and reset <= time.time():
+            # The window is over, the quota will be full with the next response
+            return _UNKNOWN_REMAINING - self.pending
+        return remaining - self.pending
+
+
+class ClientPool:
+    """
+    clients: praw.Reddit instances, each with its own credentials
+    min_remaining: A client with that many requests left (or fewer) is throttled
+    window: Seconds a throttled client is skipped, if its reset time is not known
+    """
+    def __init__(self, clients: List["praw.Reddit"], min_remaining=10, window=_WINDOW):
+        if not clients:
+            raise ValueError("ClientPool needs at least one client")
+        self.clients = [_PooledClient(api) for api in clients]
+        self.min_remaining = min_remaining
+        self.window = window
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_credentials(cls, credentials: List[dict], user_agent="reddit-detective", **kwargs):
+        """
+        credentials: a dict of praw.Reddit arguments (client_id, client_secret etc.) per OAuth app
+        """
+        import praw
+        clients = [praw.Reddit(**dict({"user_agent": user_agent}, **cred)) for cred in credentials]
+        return cls(clients, **kwargs)
+
+    def client(self) -> "praw.Reddit":
+        """
+        Pick the client with the most quota left, skipping the throttled ones
+        """
+        with self._lock:
+            now = time.monotonic()
+            best = None
+            best_remaining = None
+            first_reset = None
+            for pooled in self.clients:
+                remaining = pooled.refresh()
+                if remaining <= self.min_remaining:
+                    if pooled.throttled_until is None:
+                        # Older PRAW versions tell when the window resets
+                        reset = pooled.limits().get("reset_timestamp")
+                        wait = reset - time.time() if reset is not None else self.window
+                        pooled.throttled_until = now + max(wait, 0)
+                    if pooled.throttled_until > now:
+                        if first_reset is None or pooled.throttled_until < first_reset.throttled_until:
+                            first_reset = pooled
+                        continue
+                    # The window passed without an update, give it another chance
+                    remaining = _UNKNOWN_REMAINING - pooled.pending
+                pooled.throttled_until = None
+                if best is None or remaining > best_remaining:
+                    best, best_remaining = pooled, remaining
+            if best is None:
+                best = first_reset
+            best.routed += 1
+            best.pending += 1
+            return best.api
+
+    def subreddit(self, *args, **kwargs):
+        return self.client().subreddit(*args, **kwargs)
+
+    def submission(self, *args, **kwargs):
+        return self.client().submission(*args, **kwargs)
+
+    def redditor(self, *args, **kwargs):
+        return self.client().redditor(*args, **kwargs)
+
+    def comment(self, *args, **kwargs):
+        return self.client().comment(*args, **kwargs)
+
+    def stats(self):
+        """
+        For each client: the quota left according to its last response,
+        the number of objects created with it and whether it's throttled
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "remaining": pooled.limits().get("remaining"),
+                    "used": pooled.limits().get("used"),
+                    "routed": pooled.routed,
+                    "throttled": pooled.throttled_until is not None and pooled.throttled_until > now
+                }
+                for pooled in self.clients
+            ]
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __str__(self):
+        return f"ClientPool({len(self.clients)} clients)"
+
+
+def worker_clients(api, workers):
+    """
+    Return the praw.Reddit instances that threads can fetch with at once, one per thread:
+    the clients of a ClientPool (workers at most), or the praw.Reddit itself
+    """
+    if isinstance(api, ClientPool):
+        return [pooled.api for pooled in api.clients[:max(workers, 1)]]
+    return [api]
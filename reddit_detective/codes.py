@@ -0,0 +1,77 @@
+"""
+Codes as plain records, to be stored and rebuilt with their type
+
+NodeCode, LinkCode and the other code types keep the records they're made of,
+and the sinks, the parallel writer and the seen index rely on them.
+A code stored as a string (in a checkpoint journal, a work queue or a crawl snapshot)
+would come back as a plain str, so it's stored as a record instead:
+
+    code_record(code)  # [kind, data], made of JSON (and msgpack) types
+    code_from_record(record)  # The code again, of the same type
+"""
+from reddit_detective.data_models import NodeCode, _merge_code
+from reddit_detective.materialized import CountersCode, StaleCountersCode
+from reddit_detective.relationships import LinkCode, _link_nodes
+from reddit_detective.replied_to import RepliedToCode
+
+
+def is_record_code(code):
+    """
+    Node and relationship codes: writing one again changes nothing, so these are the only codes
+    that can be skipped when they were written before (counters and the like are run every time)
+    """
+    return isinstance(code, (NodeCode, LinkCode))
+
+
+def unique_records(codes):
+    """
+    Remove duplicate node and relationship codes without changing order
+
+    Other codes are all kept where they are: keeping only the first of two would run it
+    before the writes the second one came after (e.g. counters, see reddit_detective.materialized)
+    """
+    seen = set()
+    unique = []
+    for code in codes:
+        if is_record_code(code):
+            if code in seen:
+                continue
+            seen.add(code)
+        unique.append(code)
+    return unique
+
+
+def code_record(code):
+    if isinstance(code, NodeCode):
+        return ["node", [code.types, code.properties]]
+    if isinstance(code, LinkCode):
+        return ["link", [code.first_id, code.second_id, code.rel_type, code.props]]
+    if isinstance(code, RepliedToCode):
+        return ["replied_to", [[list(pair), comment_ids] for pair, comment_ids in code.rows]]
+    if isinstance(code, CountersCode):
+        return ["counters", [code.role, code.comment_ids]]
+    if isinstance(code, StaleCountersCode):
+        return ["stale_counters", None]
+    return ["cypher", str(code)]
+
+
+_BUILDERS = {
+    "node": lambda data: _merge_code(data[0], data[1]),
+    "link": lambda data: _link_nodes(*data),
+    "replied_to": lambda data: RepliedToCode([(tuple(pair), comment_ids) for pair, comment_ids in data]),
+    "counters": lambda data: CountersCode(*data),
+    "stale_counters": lambda data: StaleCountersCode(),
+    "cypher": lambda data: data,
+}
+
+
+def code_from_record(record):
+    """
+    Rebuild the code of a record, a plain string (a code stored without its type) is returned as it is
+    """
+    if isinstance(record, str):
+        return record
+    kind, data = record
+    if kind not in _BUILDERS:
+        raise ValueError(f"unknown code record kind: {kind}")
+    return _BUILDERS[kind](data)
@@ -0,0 +1,176 @@
+"""
+Crawl snapshots: the output of a crawl in a compact binary file, to be loaded later or elsewhere
+
+Crawl on one host (close to the API, with the credentials), load on another (close to Neo4j),
+or keep a crawl to replay it:
+
+    net.save_snapshot("crawl.rds")  # on the crawling host
+    net.load_snapshot("crawl.rds", batch_size=1000)  # on the loading host, no API needed
+
+File format (schema version 2):
+    MAGIC (8 bytes)
+    frames, each a 4 byte little-endian length followed by that many bytes of msgpack:
+        header frame: {"schema": 2, "created_utc": ...}
+        section frames: [section, [record, ...]], sections appear in this order:
+            "nodes": [types, properties] (e.g. [["Submission", "Over18"], {"id": "...", ...}])
+            "relationships": [first id, second id, relationship type, properties]
+            "cypher": other codes as code records (see reddit_detective.codes),
+                e.g. the counters of materialize_metrics. Version 1 kept them as strings
+        end frame: {"end": {section: # of records}}, a file without it is truncated
+
+A crawl raising in a `with SnapshotWriter(...)` block leaves a file without the end frame,
+so it's not loaded as if it was complete.
+
+Nodes come before relationships, so a file is loaded in a single pass.
+The writer streams: relationship and cypher frames are spooled to temporary files
+and appended after the nodes on close. The reader maps the file to memory (mmap)
+and decodes one frame at a time.
+
+Needs msgpack: pip install reddit_detective[snapshots]
+"""
+import mmap
+import os
+import shutil
+import struct
+import time
+
+from reddit_detective.codes import code_record, code_from_record
+from reddit_detective.data_models import NodeCode, _merge_code
+from reddit_detective.exceptions import SnapshotError
+from reddit_detective.relationships import LinkCode, _link_nodes
+
+MAGIC = b"RDSNAP\x00\x01"
+SCHEMA_VERSION = 2
+_READABLE_VERSIONS = (1, 2)
+SECTIONS = ["nodes", "relationships", "cypher"]
+
+_LENGTH = struct.Struct("<I")
+_RECORDS_PER_FRAME = 1000
+
+
+def _frame(obj):
+    import msgpack
+    payload = msgpack.packb(obj, use_bin_type=True)
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _record(code):
+    """
+    Return (section, record) for a code
+    """
+    if isinstance(code, NodeCode):
+        return "nodes", [code.types, code.properties]
+    if isinstance(code, LinkCode):
+        return "relationships", [code.first_id, code.second_id, code.rel_type, code.props]
+    return "cypher", code_record(code)
+
+
+def _code(section, record):
+    if section == "nodes":
+        return _merge_code(record[0], record[1])
+    if section == "relationships":
+        return _link_nodes(*record)
+    return code_from_record(record)
+
+
+class SnapshotWriter:
+    """
+    with SnapshotWriter("crawl.rds") as writer:
+        writer.write(component.code())
+    """
+    def __init__(self, path):
+        self.path = path
+        self.counts = {section: 0 for section in SECTIONS}
+        self._files = {
+            "nodes": open(path, "wb"),
+            "relationships": open(path + ".relationships.tmp", "wb"),
+            "cypher": open(path + ".cypher.tmp", "wb"),
+        }
+        self._pending = {section: [] for section in SECTIONS}
+        self._files["nodes"].write(MAGIC)
+        self._files["nodes"].write(_frame({"schema": SCHEMA_VERSION, "created_utc": time.time()}))
+
+    def _flush_section(self, section):
+        if self._pending[section]:
+            self._files[section].write(_frame([section, self._pending[section]]))
+            self._pending[section] = []
+
+    def write(self, codes):
+        for code in codes:
+            section, record = _record(code)
+            self._pending[section].append(record)
+            self.counts[section] += 1
+            if len(self._pending[section]) >= _RECORDS_PER_FRAME:
+                self._flush_section(section)
+
+    def close(self, complete=True):
+        """
+        complete=False leaves the file without the end frame, readers see it as truncated
+        """
+        main = self._files["nodes"]
+        if complete:
+            for section in SECTIONS:
+                self._flush_section(section)
+        for section in SECTIONS[1:]:
+            spool = self._files[section]
+            spool.close()
+            if complete:
+                with open(spool.name, "rb") as f:
+                    shutil.copyfileobj(f, main)
+            os.remove(spool.name)
+        if complete:
+            main.write(_frame({"end": self.counts}))
+        main.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(complete=exc[0] is None)
+
+
+def read_snapshot(path):
+    """
+    Yield (section, list of records) frame by frame
+    """
+    import msgpack
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            raise SnapshotError(f"{path} is not a crawl snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                if view[:len(MAGIC)] != MAGIC:
+                    raise SnapshotError(f"{path} is not a crawl snapshot")
+                pos = len(MAGIC)
+                header = None
+                while pos + _LENGTH.size <= len(view):
+                    (length,) = _LENGTH.unpack_from(view, pos)
+                    pos += _LENGTH.size
+                    if pos + length > len(view):
+                        break
+                    frame = msgpack.unpackb(view[pos:pos + length], raw=False)
+                    pos += length
+                    if header is None:
+                        header = frame
+                        if header.get("schema") not in _READABLE_VERSIONS:
+                            raise SnapshotError(
+                                f"{path} has schema version {header.get('schema')}, "
+                                f"reddit_detective reads versions {', '.join(map(str, _READABLE_VERSIONS))}"
+                            )
+                    elif isinstance(frame, dict) and "end" in frame:
+                        return
+                    else:
+                        yield frame[0], frame[1]
+                raise SnapshotError(f"{path} is truncated")
+            finally:
+                view.release()
+
+
+def snapshot_codes(path):
+    """
+    Yield the codes of a snapshot, in order (nodes, relationships, then the rest)
+    """
+    for section, records in read_snapshot(path):
+        for record in records:
+            yield _code(section, record)
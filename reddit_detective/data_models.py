@@ -1,13 +1,18 @@
-import praw
-from prawcore.exceptions import Redirect, NotFound
-from praw.models import (Comment as PrawComment,
-                         Submission as PrawSubmission,
-                         Subreddit as PrawSubreddit,
-                         Redditor as PrawRedditor)
 from abc import ABC
-from typing import Union
+from typing import Union, TYPE_CHECKING
 
-from reddit_detective.utils import strip_punc
+from reddit_detective.exceptions import MissingFieldError
+from reddit_detective.utils import strip_punc, fingerprint
+
+if TYPE_CHECKING:
+    # praw is only needed by the caller creating the praw.Reddit instance,
+    # importing it here would slow down importing reddit_detective
+    import praw
+    from praw.models import (Comment as PrawComment,
+                             Submission as PrawSubmission,
+                             Subreddit as PrawSubreddit,
+                             Redditor as PrawRedditor)
+    from reddit_detective.clients import ClientPool
 
 """
 Node types:
@@ -27,6 +32,7 @@ Relationship types:
     MODERATES (Redditor -> Subreddit) (No properties)
     UNDER (Submission -> Subreddit) OR (Submission -> Comment) OR (Comment -> Comment) (No properties)
     AUTHORED (Redditor -> Submission) OR (Redditor -> Comment) (No properties)
+    REPLIED_TO (Redditor -> Redditor) (weight, see reddit_detective.replied_to)
     
 Textual properties are stripped from some certain punctuation marks 
 to better comply with how Cypher deals with strings,
@@ -37,6 +43,74 @@ _ACCEPTED_INDEXES = ["hot", "new", "controversial", "top"]  # Do NOT alter this
 _ACCEPTED_TIME_FILTERS = ["all", "hour", "day", "week", "month", "year"]  # Do NOT alter this
 
 
+class _Absent:
+    """
+    Value of a field that is not in the payload of a DictBase object
+    Properties with absent values are left out of the Cypher code
+    """
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "ABSENT"
+
+
+ABSENT = _Absent()
+
+
+def _str(value):
+    # Boolean values are converted to str, absent values stay absent instead of becoming "ABSENT"
+    return value if value is ABSENT else str(value)
+
+
+def _text(value):
+    return value if value is ABSENT or value is None else str(strip_punc(value))
+
+
+def _props_code(properties):
+    # See Node.props_code
+    keys, values = zip(*properties.items())
+    props_str = ""
+    for i in range(len(keys)):
+        value_ = f"\"{values[i]}\"" if type(values[i]) == str else values[i]
+        # Replace \n with two spaces
+        prop = f"{keys[i]}: " + str(value_).replace("\n", "  ") + ","
+        props_str += prop + " "
+    return "{" + props_str[:-2] + "}"  # Delete the comma and space at the end with [:-2]
+
+
+class NodeCode(str):
+    """
+    The MERGE code of a node, which also keeps the node record (types and properties) it's made of,
+    so that the node can be stored without parsing the code (see reddit_detective.crawl_snapshot)
+    """
+    def __new__(cls, types, properties):
+        node_fingerprint = fingerprint(properties)
+        code = super().__new__(
+            cls, f"MERGE (n:{':'.join(types)} {_props_code(properties)}) SET n.fingerprint = \"{node_fingerprint}\";"
+        )
+        code.types = list(types)
+        code.properties = properties
+        code.fingerprint = node_fingerprint
+        return code
+
+
+def _merge_code(types, properties):
+    # See Node.merge_code
+    return NodeCode(types, properties)
+
+
+def _is_suspended(resp):
+    if isinstance(resp, DictBase):
+        return resp.get("is_suspended") is True
+    # PRAW objects of suspended accounts have no created_utc
+    try:
+        _ = resp.created_utc
+        return False
+    except AttributeError:
+        return True
+
+
 class Node(ABC):
     """
     Abstract class to implement common properties of nodes
@@ -45,12 +119,12 @@ class Node(ABC):
     self.properties are the properties we're gonna show at the Graph Database
     """
     def __init__(self,
-                 api: Union[praw.Reddit, None],
+                 api: Union["praw.Reddit", "ClientPool", None],
                  name,
                  limit,
                  indexing,
                  time_filter,
-                 base_obj: Union[PrawComment, PrawSubmission, PrawSubreddit, PrawRedditor] = None
+                 base_obj: Union["PrawComment", "PrawSubmission", "PrawSubreddit", "PrawRedditor", "DictBase"] = None
                  ):
         if indexing not in _ACCEPTED_INDEXES:
             raise ValueError(f"reddit_detective only accepts {_ACCEPTED_INDEXES} as indexes")
@@ -86,6 +160,18 @@ class Node(ABC):
         """
         return f":{':'.join(self.types)}"
 
+    def _written_properties(self):
+        # None is not a value in Cypher, a property with no (or an absent) value is left out
+        return {k: v for k, v in self.properties.items() if v is not None and v is not ABSENT}
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of the properties written to the graph, stored on the node as the fingerprint property
+        so that an unchanged node can be skipped on the next run (see reddit_detective.fingerprints)
+        """
+        return fingerprint(self._written_properties())
+
     def props_code(self):
         """
         Convert method self.properties to Cypher code
@@ -93,14 +179,7 @@ class Node(ABC):
         {"title": "cat"} -> {title: 'cat'}
         {"comment_karma": 1, "username": "x"} -> {comment_karma: 1, username: 'x'}
         """
-        keys, values = zip(*self.properties.items())
-        props_str = ""
-        for i in range(len(keys)):
-            value_ = f"\"{values[i]}\"" if type(values[i]) == str else values[i]
-            # Replace \n with two spaces
-            prop = f"{keys[i]}: " + str(value_).replace("\n", "  ") + ","
-            props_str += prop + " "
-        return "{" + props_str[:-2] + "}"  # Delete the comma and space at the end with [:-2]
+        return _props_code(self._written_properties())
 
     def code(self):
         """
@@ -112,8 +191,11 @@ class Node(ABC):
         """
         We use MERGE instead of CREATE, so that a duplicate node
         should not be created in case the node exists.
+
+        The fingerprint is SET instead of being a part of the MERGE pattern,
+        so that nodes written before fingerprints existed are still matched.
         """
-        return "MERGE " + self.code()
+        return _merge_code(self.types, self._written_properties())
 
 
 class Subreddit(Node):
@@ -130,9 +212,9 @@ class Subreddit(Node):
         self.properties = {
             "id": self.resp.id,
             "created_utc": self.resp.created_utc,
-            "name": str(self.resp.display_name),
-            "over18": str(self.resp.over18),
-            "desc": str(strip_punc(self.resp.description))
+            "name": _str(self.resp.display_name),
+            "over18": _str(self.resp.over18),
+            "desc": _text(self.resp.description)
         }
         self._submissions_cached = {}
 
@@ -201,12 +283,12 @@ class Submission(SubOrComment):
         self.properties = {
             "id": self.resp.id,
             "created_utc": self.resp.created_utc,
-            "title": str(strip_punc(self.resp.title)),
-            "text": str(strip_punc(self.resp.selftext)),
-            "archived": str(self.resp.archived),
-            "stickied": str(self.resp.stickied),
-            "locked": str(self.resp.locked),
-            "over18": str(self.resp.over_18),
+            "title": _text(self.resp.title),
+            "text": _text(self.resp.selftext),
+            "archived": _str(self.resp.archived),
+            "stickied": _str(self.resp.stickied),
+            "locked": _str(self.resp.locked),
+            "over18": _str(self.resp.over_18),
         }
         self._comments_cached = []
 
@@ -251,17 +333,16 @@ class Redditor(Node):
         self.resp = base_obj if base_obj else self.api.redditor(self.name)
         self._submissions_cached = {}
         self._comments_cached = {}
-        try:
-            _ = self.resp.created_utc
+        if not _is_suspended(self.resp):
             self.properties = {
                 "id": self.resp.id,
                 "username": str(self.resp.name),
                 "created_utc": self.resp.created_utc,
-                "has_verified_email": str(self.resp.has_verified_email),
-                "employee": str(self.resp.is_employee),
+                "has_verified_email": _str(self.resp.has_verified_email),
+                "employee": _str(self.resp.is_employee),
                 "suspended": "False"
             }
-        except AttributeError:
+        else:
             self.properties = {
                 "id": str(self.resp.name),
                 "username": str(self.resp.name),
@@ -327,7 +408,7 @@ class Comment(SubOrComment):
     main_type = "Comment"
     available_types = []
 
-    def __init__(self, api: Union[praw.Reddit, None], id_, base_obj=None):
+    def __init__(self, api: Union["praw.Reddit", "ClientPool", None], id_, base_obj=None):
         self.api = api
         self.id = id_
         self.base_obj = base_obj
@@ -335,9 +416,9 @@ class Comment(SubOrComment):
         self.properties = {
             "id": self.resp.id,
             "created_utc": self.resp.created_utc,
-            "text": strip_punc(self.resp.body),
-            "is_submitter": str(self.resp.is_submitter),
-            "stickied": str(self.resp.stickied)
+            "text": _text(self.resp.body),
+            "is_submitter": _str(self.resp.is_submitter),
+            "stickied": _str(self.resp.stickied)
         }
 
     @classmethod
@@ -365,11 +446,157 @@ class Comment(SubOrComment):
     def replies(self):
         return [Comment.from_base_obj(comm) for comm in list(self.resp.replies)]
 
+    def refresh(self):
+        """
+        Fetch the comment with its reply tree (a single request), comments of listings come without replies
+
+        A comment backed by a DictComment has the replies it was given, nothing is fetched
+        """
+        if not isinstance(self.resp, DictBase):
+            self.resp.refresh()
+
     def __str__(self):
         return f"Comment(id={self.properties['id']})"
 
 
+class DictBase:
+    """
+    A base object backed by a JSON dict (e.g. a cached API response or a dump record),
+    to be used in place of a PRAW object in from_base_obj constructors
+
+    PRAW objects fetch the fields they don't have from the API, silently.
+    A DictBase object never does:
+        strict=False: Missing fields are ABSENT, and left out of the properties of the node
+        strict=True: Missing fields raise MissingFieldError
+
+    The field names are the ones of the Reddit JSON API, as PRAW uses them too.
+    """
+    def __init__(self, data: dict, strict=False):
+        self._data = data
+        self._strict = strict
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)  # Don't pretend to implement copy, pickle etc.
+        try:
+            return self._data[name]
+        except KeyError:
+            if self._strict:
+                raise MissingFieldError(f"{type(self).__name__} has no field {name}") from None
+            return ABSENT
+
+    def get(self, name, default=None):
+        return self._data.get(name, default)
+
+    def _wrap(self, cls, data, **kwargs):
+        return cls(data, self._strict, **kwargs)
+
+    def _author(self):
+        name = self._data.get("author")
+        if isinstance(name, dict):
+            return self._wrap(DictRedditor, name)
+        if name is None or name == "[deleted]":
+            if self._strict and "author" not in self._data:
+                raise MissingFieldError(f"{type(self).__name__} has no field author")
+            return None
+        redditor = {"name": name}
+        if self._data.get("author_fullname"):
+            redditor["id"] = _strip_prefix(self._data["author_fullname"])
+        return self._wrap(DictRedditor, redditor)
+
+    def _subreddit(self):
+        subreddit = self._data.get("subreddit")
+        if isinstance(subreddit, dict):
+            return self._wrap(DictSubreddit, subreddit)
+        data = {}
+        if subreddit is not None:
+            data["display_name"] = subreddit
+        if self._data.get("subreddit_id"):
+            data["id"] = _strip_prefix(self._data["subreddit_id"])
+        if not data:
+            raise MissingFieldError(f"{type(self).__name__} has no field subreddit")
+        return self._wrap(DictSubreddit, data)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._data.get('id', self._data.get('name'))})"
+
+
+def _strip_prefix(fullname):
+    # "t3_jhd0px" -> "jhd0px", PRAW objects have ids without the type prefix
+    if fullname and fullname[2:3] == "_":
+        return fullname[3:]
+    return fullname
+
+
+class DictSubreddit(DictBase):
+    pass
+
+
+class DictRedditor(DictBase):
+    @property
+    def id(self):
+        # Without an id, the username is used as id, like it's done for suspended accounts
+        return self._data.get("id", self._data.get("name"))
+
+
+class DictSubmission(DictBase):
+    @property
+    def author(self):
+        return self._author()
+
+    @property
+    def subreddit(self):
+        return self._subreddit()
+
+    @property
+    def comments(self):
+        comments = self._data.get("comments")
+        if comments is None:
+            if self._strict:
+                raise MissingFieldError("DictSubmission has no field comments")
+            return []
+        return [self._wrap(DictComment, comment, submission=self) for comment in comments]
+
+
+class DictComment(DictBase):
+    """
+    submission: The DictSubmission the comment is under, given by DictSubmission.comments
+
+    Without it, the submission is read from link_id. A link_id with the id only
+    gives a strict stub: its id can be read, making a Submission of it raises MissingFieldError
+    """
+    def __init__(self, data: dict, strict=False, submission: DictSubmission = None):
+        super().__init__(data, strict)
+        self._submission = submission
+
+    @property
+    def author(self):
+        return self._author()
+
+    @property
+    def submission(self):
+        if self._submission is not None:
+            return self._submission
+        link_id = self._data.get("link_id")
+        if isinstance(link_id, dict):
+            return self._wrap(DictSubmission, link_id)
+        if link_id is None:
+            raise MissingFieldError("DictComment has no field link_id")
+        return DictSubmission({"id": _strip_prefix(link_id)}, strict=True)
+
+    @property
+    def replies(self):
+        # Listing as the JSON API gives it, "" for no replies
+        replies = self._data.get("replies")
+        if not replies:
+            return []
+        if isinstance(replies, dict):
+            replies = [child["data"] for child in replies["data"]["children"] if child["kind"] == "t1"]
+        return [self._wrap(DictComment, reply, submission=self._submission) for reply in replies]
+
+
 class Relationships:
     moderates = "MODERATES"
     under = "UNDER"
     authored = "AUTHORED"
+    replied_to = "REPLIED_TO"
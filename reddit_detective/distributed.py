@@ -0,0 +1,453 @@
+"""
+Coordinator/worker mode to shard crawls across several hosts
+
+    Coordinator: puts starting points (Subreddit, Redditor, Submission) to a WorkQueue as WorkItems,
+        then merges the results published by the workers into Neo4j (single writer)
+    Worker: leases a WorkItem, runs Submissions/Comments/CommentsReplies on it,
+        publishes deduplicated node (MERGE) and relationship (link) codes
+
+Codes are published as records (see reddit_detective.codes), so they keep their types.
+
+Leases expire. If a worker dies while holding an item, another worker picks it up
+after lease_seconds. An item leased more than max_attempts times is marked as failed.
+
+Queue backends:
+    SQLiteWorkQueue: a single SQLite file, fine for local testing or a shared disk
+    FileWorkQueue: a directory, relies on atomic os.rename for leasing
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Union
+
+from reddit_detective.codes import code_record, code_from_record, unique_records
+from reddit_detective.data_models import Subreddit, Submission, Redditor
+from reddit_detective.network import RedditNetwork
+from reddit_detective.relationships import Submissions, Comments, CommentsReplies
+
+logger = logging.getLogger(__name__)
+
+_STARTING_POINTS = {
+    "Subreddit": Subreddit,
+    "Submission": Submission,
+    "Redditor": Redditor
+}
+_COMPONENTS = {
+    "submissions": Submissions,
+    "comments": Comments,
+    "replies": CommentsReplies
+}
+
+
+def _dump_codes(codes):
+    return json.dumps([code_record(code) for code in codes])
+
+
+def _load_codes(data):
+    return [code_from_record(record) for record in json.loads(data)]
+
+
+class WorkItem:
+    """
+    A serializable starting point + degree, e.g.
+        WorkItem("Subreddit", "learnpython", "comments", limit=5)
+    stands for Comments(Subreddit(api, "learnpython", limit=5))
+    """
+    def __init__(self, kind, name, degree, limit=None, indexing="hot", time_filter="all",
+                 id_=None, attempts=0):
+        if kind not in _STARTING_POINTS:
+            raise ValueError(f"reddit_detective only accepts {list(_STARTING_POINTS)} as starting points")
+        if degree not in _COMPONENTS:
+            raise ValueError(f"reddit_detective only accepts {list(_COMPONENTS)} as degrees")
+        self.kind = kind
+        self.name = name
+        self.degree = degree
+        self.limit = limit
+        self.indexing = indexing
+        self.time_filter = time_filter
+        self.id = id_ if id_ else uuid.uuid4().hex
+        self.attempts = attempts
+
+    def component(self, api):
+        start = _STARTING_POINTS[self.kind](api, self.name, self.limit, self.indexing, self.time_filter)
+        return _COMPONENTS[self.degree](start)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "degree": self.degree,
+            "limit": self.limit,
+            "indexing": self.indexing,
+            "time_filter": self.time_filter,
+            "id_": self.id,
+            "attempts": self.attempts
+        }
+
+    @classmethod
+    def from_dict(cls, dict_):
+        return cls(**dict_)
+
+    def __str__(self):
+        return f"WorkItem({self.degree}, {self.kind}({self.name}))"
+
+
+class WorkQueue(ABC):
+    """
+    Abstract class for the shared work queue
+
+    Items go through: pending -> leased -> done
+    A leased item goes back to pending when its lease expires or the worker calls fail(),
+    and goes to failed after max_attempts leases.
+    """
+    def __init__(self, max_attempts=3):
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def put(self, item: WorkItem):
+        pass
+
+    @abstractmethod
+    def lease(self, worker_id, lease_seconds):
+        """
+        Return a pending or lease-expired WorkItem, None if there is nothing to do
+        """
+        pass
+
+    @abstractmethod
+    def complete(self, item: WorkItem, merges: List[str], links: List[str]):
+        """
+        Publish the result of an item and mark it as done
+        """
+        pass
+
+    @abstractmethod
+    def fail(self, item: WorkItem):
+        pass
+
+    @abstractmethod
+    def results(self, limit=None):
+        """
+        Return unmerged results as a list of (result_id, merges, links), the first limit of them if given
+        """
+        pass
+
+    @abstractmethod
+    def mark_merged(self, result_id):
+        pass
+
+    @abstractmethod
+    def counts(self):
+        """
+        Number of items in each state, as a dict
+        """
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    def __init__(self, path, max_attempts=3):
+        super(SQLiteWorkQueue, self).__init__(max_attempts)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    leased_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+)""")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id TEXT NOT NULL,
+    merges TEXT NOT NULL,
+    links TEXT NOT NULL,
+    merged INTEGER NOT NULL DEFAULT 0
+)""")
+
+    def put(self, item: WorkItem):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO items (id, payload, state, attempts) VALUES (?, ?, 'pending', ?)",
+            (item.id, json.dumps(item.to_dict()), item.attempts)
+        )
+
+    def lease(self, worker_id, lease_seconds):
+        now = time.time()
+        c = self._conn
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # Items whose lease expired too many times are given up on
+            c.execute(
+                "UPDATE items SET state = 'failed' "
+                "WHERE state = 'leased' AND leased_until < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            row = c.execute(
+                "SELECT id, payload, attempts FROM items "
+                "WHERE state = 'pending' OR (state = 'leased' AND leased_until < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                c.execute("COMMIT")
+                return None
+            id_, payload, attempts = row
+            c.execute(
+                "UPDATE items SET state = 'leased', worker = ?, leased_until = ?, attempts = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, attempts + 1, id_)
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        item = WorkItem.from_dict(json.loads(payload))
+        item.attempts = attempts + 1
+        return item
+
+    def complete(self, item: WorkItem, merges, links):
+        c = self._conn
+        c.execute("BEGIN IMMEDIATE")
+        c.execute(
+            "INSERT INTO results (item_id, merges, links) VALUES (?, ?, ?)",
+            (item.id, _dump_codes(merges), _dump_codes(links))
+        )
+        c.execute("UPDATE items SET state = 'done', leased_until = NULL WHERE id = ?", (item.id,))
+        c.execute("COMMIT")
+
+    def fail(self, item: WorkItem):
+        state = "failed" if item.attempts >= self.max_attempts else "pending"
+        self._conn.execute(
+            "UPDATE items SET state = ?, worker = NULL, leased_until = NULL WHERE id = ?",
+            (state, item.id)
+        )
+
+    def results(self, limit=None):
+        rows = self._conn.execute(
+            "SELECT id, merges, links FROM results WHERE merged = 0 ORDER BY id LIMIT ?",
+            (limit if limit is not None else -1,)
+        )
+        return [(id_, _load_codes(merges), _load_codes(links)) for id_, merges, links in rows]
+
+    def mark_merged(self, result_id):
+        self._conn.execute("UPDATE results SET merged = 1 WHERE id = ?", (result_id,))
+
+    def counts(self):
+        rows = self._conn.execute("SELECT state, count(*) FROM items GROUP BY state")
+        return dict(rows)
+
+
+class FileWorkQueue(WorkQueue):
+    """
+    Directory layout:
+        pending/<item_id>.json
+        leased/<item_id>@<lease deadline>@<worker_id>.json
+        done/<item_id>.json
+        failed/<item_id>.json
+        results/<item_id>.json
+
+    Leasing is an os.rename from pending/ to leased/, only one worker can win it.
+    The lease deadline lives in the file name, so it changes atomically with the lease.
+    """
+    _STATES = ["pending", "leased", "done", "failed", "results"]
+
+    def __init__(self, path, max_attempts=3):
+        super(FileWorkQueue, self).__init__(max_attempts)
+        self.path = path
+        for state in self._STATES:
+            os.makedirs(os.path.join(path, state), exist_ok=True)
+
+    def _file(self, state, name):
+        return os.path.join(self.path, state, name)
+
+    def _write(self, path, dict_):
+        # Write to a temporary file first so that readers never see a half written file
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict_, f)
+        os.replace(tmp, path)
+
+    def _reclaim_expired(self):
+        now = time.time()
+        for name in os.listdir(os.path.join(self.path, "leased")):
+            if name.endswith(".tmp"):
+                continue
+            id_, deadline, _ = name[:-len(".json")].split("@", 2)
+            if float(deadline) < now:
+                try:
+                    os.rename(self._file("leased", name), self._file("pending", f"{id_}.json"))
+                except FileNotFoundError:
+                    pass  # Reclaimed by another worker, or completed just in time
+
+    def put(self, item: WorkItem):
+        self._write(self._file("pending", f"{item.id}.json"), item.to_dict())
+
+    def lease(self, worker_id, lease_seconds):
+        self._reclaim_expired()
+        for name in sorted(os.listdir(os.path.join(self.path, "pending"))):
+            if name.endswith(".tmp"):
+                continue
+            id_ = name[:-len(".json")]
+            leased_name = f"{id_}@{time.time() + lease_seconds}@{worker_id}.json"
+            try:
+                os.rename(self._file("pending", name), self._file("leased", leased_name))
+            except FileNotFoundError:
+                continue  # Another worker leased it first
+            with open(self._file("leased", leased_name)) as f:
+                item = WorkItem.from_dict(json.load(f))
+            item.attempts += 1
+            if item.attempts > self.max_attempts:
+                os.rename(self._file("leased", leased_name), self._file("failed", f"{id_}.json"))
+                continue
+            self._write(self._file("leased", leased_name), item.to_dict())
+            return item
+        return None
+
+    def _leased_file(self, item: WorkItem):
+        for name in os.listdir(os.path.join(self.path, "leased")):
+            if name.startswith(f"{item.id}@") and not name.endswith(".tmp"):
+                return self._file("leased", name)
+        return None
+
+    def complete(self, item: WorkItem, merges, links):
+        self._write(self._file("results", f"{item.id}.json"), {
+            "merges": [code_record(code) for code in merges],
+            "links": [code_record(code) for code in links]
+        })
+        leased = self._leased_file(item)
+        if leased is not None:
+            try:
+                os.rename(leased, self._file("done", f"{item.id}.json"))
+            except FileNotFoundError:
+                pass  # Lease expired and got reclaimed, the duplicate result is harmless
+
+    def fail(self, item: WorkItem):
+        leased = self._leased_file(item)
+        if leased is None:
+            return
+        state = "failed" if item.attempts >= self.max_attempts else "pending"
+        try:
+            os.rename(leased, self._file(state, f"{item.id}.json"))
+        except FileNotFoundError:
+            pass
+
+    def results(self, limit=None):
+        results = []
+        for name in sorted(os.listdir(os.path.join(self.path, "results"))):
+            if not name.endswith(".json"):
+                continue
+            if limit is not None and len(results) >= limit:
+                break
+            with open(self._file("results", name)) as f:
+                result = json.load(f)
+            results.append((
+                name[:-len(".json")],
+                [code_from_record(record) for record in result["merges"]],
+                [code_from_record(record) for record in result["links"]]
+            ))
+        return results
+
+    def mark_merged(self, result_id):
+        os.rename(self._file("results", f"{result_id}.json"), self._file("results", f"{result_id}.merged"))
+
+    def counts(self):
+        return {
+            state: len([name for name in os.listdir(os.path.join(self.path, state)) if name.endswith(".json")])
+            for state in self._STATES if state != "results"
+        }
+
+
+class Worker:
+    """
+    Leases WorkItems, crawls them and publishes the results
+    """
+    def __init__(self, queue: WorkQueue, api, worker_id=None, lease_seconds=600):
+        self.queue = queue
+        self.api = api
+        self.worker_id = worker_id if worker_id else f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+
+    def run_once(self):
+        """
+        Process a single item, returns False if the queue had nothing to lease
+        """
+        item = self.queue.lease(self.worker_id, self.lease_seconds)
+        if item is None:
+            return False
+        try:
+            merges, links = item.component(self.api)._merges_and_links()
+        except Exception:
+            self.queue.fail(item)
+            raise
+        self.queue.complete(item, unique_records(merges), unique_records(links))
+        return True
+
+    def run(self, poll_interval=5, idle_timeout=None):
+        """
+        Process items until the queue stays empty for idle_timeout seconds
+        (forever if idle_timeout is None)
+
+        An item that fails is logged and put back to the queue, until it runs out of attempts
+        """
+        idle_since = time.time()
+        while True:
+            try:
+                processed = self.run_once()
+            except Exception:
+                logger.exception("Worker %s failed an item", self.worker_id)
+                processed = True
+            if processed:
+                idle_since = time.time()
+                continue
+            if idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+
+
+class Coordinator:
+    """
+    Puts work to the queue and merges the published results into Neo4j as the single writer
+    """
+    def __init__(self, queue: WorkQueue, driver):
+        self.queue = queue
+        self.driver = driver
+
+    def submit(self, items: Union[WorkItem, List[WorkItem]]):
+        if isinstance(items, WorkItem):
+            items = [items]
+        for item in items:
+            self.queue.put(item)
+
+    def merge(self, results_per_chunk=100, chunk_size=None):
+        """
+        Write every unmerged result to Neo4j, return the number of merged results
+
+        Results are read and written results_per_chunk at a time, so that only those are in memory,
+        each chunk is marked as merged once it's written.
+        chunk_size works the same way as in RedditNetwork.run_cypher_code.
+
+        In a chunk, nodes are merged before the relationships so that every link finds its nodes.
+        A result has the nodes of its own links, so no link waits for a node of another chunk.
+        """
+        net = RedditNetwork(driver=self.driver, components=[])
+        merged = 0
+        while True:
+            results = self.queue.results(limit=results_per_chunk)
+            if not results:
+                return merged
+            merges = unique_records(code for _, result_merges, _ in results for code in result_merges)
+            links = unique_records(code for _, _, result_links in results for code in result_links)
+            net._run_query(merges + links, chunk_size)
+            for result_id, _, _ in results:
+                self.queue.mark_merged(result_id)
+            merged += len(results)
+
+    def done(self):
+        counts = self.queue.counts()
+        return not counts.get("pending") and not counts.get("leased")
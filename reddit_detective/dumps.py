@@ -0,0 +1,151 @@
+"""
+Offline ingestion from Reddit dump files, without the API
+
+Dump files have a JSON object per line (submissions and/or comments, e.g. Pushshift dumps),
+optionally compressed with zstd (.zst) or gzip (.gz).
+Records go through the same data models (Submission, Comment, Redditor, Subreddit)
+and the same relationship rules as the Submissions and Comments components.
+
+Files are parsed chunk by chunk, only records_per_chunk records are in memory at once:
+    net.load_dumps(["RS_2020-01.zst", "RC_2020-01.zst"], records_per_chunk=10000, chunk_size=1000)
+
+Records are wrapped in DictBase objects (see data_models), fields missing in dumps
+are left out of the properties instead of being fetched:
+    - Subreddits and redditors are not merged, dumps only have their id and name:
+      a later API crawl could not MERGE its nodes into such partial ones.
+      Submissions and comments are linked to the ones in the graph (crawled through the API),
+      Dumps.partial counts the nodes left out.
+      For a graph built from dumps only, partial_nodes=True merges them with their id and name
+    - A comment is linked to its submission only if the submission is in the graph,
+      so load submission dumps before comment dumps
+    - With replied_to=True, REPLIED_TO relationships (see reddit_detective.replied_to)
+      are derived from the parents in the same chunk only
+
+zstd needs the zstandard package: pip install reddit_detective[dumps]
+"""
+import gzip
+import io
+import json
+
+from reddit_detective.data_models import Comment, Submission, DictComment, DictSubmission, NodeCode
+from reddit_detective.materialized import StaleCountersCode
+from reddit_detective.relationships import Comments
+from reddit_detective.replied_to import _replied_to_codes
+
+# Pushshift zstd dumps are compressed with a long window
+_ZSTD_MAX_WINDOW = 2 ** 31
+
+
+def _created_utc(record):
+    # Older dumps have created_utc as a string
+    created_utc = record.get("created_utc")
+    if isinstance(created_utc, str):
+        record["created_utc"] = float(created_utc)
+    return record
+
+
+def _partial(code):
+    # Redditor and Subreddit nodes of dumps have no created_utc, suspended redditors never have one
+    return (isinstance(code, NodeCode) and code.types[0] in ("Redditor", "Subreddit")
+            and "created_utc" not in code.properties and code.properties.get("suspended") != "True")
+
+
+def open_dump(path):
+    """
+    Open a dump file as a text stream, decompressing by extension
+    """
+    if path.endswith(".zst"):
+        import zstandard
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor(max_window_size=_ZSTD_MAX_WINDOW).stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="replace")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_dump(path):
+    """
+    Yield the records of a dump file one by one, skipping the lines that are not valid JSON
+    """
+    with open_dump(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield _created_utc(json.loads(line))
+            except ValueError:
+                continue
+
+
+class Dumps(Comments):
+    """
+    A component reading dump files instead of the API
+
+    Can be used like other components in RedditNetwork,
+    or chunk by chunk with RedditNetwork.load_dumps for files bigger than the memory
+
+    partial_nodes: Merge the subreddits and redditors with their id and name only,
+        for graphs that won't be crawled through the API too
+    """
+    def __init__(self, paths, records_per_chunk=10000, replied_to=False, partial_nodes=False):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.records_per_chunk = records_per_chunk
+        self.materialize_metrics = False
+        self.replied_to = replied_to
+        self.partial_nodes = partial_nodes
+        self.skipped = 0  # Records that are neither submissions nor comments
+        self.partial = 0  # Redditor and Subreddit nodes left out, dumps have their id and name only
+
+    def _records(self):
+        for path in self.paths:
+            yield from read_dump(path)
+
+    def _chunk_codes(self, records):
+        submissions = []
+        comments = []
+        for record in records:
+            if "link_id" in record and "body" in record:
+                comments.append(Comment.from_base_obj(DictComment(record)))
+            elif "title" in record:
+                submissions.append(Submission.from_base_obj(DictSubmission(record), limit=None))
+            else:
+                self.skipped += 1
+        # The submissions of the comments are stubs with ids only, they are not merged
+        comment_merges, comment_links, _ = self._merge_and_link_comments(comments, with_submissions=False)
+        sub_merges, sub_links = self._merge_and_link_submissions(submissions)
+        links = sub_links + comment_links
+        if self.replied_to:
+            links += _replied_to_codes(comments, submissions)
+        if comments:
+            links.append(StaleCountersCode())  # Comments are not counted, see reddit_detective.materialized
+        merges = sub_merges + comment_merges
+        if self.partial_nodes:
+            return merges, links
+        complete = [code for code in merges if not _partial(code)]
+        self.partial += len(merges) - len(complete)
+        return complete, links
+
+    def chunks(self):
+        """
+        Yield (merges, links) for every records_per_chunk records
+        """
+        chunk = []
+        for record in self._records():
+            chunk.append(record)
+            if len(chunk) >= self.records_per_chunk:
+                yield self._chunk_codes(chunk)
+                chunk = []
+        if chunk:
+            yield self._chunk_codes(chunk)
+
+    def _merges_and_links(self):
+        merges, links = [], []
+        for chunk_merges, chunk_links in self.chunks():
+            merges += chunk_merges
+            links += chunk_links
+        return merges, links
+
+    def __str__(self):
+        return f"Dumps({', '.join(self.paths)})"
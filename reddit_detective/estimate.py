@@ -0,0 +1,219 @@
+"""
+Estimate what a crawl costs before running it
+
+    est = net.estimate()
+    print(est)  # API requests, nodes, relationships and wall time, per component and in total
+    if est.requests > 5000:
+        ...  # Lower the limits, or use CommentsReplies(..., max_requests=...)
+
+The estimate samples cheaply:
+    - The first page (up to 100 items) of the listing the component would crawl,
+      which tells the number of submissions/comments and the num_comments of each submission
+    - The comment trees of `trees` sampled submissions (one request each),
+      which tell how many comments and replies a crawl actually loads per num_comments,
+      and how many of their authors are distinct
+
+Requests are counted the way the components make them: PRAW fetches the listings in pages of 100,
+(Subreddit and Redditor nodes fetch the listings of all four indexings),
+and every author, subreddit and (for Redditor comments) submission object is fetched when it's read.
+A budgeted CommentsReplies refreshes each comment of a Redditor listing it expands the replies of
+(one request each, max_requests at most), the comments of submissions come with their replies.
+Only the components crawling from a starting point (Submissions, Comments, CommentsReplies) are estimated.
+Expect the numbers to be in the right order of magnitude, not exact.
+
+Wall time assumes requests_per_second, by default Reddit's OAuth rate limit
+(1000 requests per 10 minutes) per client.
+"""
+import math
+from statistics import mean
+
+from reddit_detective.data_models import Redditor, Submission, Subreddit
+from reddit_detective.relationships import Comments, CommentsReplies
+
+_PAGE = 100  # Items per listing request
+_MAX_LISTING = 1000  # Reddit does not list more than that
+_INDEXINGS = 4  # Subreddit and Redditor nodes fetch new, hot, controversial and top
+_DEFAULT_RATE = 1000 / 600
+
+
+class CrawlEstimate:
+    def __init__(self, name, requests=0, nodes=0, relationships=0, seconds=0.0):
+        self.name = name
+        self.requests = int(math.ceil(requests))
+        self.nodes = int(math.ceil(nodes))
+        self.relationships = int(math.ceil(relationships))
+        self.seconds = seconds
+
+    def __add__(self, other):
+        return CrawlEstimate("Total", self.requests + other.requests, self.nodes + other.nodes,
+                             self.relationships + other.relationships, self.seconds + other.seconds)
+
+    def __str__(self):
+        return (f"{self.name}: ~{self.requests} requests, ~{self.nodes} nodes, "
+                f"~{self.relationships} relationships, ~{self.seconds / 60:.1f} minutes")
+
+
+class NetworkEstimate(CrawlEstimate):
+    """
+    The total of the components, self.components has the estimate of each component
+    """
+    def __init__(self, components):
+        total = sum(components, CrawlEstimate("Total"))
+        super().__init__("Total", total.requests, total.nodes, total.relationships, total.seconds)
+        self.components = components
+
+    def __str__(self):
+        return "\n".join([str(est) for est in self.components] + [super().__str__()])
+
+
+def _pages(count):
+    return math.ceil(count / _PAGE) if count else 1
+
+
+def _distinct(names):
+    names = [name for name in names if name is not None]
+    return len(set(names)) / len(names) if names else 1.0
+
+
+def _listing(node, kind, limit):
+    resp = node.resp
+    if isinstance(node, Subreddit):
+        listing = getattr(resp, node.indexing)
+    else:
+        listing = getattr(getattr(resp, kind), node.indexing)
+    if node.indexing in ["top", "controversial"]:
+        return list(listing(time_filter=node.time_filter, limit=limit))
+    return list(listing(limit=limit))
+
+
+def _count(node, kind):
+    """
+    Return (estimated # of items the crawl lists, sampled first page)
+    """
+    limit = node.limit if node.limit is not None else _MAX_LISTING
+    page = _listing(node, kind, min(limit, _PAGE))
+    if len(page) < min(limit, _PAGE):
+        return len(page), page  # The whole listing fits into the first page
+    return limit, page
+
+
+class _TreeSample:
+    """
+    Ratios measured on the comment trees of the sampled submissions
+    """
+    def __init__(self, submissions, trees):
+        from praw.models import MoreComments
+        loaded, num_comments, replies, authors = 0, 0, 0, []
+        for sub in submissions[:trees]:
+            top = [comm for comm in list(sub.comments) if not isinstance(comm, MoreComments)]
+            loaded += len(top)
+            num_comments += sub.num_comments
+            for comm in top:
+                authors.append(comm.author.name if comm.author is not None else None)
+                for reply in comm.replies:
+                    if not isinstance(reply, MoreComments):
+                        replies += 1
+                        authors.append(reply.author.name if reply.author is not None else None)
+        self.top_ratio = loaded / num_comments if num_comments else 0.0  # Top level comments per num_comments
+        self.replies_ratio = replies / loaded if loaded else 0.0  # Direct replies per top level comment
+        self.authored = sum(1 for a in authors if a is not None) / len(authors) if authors else 1.0
+        self.distinct_authors = _distinct(authors)
+
+
+def _submissions_part(node, subs, count):
+    """
+    Requests, nodes and relationships of the Submissions degree, for count submissions like subs
+    """
+    authored = mean([sub.author is not None for sub in subs]) if subs else 1.0
+    distinct = _distinct([sub.author.name if sub.author is not None else None for sub in subs])
+    subreddits = 1 if isinstance(node, Subreddit) else count * _distinct([sub.subreddit.display_name for sub in subs])
+    # Every submission fetches its subreddit and its author
+    requests = count * (1 + authored)
+    nodes = count + subreddits + count * authored * distinct
+    relationships = count * (1 + authored)
+    return requests, nodes, relationships
+
+
+def _replies_part(component, loaded, listed, sample):
+    """
+    Requests, nodes and relationships of the replies of base comments:
+    loaded ones come with their replies, listed ones (from a listing) are refreshed to load theirs,
+    by budgeted crawls only
+    """
+    refreshed = listed if component.budgeted else 0
+    if component.max_requests is not None:
+        refreshed = min(refreshed, component.max_requests)
+    requests, nodes, relationships = _comments_part((loaded + refreshed) * sample.replies_ratio, sample)
+    return requests + refreshed, nodes, relationships
+
+
+def _comments_part(count, sample):
+    """
+    Requests, nodes and relationships of count comments like the sampled ones, each fetching its author
+    """
+    requests = count * sample.authored
+    nodes = count + count * sample.authored * sample.distinct_authors
+    relationships = count * (1 + sample.authored)
+    return requests, nodes, relationships
+
+
+def estimate_component(component, trees=2, requests_per_second=None):
+    """
+    Estimate a Submissions, Comments or CommentsReplies component
+    """
+    node = getattr(component, "start", None)
+    if node is None:
+        raise ValueError(f"{type(component).__name__} can't be estimated, "
+                         f"only the components crawling from a starting point can")
+    replies = isinstance(component, CommentsReplies)
+    comments = replies or isinstance(component, Comments)
+    requests, nodes, relationships = 1, 0, 0  # The starting point itself is fetched
+    parts = []
+    if isinstance(node, Redditor) and comments and not replies:
+        # Comments of a Redditor only bring the submissions they're under
+        subs, count = [], 0
+    elif isinstance(node, Submission):
+        subs, count = [node.resp], 1
+    else:
+        count, subs = _count(node, "submissions")
+        requests += _INDEXINGS * _pages(count)
+    if subs or count:
+        parts.append(_submissions_part(node, subs, count))
+    sample = _TreeSample(subs, trees) if comments else None
+
+    if comments and isinstance(node, Redditor):
+        comment_count, comment_page = _count(node, "comments")
+        requests += _INDEXINGS * _pages(comment_count)
+        submissions = comment_count * _distinct([comm.submission.id for comm in comment_page])
+        # Every comment fetches its author and its submission,
+        # every submission fetches its subreddit and its author
+        requests += comment_count * 2 + submissions * 2
+        nodes += comment_count + submissions * 3
+        relationships += comment_count * 2 + submissions * 2
+    if replies and isinstance(node, Redditor):
+        # Parents of the comments of the Redditor, and the comments under their submissions
+        requests += comment_count + count
+        num_comments = mean([sub.num_comments for sub in subs]) if subs else 0
+        sub_comments = count * num_comments * sample.top_ratio
+        parts.append(_comments_part(sub_comments, sample))
+        # Replies of the comments of the Redditor and of the comments under their submissions
+        parts.append(_replies_part(component, sub_comments, comment_count, sample))
+    elif comments and not isinstance(node, Redditor):
+        num_comments = mean([sub.num_comments for sub in subs]) if subs else 0
+        top = count * num_comments * sample.top_ratio
+        if isinstance(node, Subreddit):
+            requests += count  # A comment tree per submission
+        parts.append(_comments_part(top, sample))
+        if replies:
+            parts.append(_replies_part(component, top, 0, sample))
+
+    for part_requests, part_nodes, part_relationships in parts:
+        requests += part_requests
+        nodes += part_nodes
+        relationships += part_relationships
+    rate = requests_per_second if requests_per_second else _DEFAULT_RATE * len(getattr(node.api, "clients", [None]))
+    return CrawlEstimate(f"{type(component).__name__}({node})", requests, nodes, relationships, requests / rate)
+
+
+def estimate_network(components, trees=2, requests_per_second=None):
+    return NetworkEstimate([estimate_component(component, trees, requests_per_second) for component in components])
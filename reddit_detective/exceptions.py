@@ -1 +1,24 @@
-#
+class MissingFieldError(AttributeError):
+    """
+    A field is not in the payload of a DictBase object (see data_models.DictBase)
+    Raised instead of fetching the field from the API
+    """
+    pass
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a crawl snapshot can't be read (not a snapshot, another schema version or truncated)
+    """
+
+
+class SinkError(ValueError):
+    """
+    Raised when a sink is given a code it can't write (e.g. Cypher that MemoryGraph does not interpret)
+    """
+
+
+class CheckpointError(ValueError):
+    """
+    Raised when a checkpoint journal can't be resumed (empty, or its plan is torn)
+    """
@@ -0,0 +1,101 @@
+"""
+Export the Cypher code of a network as a script for cypher-shell
+
+RedditNetwork.cypher_code joins every code into one string in memory.
+For a database that is not reachable from where the network is crawled,
+write the codes to a file instead:
+
+    net.export_cypher("network.cypher.gz", transaction_size=1000)
+
+    # then, next to the database
+    zcat network.cypher.gz | cypher-shell -u neo4j -p password
+
+The script:
+    - Starts with the constraints (unless constraints=False),
+      run in their own transactions since Neo4j does not mix schema and data changes
+    - Wraps every transaction_size codes in a :begin / :commit block,
+      so each transaction of cypher-shell has a bounded size
+    - Is gzip compressed if the path ends with .gz (or compress=True)
+
+Codes are written as the components produce them, the whole script is never in memory.
+Dumps components are read chunk by chunk (see reddit_detective.dumps).
+"""
+import gzip
+import hashlib
+
+from reddit_detective.codes import is_record_code
+
+
+def _statement(code):
+    # cypher-shell needs every statement to end with a semicolon
+    code = code.strip()
+    if not code.endswith(";"):
+        code += ";"
+    return code
+
+
+def _digest(code):
+    # Remembering digests instead of the codes keeps the memory low for large exports
+    return hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+
+
+def iter_codes(components):
+    """
+    Yield the codes of the components one component (or one dump chunk) at a time,
+    skipping the node and relationship codes that were already yielded
+    (other codes are all kept where they are, see codes.unique_records)
+    """
+    seen = set()
+    for component in components:
+        if hasattr(component, "chunks"):
+            parts = (merges + links for merges, links in component.chunks())
+        else:
+            parts = [component.code()]
+        for codes in parts:
+            for code in codes:
+                if is_record_code(code):
+                    digest = _digest(code)
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                yield code
+
+
+def open_script(path, compress=None):
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def write_script(f, codes, transaction_size=1000, constraints=None):
+    """
+    Write the codes to the text stream f in :begin / :commit blocks of transaction_size codes
+    constraints are written first, each in its own transaction
+
+    Returns the number of codes written (constraints excluded)
+    """
+    if transaction_size < 1:
+        raise ValueError("transaction_size should be at least 1")
+    for constraint in constraints or []:
+        f.write(_statement(constraint) + "\n")
+    written = 0
+    for code in codes:
+        if written % transaction_size == 0:
+            if written:
+                f.write(":commit\n")
+            f.write(":begin\n")
+        f.write(_statement(code) + "\n")
+        written += 1
+    if written:
+        f.write(":commit\n")
+    return written
+
+
+def export_script(path, codes, transaction_size=1000, constraints=None, compress=None):
+    """
+    Same as write_script, but opens (and gzip compresses if needed) the file at path
+    """
+    with open_script(path, compress) as f:
+        return write_script(f, codes, transaction_size, constraints)
@@ -0,0 +1,68 @@
+"""
+Skip the nodes that did not change since the last run
+
+Every node MERGE code also sets a fingerprint property, a hash of the properties of the node
+(see Node.fingerprint). Before writing, the fingerprints of the nodes in the codes
+are looked up in bulk, and the MERGE codes of the nodes that exist with the same fingerprint
+are left out:
+
+    skipped = net.run_cypher_code(skip_unchanged=True)
+
+Relationship codes are always run, MERGE doesn't write a relationship that exists already.
+Nodes written before fingerprints existed have none, so they are written once more.
+Only NodeCode codes are looked up, their records are read instead of parsing the code.
+"""
+from collections import defaultdict
+
+from reddit_detective.data_models import NodeCode
+
+_LOOKUP = """
+UNWIND $ids AS id
+MATCH (n:%s {id: id})
+RETURN n.id AS id, n.fingerprint AS fingerprint
+"""
+_LOOKUP_SIZE = 5000
+
+
+def _parse(code):
+    """
+    Return (label, id, fingerprint) for a NodeCode, None for other codes
+    """
+    if not isinstance(code, NodeCode):
+        return None
+    return code.types[0], code.properties["id"], code.fingerprint
+
+
+def existing_fingerprints(driver, ids_by_label):
+    """
+    ids_by_label: {label: iterable of ids}
+    Returns {(label, id): fingerprint} of the nodes in the graph (None if they have no fingerprint)
+    """
+    found = {}
+    with driver.session() as s:
+        for label, ids in ids_by_label.items():
+            ids = list(ids)
+            for start in range(0, len(ids), _LOOKUP_SIZE):
+                for record in s.run(_LOOKUP % label, ids=ids[start:start + _LOOKUP_SIZE]):
+                    found[(label, record["id"])] = record["fingerprint"]
+    return found
+
+
+def skip_unchanged(driver, codes):
+    """
+    Return (codes without the MERGEs of unchanged nodes, # of codes skipped)
+    """
+    parsed = [_parse(code) for code in codes]
+    ids_by_label = defaultdict(set)
+    for node in parsed:
+        if node is not None:
+            ids_by_label[node[0]].add(node[1])
+    if not ids_by_label:
+        return list(codes), 0
+    existing = existing_fingerprints(driver, ids_by_label)
+    kept = []
+    for code, node in zip(codes, parsed):
+        if node is not None and existing.get((node[0], node[1])) == node[2]:
+            continue
+        kept.append(code)
+    return kept, len(codes) - len(kept)
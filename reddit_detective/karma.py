@@ -19,76 +19,104 @@ What is our solution?
     - Do not include stuff like karma in properties at creation time
     - After creation, get each node/rel's stuff like karma and add to their props
     What if the user adds more stuff to their database?
-        - Delete each node/rel's stuff like karma
-        - Then get each node/rel's stuff like karma and add to their props
+        - Set each node/rel's stuff like karma in place, with the time it's fetched (karma_updated_at)
+        - Only refresh the nodes whose stuff like karma is missing or older than a given age
     What if the user does not want to deal with stuff like karma?
         - Make it optional
 """
-import praw
-from neo4j import BoltDriver
+import time
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import praw
 
-def _set_subreddit_subscribers(api: praw.Reddit, name):
+
+def _set_subreddit_subscribers(api: "praw.Reddit", name):
     sub = api.subreddit(name)
     return """
-MATCH (n {id: "%s"})
+MATCH (n:Subreddit {id: "%s"})
 WITH n
-SET n.subscribers = %s;
-""" % (sub.id, sub.subscribers)
+SET n.subscribers = %s, n.karma_updated_at = %s;
+""" % (sub.id, sub.subscribers, time.time())
 
 
-def _set_submission_upvotes(api: praw.Reddit, id_):
+def _set_submission_upvotes(api: "praw.Reddit", id_):
     sub = api.submission(id_)
     return """
-MATCH (n {id: "%s"})
+MATCH (n:Submission {id: "%s"})
 WITH n
-SET n.score = %s, n.upvote_ratio = %s;
-""" % (sub.id, sub.score, sub.upvote_ratio)
+SET n.score = %s, n.upvote_ratio = %s, n.karma_updated_at = %s;
+""" % (sub.id, sub.score, sub.upvote_ratio, time.time())
 
 
-def _set_redditor_karma(api: praw.Reddit, name):
+def _set_redditor_karma(api: "praw.Reddit", name):
     red = api.redditor(name)
     return """
-MATCH (n {id: "%s"})
+MATCH (n:Redditor {id: "%s"})
 WITH n
-SET n.comment_karma = %s, n.link_karma = %s
-""" % (red.id, red.comment_karma, red.link_karma)
+SET n.comment_karma = %s, n.link_karma = %s, n.karma_updated_at = %s;
+""" % (red.id, red.comment_karma, red.link_karma, time.time())
 
 
-def _set_comment_score(api: praw.Reddit, id_):
+def _set_comment_score(api: "praw.Reddit", id_):
     comm = api.comment(id_)
     return """
 MATCH (n:Comment {id: "%s"})
 WITH n
-SET n.score = %s;
-""" % (comm.id, comm.score)
+SET n.score = %s, n.karma_updated_at = %s;
+""" % (comm.id, comm.score, time.time())
+
+
+# label: the property the karma functions take (name for subreddits and redditors, id for the rest)
+_KARMA_KEYS = {
+    "Subreddit": "name",
+    "Submission": "id",
+    "Redditor": "username",
+    "Comment": "id",
+}
+
+
+def _stale_query(label):
+    """
+    Nodes of the label whose stuff like karma is missing or set before $updated_before,
+    created after $created_after (both are optional)
+    Suspended redditors have no karma to fetch
+    """
+    suspended = 'AND coalesce(n.suspended, "False") = "False"' if label == "Redditor" else ""
+    return """
+MATCH (n:%s)
+WHERE ($updated_before IS NULL OR n.karma_updated_at IS NULL OR n.karma_updated_at < $updated_before)
+  AND ($created_after IS NULL OR n.created_utc >= $created_after)
+  %s
+RETURN n.%s AS key
+""" % (label, suspended, _KARMA_KEYS[label])
 
 
 remove_stuff_subreddit = """
 MATCH (n:Subreddit)
 WITH n
-REMOVE n.subscribers;
+REMOVE n.subscribers, n.karma_updated_at;
 """
 
 
 remove_stuff_submission = """
 MATCH (n:Submission)
 WITH n
-REMOVE n.score, n.upvote_ratio;
+REMOVE n.score, n.upvote_ratio, n.karma_updated_at;
 """
 
 
 remove_stuff_redditor = """
 MATCH (n:Redditor)
 WITH n
-REMOVE n.comment_karma, n.link_karma;
+REMOVE n.comment_karma, n.link_karma, n.karma_updated_at;
 """
 
 
 remove_stuff_comment = """
-MATCH ()-[n:Comment]-()
+MATCH (n:Comment)
 WITH n
-REMOVE n.score;
+REMOVE n.score, n.karma_updated_at;
 """
 
 
@@ -108,6 +136,14 @@ def _set_karma_comments(api, ids):
     return [_set_comment_score(api, id_[0]) for id_ in list(ids)]
 
 
+_SET_KARMA = {
+    "Subreddit": _set_karma_subreddits,
+    "Submission": _set_karma_submissions,
+    "Redditor": _set_karma_redditors,
+    "Comment": _set_karma_comments,
+}
+
+
 def _remove_karma():
     return [
         remove_stuff_subreddit,
@@ -0,0 +1,152 @@
+"""
+Metric properties maintained at ingest time
+
+analytics.metrics computes interaction and cyborg scores by walking paths on every call.
+With Comments(..., materialize_metrics=True), the counters those metrics need are
+written to the nodes in the same batch as the comments:
+
+    Comment: seconds_past (same value analytics.utils computes)
+    Redditor: comments_made, comments_received, total_comments, cyborg_comments
+    Submission: total_comments, cyborg_comments
+    Subreddit: total_comments, cyborg_comments
+
+    total_comments: # comments under a submission, the denominator of the cyborg score
+    cyborg_comments: # of those comments posted within 6 seconds (see analytics.metrics._cyborg_score)
+
+Counters are incremented, not recounted: a comment is counted for a node once per role
+(see _ROLES) and marked with counted_<role> on its node, so merging the same comment again
+does not count it twice, and the comments of later crawls add up (see reddit_detective.replied_to).
+
+Counters are only right if every comment of the node was counted. Comments written without
+counting (materialize_metrics=False, Dumps) bump the epoch kept in the (:MetricsEpoch) node,
+and counters are fresh only while the <role>_epoch of their node is the current epoch:
+    analytics.utils.get_materialized returns None for stale counters, so the metrics walk paths
+    the next counted comment of a stale node recounts the node from its neighborhood
+RedditNetwork leaves the bumps out while the database has no (:MetricsEpoch) node,
+so crawls never counting comments don't write it.
+"""
+_CYBORG_SECONDS = 6  # Do NOT alter this, see analytics.metrics._cyborg_score
+_IDS_PER_CODE = 500
+
+
+def _cyborg(submission):
+    return "(c.created_utc - %s.created_utc) / 1000 <= %s" % (submission, _CYBORG_SECONDS)
+
+
+# Role of a comment for a node: (label of the node,
+#     pattern matching the node n of the new comments c (and their submissions s),
+#     {counter: (increment over the new comments, recount from the neighborhood of n)},
+#     comments of the neighborhood of n,
+#     {comment property: value set on the comments counted for n})
+_ROLES = {
+    "submission": (
+        "Submission",
+        "MATCH (c)-[:UNDER]->(n:Submission)",
+        {
+            "total_comments": ("count(c)", "size([(n)<-[:UNDER]-(c:Comment) | c])"),
+            "cyborg_comments": ("count(CASE WHEN %s THEN 1 END)" % _cyborg("n"),
+                                "size([(n)<-[:UNDER]-(c:Comment) WHERE %s | c])" % _cyborg("n")),
+        },
+        "[(n)<-[:UNDER]-(c:Comment) | c]",
+        {"seconds_past": "(c.created_utc - n.created_utc) / 1000"}
+    ),
+    "subreddit": (
+        "Subreddit",
+        "MATCH (c)-[:UNDER]->(s:Submission)-[:UNDER]->(n:Subreddit)",
+        {
+            "total_comments": ("count(c)", "size([(n)<-[:UNDER]-(:Submission)<-[:UNDER]-(c:Comment) | c])"),
+            "cyborg_comments": ("count(CASE WHEN %s THEN 1 END)" % _cyborg("s"),
+                                "size([(n)<-[:UNDER]-(s:Submission)<-[:UNDER]-(c:Comment) WHERE %s | c])" % _cyborg("s")),
+        },
+        "[(n)<-[:UNDER]-(:Submission)<-[:UNDER]-(c:Comment) | c]",
+        {}
+    ),
+    "author": (
+        "Redditor",
+        "MATCH (n:Redditor)-[:AUTHORED]->(c) OPTIONAL MATCH (c)-[:UNDER]->(s:Submission)",
+        {
+            "comments_made": ("count(c)", "size([(n)-[:AUTHORED]->(c:Comment) | c])"),
+            "total_comments": ("count(s)", "size([(n)-[:AUTHORED]->(c:Comment)-[:UNDER]->(:Submission) | c])"),
+            "cyborg_comments": ("count(CASE WHEN %s THEN 1 END)" % _cyborg("s"),
+                                "size([(n)-[:AUTHORED]->(c:Comment)-[:UNDER]->(s:Submission) WHERE %s | c])" % _cyborg("s")),
+        },
+        "[(n)-[:AUTHORED]->(c:Comment) | c]",
+        {}
+    ),
+    "received": (
+        "Redditor",
+        "MATCH (c)-[:UNDER]->(:Submission)<-[:AUTHORED]-(n:Redditor)",
+        {
+            "comments_received": ("count(c)", "size([(n)-[:AUTHORED]->(:Submission)<-[:UNDER]-(c:Comment) | c])"),
+        },
+        "[(n)-[:AUTHORED]->(:Submission)<-[:UNDER]-(c:Comment) | c]",
+        {}
+    ),
+}
+
+
+def epoch_property(label, counter):
+    """
+    Return the property keeping the epoch the counter of a node was counted in
+    """
+    for role, (role_label, _, counters, _, _) in _ROLES.items():
+        if role_label == label and counter in counters:
+            return f"{role}_epoch"
+    raise ValueError(f"{label} nodes have no counter {counter}")
+
+
+class CountersCode(str):
+    """
+    The code counting a batch of comments for the nodes of a role,
+    which also keeps the role and the comment ids, see NodeCode in data_models
+    """
+    def __new__(cls, role, comment_ids):
+        code = super().__new__(cls, _counters_code(role, comment_ids))
+        code.role = role
+        code.comment_ids = comment_ids
+        return code
+
+
+class StaleCountersCode(str):
+    """
+    The code making every counter stale, for comments written without counting
+    """
+    def __new__(cls):
+        return super().__new__(cls, """
+MATCH (e:MetricsEpoch)
+SET e.epoch = e.epoch + 1;
+""")
+
+
+def _counters_code(role, comment_ids):
+    _, match, counters, neighborhood, comment_properties = _ROLES[role]
+    increments = ", ".join(f"{increment} AS d_{counter}" for counter, (increment, _) in counters.items())
+    names = ", ".join(f"d_{counter}" for counter in counters)
+    sets = ",\n    ".join(f"n.{counter} = CASE WHEN fresh THEN n.{counter} + d_{counter} ELSE {recount} END"
+                          for counter, (_, recount) in counters.items())
+    marks = ", ".join([f"c.counted_{role} = true"] +
+                      [f"c.{prop} = {value}" for prop, value in comment_properties.items()])
+    return """
+MERGE (e:MetricsEpoch)
+ON CREATE SET e.epoch = 0
+WITH e
+MATCH (c:Comment) WHERE c.id IN [%s] AND c.counted_%s IS NULL
+%s
+WITH e, n, collect(c) AS new, %s
+WITH e, n, new, %s, coalesce(n.%s_epoch = e.epoch, false) AS fresh
+SET %s,
+    n.%s_epoch = e.epoch
+FOREACH (c IN CASE WHEN fresh THEN new ELSE %s END | SET %s);
+""" % (", ".join(f'"{id_}"' for id_ in comment_ids), role, match, increments, names, role, sets, role,
+       neighborhood, marks)
+
+
+def _materialize_codes(comments):
+    """
+    comments: Comment objects of a crawl
+
+    To be run after the comments are linked to their authors and submissions
+    """
+    ids = list(dict.fromkeys(comment.properties["id"] for comment in comments))
+    return [CountersCode(role, ids[start:start + _IDS_PER_CODE])
+            for role in _ROLES for start in range(0, len(ids), _IDS_PER_CODE)]
@@ -0,0 +1,184 @@
+"""
+Moderators component: Redditor -MODERATES-> Subreddit relationships
+
+    # Subreddits (and redditors) of the codes of a crawl, nothing is crawled again
+    mods = Moderators.from_codes(api, Submissions(Subreddit(api, "learnpython", limit=10)).code())
+    mods = Moderators.from_codes(api, snapshot_codes("crawl.rds"))
+    # or every subreddit in the graph
+    mods = Moderators.from_graph(api, driver)
+    net = RedditNetwork(driver, components=[mods])
+    net.run_cypher_code(chunk_size=1000)
+
+Costs a request per subreddit, and one per moderator that is not known (from the crawl or the graph):
+their profiles are fetched, so that they're merged with the same properties as a crawl would.
+With fetch_profiles=False, unknown moderators are not linked but kept in self.unknown ({username: id}).
+Known moderators are linked by the id they have in the graph, which keeps suspended accounts
+(whose id is their username) from being duplicated.
+
+praw.Reddit is not thread safe, so the lists and profiles are fetched by a thread per client:
+a ClientPool fetches with up to workers clients at once, a single praw.Reddit one request at a time.
+Moderator lists are cached (by subreddit name) in this process for an hour,
+see configure_moderator_cache to change it.
+Subreddits whose moderator list can't be fetched (private, banned etc.) are kept in self.failed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Union
+
+from reddit_detective.analytics.cache import QueryCache
+from reddit_detective.clients import worker_clients
+from reddit_detective.data_models import NodeCode, Redditor, Relationships, Subreddit, _strip_prefix
+from reddit_detective.relationships import _link_nodes
+
+if TYPE_CHECKING:
+    import praw
+    from neo4j import BoltDriver
+    from reddit_detective.clients import ClientPool
+
+_cache = QueryCache(maxsize=10000, ttl=3600)
+
+
+def configure_moderator_cache(maxsize=10000, ttl=3600):
+    _cache.clear()
+    _cache.maxsize = maxsize
+    _cache.ttl = ttl
+
+
+def _moderator_list(api, name):
+    """
+    Return [(username, id)] of the moderators of a subreddit, cached
+    """
+    hit, mods = _cache.get(name)
+    if hit:
+        return mods
+    mods = [(str(mod.name), _strip_prefix(mod.id)) for mod in api.subreddit(name).moderator()]
+    _cache.put(name, mods)
+    return mods
+
+
+def _crawled_nodes(codes):
+    """
+    Return (subreddits as [(id, name)], {username: id} of the redditors) of the node codes among the codes
+    """
+    subreddits = {}
+    redditors = {}
+    for code in codes:
+        if not isinstance(code, NodeCode):
+            continue
+        if "Subreddit" in code.types and "name" in code.properties:
+            subreddits[code.properties["id"]] = code.properties["name"]
+        elif "Redditor" in code.types:
+            redditors[code.properties["username"]] = code.properties["id"]
+    return list(subreddits.items()), redditors
+
+
+def _not_found_errors():
+    # Errors of the subreddits and redditors that can't be read (private, banned, deleted etc.)
+    from prawcore.exceptions import Forbidden, NotFound
+    return Forbidden, NotFound
+
+
+class Moderators:
+    """
+    api: praw.Reddit or ClientPool
+    subreddits: Subreddit nodes, or (id, name) pairs
+    known: {username: id} of the redditors that are already in the graph (or in the crawl)
+    workers: Moderator lists (and profiles) fetched at once at most, one per client of a ClientPool
+    fetch_profiles: Fetch the profiles of the moderators that are not known,
+        False leaves them out (see self.unknown)
+    """
+    def __init__(self, api: Union["praw.Reddit", "ClientPool"], subreddits, known=None, workers=8,
+                 fetch_profiles=True):
+        self.api = api
+        self.subreddits = [
+            (sub.properties["id"], sub.properties["name"]) if isinstance(sub, Subreddit) else tuple(sub)
+            for sub in subreddits
+        ]
+        self.known = dict(known) if known else {}
+        self.workers = workers
+        self.fetch_profiles = fetch_profiles
+        self.failed = []
+        self.unknown = {}  # {username: id} of the moderators left out
+
+    @classmethod
+    def from_codes(cls, api, codes, **kwargs):
+        """
+        Moderators of the subreddits among the codes of a crawl (e.g. component.code(), snapshot_codes),
+        the redditors among the codes are known
+        """
+        subreddits, known = _crawled_nodes(codes)
+        return cls(api, subreddits, known=known, **kwargs)
+
+    @classmethod
+    def from_graph(cls, api, driver: "BoltDriver", **kwargs):
+        """
+        Moderators of every subreddit in the graph, the redditors of the graph are known
+        """
+        with driver.session() as s:
+            subreddits = [(r["id"], r["name"]) for r in s.run(
+                "MATCH (s:Subreddit) WHERE s.name IS NOT NULL RETURN s.id AS id, s.name AS name"
+            )]
+            known = {r["username"]: r["id"] for r in s.run(
+                "MATCH (r:Redditor) RETURN r.username AS username, r.id AS id"
+            )}
+        return cls(api, subreddits, known=known, **kwargs)
+
+    def _in_threads(self, func, items):
+        """
+        Return [func(client, item) for each item], the items are shared out to a thread per client
+        """
+        clients = worker_clients(self.api, self.workers)
+        shares = [items[i::len(clients)] for i in range(len(clients))]
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            results = pool.map(lambda client, share: [func(client, item) for item in share], clients, shares)
+            return [result for share in results for result in share]
+
+    @staticmethod
+    def _fetch(client, subreddit):
+        try:
+            return subreddit, _moderator_list(client, subreddit[1])
+        except _not_found_errors():
+            return subreddit, None
+
+    @staticmethod
+    def _profile(client, moderator):
+        try:
+            return moderator, Redditor(client, moderator[0], limit=None).merge_code()
+        except _not_found_errors():
+            return moderator, None
+
+    def moderators(self):
+        """
+        Return {(subreddit id, subreddit name): [(username, id)]}
+        """
+        results = self._in_threads(self._fetch, self.subreddits)
+        self.failed = [subreddit for subreddit, mods in results if mods is None]
+        return {subreddit: mods for subreddit, mods in results if mods is not None}
+
+    def _merges_and_links(self):
+        moderators = self.moderators()
+        unknown = {username: id_ for mods in moderators.values() for username, id_ in mods
+                   if username not in self.known}
+        ids = dict(self.known)
+        merges = []
+        self.unknown = {}
+        if self.fetch_profiles:
+            for (username, id_), code in self._in_threads(self._profile, list(unknown.items())):
+                if code is None:
+                    self.unknown[username] = id_
+                    continue
+                merges.append(code)
+                ids[username] = code.properties["id"]
+        else:
+            # Merging them with their id and username only would give nodes a crawl can't MERGE into
+            self.unknown = unknown
+        links = []
+        props = {}
+        for (subreddit_id, _), mods in moderators.items():
+            for username, _ in mods:
+                if username in ids:
+                    links.append(_link_nodes(ids[username], subreddit_id, Relationships.moderates, props))
+        return merges, links
+
+    def code(self):
+        merges, links = self._merges_and_links()
+        return merges + links
@@ -1,11 +1,27 @@
-import praw
-from neo4j import BoltDriver
-from typing import List, Union
+import time
+from typing import List, Union, TYPE_CHECKING
 from itertools import chain
 
+from reddit_detective.checkpoint import Checkpoint
+from reddit_detective.codes import is_record_code, unique_records
+from reddit_detective.crawl_snapshot import SnapshotWriter, snapshot_codes
+from reddit_detective.dumps import Dumps
+from reddit_detective.estimate import estimate_network
+from reddit_detective.export import export_script, iter_codes
+from reddit_detective.fingerprints import skip_unchanged
+from reddit_detective.karma import _remove_karma, _stale_query, _SET_KARMA
+from reddit_detective.materialized import CountersCode, StaleCountersCode
+from reddit_detective.moderators import Moderators
+from reddit_detective.pipeline import run_pipeline
 from reddit_detective.relationships import Submissions, Comments, CommentsReplies
-from reddit_detective.karma import (_remove_karma, _set_karma_subreddits, _set_karma_submissions,
-                                    _set_karma_redditors, _set_karma_comments)
+from reddit_detective.seen import SeenIndex
+from reddit_detective.sinks import GraphSink, Neo4jSink
+from reddit_detective.streaming import SubredditStream
+from reddit_detective.text_store import TextStore
+
+if TYPE_CHECKING:
+    import praw
+    from neo4j import BoltDriver
 
 
 # Do not alter
@@ -28,42 +44,141 @@ class RedditNetwork:
     """
     This will be the outcome of conversion of Reddit data to a social network
     compatible with Neo4j.
+
+    seen: A SeenIndex persisting across runs (see reddit_detective.seen),
+        the codes written by earlier runs are skipped
+    text_store: A TextStore (see reddit_detective.text_store), the texts of the nodes
+        are kept in it and the nodes only have their hash, length and preview
+    sink: Where the codes are written (see reddit_detective.sinks), Neo4jSink(driver) by default.
+        With another sink (e.g. MemoryGraph), the driver is only needed by the methods
+        asking Neo4j (add_karma, create_constraints, skip_unchanged)
     """
     def __init__(
             self,
-            driver: BoltDriver,
-            components: List[Union[Submissions, Comments, CommentsReplies]]
+            driver: "BoltDriver" = None,
+            components: List[Union[Submissions, Comments, CommentsReplies]] = None,
+            seen: SeenIndex = None,
+            text_store: TextStore = None,
+            sink: GraphSink = None
     ):
+        if driver is None and sink is None:
+            raise ValueError("either a driver or a sink should be given")
         self.driver = driver
-        self.components = components
-
-    def _run_query(self, codes):
-        def run_code(tx):
-            for query in codes:
-                tx.run(query)
-        with self.driver.session() as session:
-            session.write_transaction(run_code)
-
-    def _ids(self):
-        """
-        Get id of each node and relationship
-        """
-        d = self.driver
-        s = d.session()
-        subreddits_result = s.run("MATCH (n:Subreddit) RETURN n.name AS name")
-        submissions_result = s.run("MATCH (n:Submission) RETURN n.id AS id")
-        redditors_result = s.run("MATCH (n:Redditor) RETURN n.username AS name")
-        comms_result = s.run("MATCH (c:Comment) RETURN c.id AS id")
-        return [subreddits_result, submissions_result, redditors_result, comms_result]
-
-    def add_karma(self, api: praw.Reddit):
-        self.remove_karma()  # Clear karma at the beginning to comply with Constraints
-        ids = self._ids()
-        codes = _set_karma_subreddits(api, ids[0])
-        codes += _set_karma_submissions(api, ids[1])
-        codes += _set_karma_redditors(api, ids[2])
-        codes += _set_karma_comments(api, ids[3])
-        self._run_query(codes)
+        self.sink = sink if sink is not None else Neo4jSink(driver)
+        self.components = components if components is not None else []
+        self.seen = seen
+        self.text_store = text_store
+        self.skipped = 0  # Codes left out by the last run (skip_unchanged or seen)
+        self.streams = []  # Streams self.stream is running, to stop them from another thread
+        self._counters = False  # Whether the database has counters (see reddit_detective.materialized)
+
+    def _run_query(self, codes, chunk_size=None, checkpoint=None, mark_seen=False):
+        """
+        Run the codes in chunks of chunk_size, each chunk in its own transaction
+        chunk_size=None runs every code in a single transaction
+
+        If a Checkpoint is given, the committed chunks are journaled
+        and the chunks committed by a previous (interrupted) run are skipped
+
+        mark_seen adds the node and relationship codes of each committed chunk to self.seen
+        """
+        committed = set()
+        if checkpoint is not None:
+            if checkpoint.exists():
+                codes, chunk_size, committed = checkpoint.load()
+            else:
+                checkpoint.start(codes, chunk_size)
+        size = chunk_size if chunk_size else max(len(codes), 1)
+        with self.sink.writer() as write:
+            for i, start in enumerate(range(0, len(codes), size)):
+                if i in committed:
+                    continue
+                write(self._epoch_bumps(codes[start:start + size]))
+                if checkpoint is not None:
+                    checkpoint.commit(i)
+                if mark_seen and self.seen is not None:
+                    self.seen.add([code for code in codes[start:start + size] if is_record_code(code)])
+        if checkpoint is not None:
+            checkpoint.finish()
+
+    def _epoch_bumps(self, codes):
+        """
+        Leave out the epoch bumps of the comments written without counting (StaleCountersCode)
+        while the database has no counters, no counter is stale then
+        """
+        if not any(isinstance(code, StaleCountersCode) for code in codes):
+            return codes
+        if not self._counters:
+            # The counters of the chunk create the epoch, the bumps after them count
+            self._counters = any(isinstance(code, CountersCode) for code in codes) or self._has_epoch()
+        if self._counters:
+            return codes
+        return [code for code in codes if not isinstance(code, StaleCountersCode)]
+
+    def _has_epoch(self):
+        if self.driver is None:
+            return True  # The sink decides, e.g. MemoryGraph ignores them
+        with self.driver.session() as s:
+            return s.run("MATCH (e:MetricsEpoch) RETURN count(e) > 0 AS found").single()["found"]
+
+    def _checkpoint(self, checkpoint):
+        if checkpoint is None or isinstance(checkpoint, Checkpoint):
+            return checkpoint
+        return Checkpoint(checkpoint)
+
+    def _stale_keys(self, label, max_age=None, created_within=None):
+        """
+        Get the names/ids of the nodes of the label whose karma is missing or older than max_age seconds,
+        only the ones created in the last created_within seconds if given
+        """
+        now = time.time()
+        with self.driver.session() as s:
+            result = s.run(_stale_query(label),
+                           updated_before=now - max_age if max_age is not None else None,
+                           created_after=now - created_within if created_within is not None else None)
+            return [(record["key"],) for record in result]
+
+    def add_karma(self, api: "praw.Reddit", chunk_size=None, checkpoint=None,
+                  max_age=None, created_within=None, labels=None):
+        """
+        Fetch stuff like karma and set it on the nodes in place, with the time it's fetched (karma_updated_at)
+
+        By default every node is refreshed. To only refresh the nodes that need it:
+            max_age: Only the nodes without karma or with karma older than max_age seconds
+            created_within: Only the nodes created in the last created_within seconds
+                e.g. created_within=48 * 3600 refreshes the submissions and comments of the last 48 hours
+            labels: Only the given node types, e.g. ["Submission", "Comment"]
+
+        chunk_size and checkpoint work the same way as in run_cypher_code
+        When resuming from a checkpoint, the karma is not fetched again
+
+        Returns the number of nodes refreshed
+        """
+        checkpoint = self._checkpoint(checkpoint)
+        if checkpoint is not None and checkpoint.exists():
+            self._run_query(None, checkpoint=checkpoint)
+            return None
+        labels = labels if labels is not None else list(_SET_KARMA)
+        for label in labels:
+            if label not in _SET_KARMA:
+                raise ValueError(f"reddit_detective only keeps karma of {list(_SET_KARMA)}")
+        codes = []
+        for label in labels:
+            codes += _SET_KARMA[label](api, self._stale_keys(label, max_age, created_within))
+        self._run_query(codes, chunk_size, checkpoint)
+        return len(codes)
+
+    def add_moderators(self, api: "praw.Reddit", chunk_size=None, **kwargs):
+        """
+        Link every subreddit in the graph to its moderators with MODERATES relationships
+        (see reddit_detective.moderators, kwargs go to Moderators)
+
+        Returns the Moderators component, its failed attribute has the subreddits that were left out
+        """
+        moderators = Moderators.from_graph(api, self.driver, **kwargs)
+        merges, links = moderators._merges_and_links()
+        self._run_query(self._unseen(merges + links), chunk_size, mark_seen=True)
+        return moderators
 
     def remove_karma(self):
         self._run_query(_remove_karma())
@@ -81,15 +196,164 @@ class RedditNetwork:
         Get codes for every component
         """
         codes = list(chain.from_iterable([point.code() for point in self.components]))
-        # Remove duplicates without changing order
-        codes = sorted(set(codes), key=lambda x: codes.index(x))
+        return unique_records(codes)
+
+    def run_pipelined(self, crawlers=4, batch_size=500, max_batches=8):
+        """
+        Crawl and write at the same time:
+            crawlers: number of threads running the components (one per API client at most)
+            batch_size: number of codes per batch (and per transaction)
+            max_batches: number of batches waiting to be written at most, bounds the memory
+
+        Returns a PipelineStats showing how long each side waited for the other
+        """
+        self.skipped = 0
+        return run_pipeline(self.components, self._write_unseen, crawlers, batch_size, max_batches)
+
+    def _unseen(self, codes):
+        # Texts are offloaded first, so that the seen index keeps the codes as they're written
+        if self.text_store is not None:
+            codes = self.text_store.offload(codes)
+        if self.seen is None:
+            return codes
+        # Only node and relationship codes are skipped, other codes (counters, REPLIED_TO weights)
+        # depend on the graph they're run on and are run every time
+        unseen = set(self.seen.unseen([code for code in codes if is_record_code(code)]))
+        kept = [code for code in codes if not is_record_code(code) or code in unseen]
+        self.skipped += len(codes) - len(kept)
+        return kept
+
+    def _write_unseen(self, codes):
+        self._run_query(self._unseen(codes), mark_seen=True)
+
+    def stream(self, subreddit, batch_size=100, window=5.0, **kwargs):
+        """
+        Follow the new submissions and comments of a Subreddit and write them in micro-batches
+        of batch_size items (or every window seconds), until stopped (see reddit_detective.streaming)
+
+        Returns the SubredditStream, its stats show the throughput, lag and backlog
+        """
+        stream = SubredditStream(self, subreddit, batch_size, window, **kwargs)
+        self.streams.append(stream)
+        try:
+            stream.run()
+        finally:
+            self.streams.remove(stream)  # Only the running streams are kept
+        return stream
+
+    def load_dumps(self, paths, records_per_chunk=10000, chunk_size=None, skip_unchanged=False,
+                   partial_nodes=False):
+        """
+        Load Reddit dump files (see reddit_detective.dumps) without the API
+        Only records_per_chunk records are in memory at once,
+        each chunk is written with chunk_size codes per transaction
+        skip_unchanged works the same way as in run_cypher_code
+        partial_nodes works the same way as in Dumps
+
+        Returns the number of chunks written
+        """
+        dumps = Dumps(paths, records_per_chunk, partial_nodes=partial_nodes)
+        written = 0
+        self.skipped = 0
+        for merges, links in dumps.chunks():
+            codes = self._unseen(merges + links)
+            if skip_unchanged:
+                codes = self._skip_unchanged(codes)
+            self._run_query(codes, chunk_size, mark_seen=True)
+            written += 1
+        return written
+
+    def save_snapshot(self, path):
+        """
+        Crawl the components and save the codes to a crawl snapshot (see reddit_detective.crawl_snapshot)
+        instead of running them
+
+        Returns the number of records per section
+        """
+        with SnapshotWriter(path) as writer:
+            writer.write(iter_codes(self.components))
+        return writer.counts
+
+    def load_snapshot(self, path, batch_size=1000, chunk_size=None, skip_unchanged=False):
+        """
+        Run the codes of a crawl snapshot, batch_size codes at a time (only a batch is in memory)
+        chunk_size and skip_unchanged work the same way as in run_cypher_code
+
+        Returns the number of batches written
+        """
+        self.skipped = 0
+        written = 0
+        batch = []
+        for code in chain(snapshot_codes(path), [None]):
+            if code is not None:
+                batch.append(code)
+                if len(batch) < batch_size:
+                    continue
+            if not batch:
+                break
+            codes = self._unseen(batch)
+            if skip_unchanged:
+                codes = self._skip_unchanged(codes)
+            self._run_query(codes, chunk_size, mark_seen=True)
+            written += 1
+            batch = []
+        return written
+
+    def _skip_unchanged(self, codes):
+        codes, skipped = skip_unchanged(self.driver, codes)
+        self.skipped += skipped
         return codes
 
+    def estimate(self, trees=2, requests_per_second=None):
+        """
+        Estimate the API requests, nodes, relationships and wall time of crawling the components,
+        by sampling the first listing page and a few comment trees (see reddit_detective.estimate)
+            trees: Comment trees sampled per component
+            requests_per_second: Rate the wall time is estimated with,
+                by default Reddit's rate limit times the clients of a ClientPool
+
+        Returns a NetworkEstimate, its components attribute has the estimate of each component
+        """
+        return estimate_network(self.components, trees, requests_per_second)
+
     def cypher_code(self):
         """
         Use this function only if you want to just get the code but not run it
         """
         return "\n".join(self._codes())
 
-    def run_cypher_code(self):
-        self._run_query(codes=self._codes())
+    def export_cypher(self, path, transaction_size=1000, constraints=True, compress=None):
+        """
+        Stream the code to a script for cypher-shell instead of running it (see reddit_detective.export)
+            transaction_size: number of codes per :begin / :commit block
+            constraints: Start the script with the constraints,
+                set False if they already exist in the target database
+            compress: gzip the script, by default if path ends with .gz
+
+        Returns the number of codes written
+        """
+        return export_script(path, iter_codes(self.components), transaction_size,
+                             _CONSTRAINTS if constraints else None, compress)
+
+    def run_cypher_code(self, chunk_size=None, checkpoint=None, skip_unchanged=False):
+        """
+        chunk_size: Commit every chunk_size codes in a separate transaction,
+            keeps the transaction size bounded for large networks
+        checkpoint: Path of a local journal (or a Checkpoint object).
+            If a previous run with the same journal was interrupted, it's resumed
+            from the last committed chunk without crawling again
+        skip_unchanged: Leave out the nodes that exist in the graph with the same properties
+            (see reddit_detective.fingerprints)
+
+        Returns the number of codes skipped, also kept in self.skipped
+        """
+        self.skipped = 0
+        checkpoint = self._checkpoint(checkpoint)
+        if checkpoint is not None and checkpoint.exists():
+            self._run_query(None, checkpoint=checkpoint, mark_seen=True)
+            return self.skipped
+        codes = self._unseen(self._codes())
+        if skip_unchanged:
+            codes = self._skip_unchanged(codes)
+        self._run_query(codes, chunk_size, checkpoint, mark_seen=True)
+        return self.skipped
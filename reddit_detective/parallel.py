@@ -0,0 +1,159 @@
+"""
+Parallel writes to Neo4j over several sessions
+
+A single session runs one transaction at a time, whatever the number of cores of Neo4j.
+ParallelNeo4jSink writes each chunk over `sessions` concurrent sessions instead:
+
+    sink = ParallelNeo4jSink(driver, sessions=8, batch_size=500)
+    net = RedditNetwork(driver, components, sink=sink)
+    net.run_cypher_code(chunk_size=10000)  # Every chunk is written in parallel
+    print(sink.stats)
+
+A chunk is written in three steps, each waiting for the previous one:
+    1. Nodes, split into `sessions` partitions by id, so the same node is never merged twice at once
+    2. Relationships, in waves. A relationship locks both of its nodes, so in a wave,
+       no two partitions have a node in common (see plan_links) and transactions do not wait on each other.
+       Relationships sharing a target (e.g. comments UNDER the same submission) stay together.
+    3. Other codes (e.g. the counters of materialize_metrics, which read relationships), in a single session
+
+Relationships sharing a node are written by the same partition. A hub (a node most relationships
+of the chunk touch, e.g. the author of most comments) leaves a single partition, which is written serially:
+every transaction would wait on the lock of the hub anyway. stats.serial counts the codes
+written in a single session, mixing several submissions and authors per chunk keeps it low.
+Only NodeCode and LinkCode codes are written in parallel, a code stored as a plain string
+(see reddit_detective.codes for keeping the types) goes to the serial step.
+
+Transient errors (e.g. a deadlock with another client writing to the database)
+are retried up to `retries` times, waiting backoff * 2 ** attempt seconds (with jitter) in between.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from reddit_detective.analytics.cache import bump_graph_version
+from reddit_detective.data_models import NodeCode
+from reddit_detective.relationships import LinkCode
+from reddit_detective.sinks import Neo4jSink
+
+
+class ParallelStats:
+    """
+    serial: Codes written in a single session (other codes, and waves with a single partition)
+    """
+    def __init__(self):
+        self.transactions = 0
+        self.retries = 0
+        self.waves = 0
+        self.serial = 0
+        self._lock = threading.Lock()
+
+    def _add(self, transactions=0, retries=0):
+        with self._lock:
+            self.transactions += transactions
+            self.retries += retries
+
+    def __str__(self):
+        return (f"ParallelStats(transactions={self.transactions}, retries={self.retries}, waves={self.waves}, "
+                f"serial={self.serial})")
+
+
+def plan_links(links, partitions):
+    """
+    Split relationship codes into waves of partitions, no two partitions of a wave share a node
+
+    Links are grouped by their target, groups are placed smallest first:
+    a group whose nodes are all free goes to the partition with the fewest links,
+    a group whose nodes are taken by a single partition goes to that one,
+    and a group touching several partitions is left to the next wave.
+    Groups connected through a node end up in the same partition, so a hub node gives a single partition.
+
+    Returns a list of waves, each a list of partitions (lists of codes)
+    """
+    groups = {}
+    for link in links:
+        groups.setdefault(link.second_id, []).append(link)
+    remaining = sorted(groups.values(), key=len)
+    waves = []
+    while remaining:
+        owners = {}
+        wave = [[] for _ in range(partitions)]
+        deferred = []
+        for group in remaining:
+            nodes = {link.first_id for link in group}
+            nodes.add(group[0].second_id)
+            taken = {owners[node] for node in nodes if node in owners}
+            if len(taken) > 1:
+                deferred.append(group)
+                continue
+            part = taken.pop() if taken else min(range(partitions), key=lambda i: len(wave[i]))
+            wave[part].extend(group)
+            for node in nodes:
+                owners[node] = part
+        waves.append([part for part in wave if part])
+        remaining = deferred
+    return waves
+
+
+class ParallelNeo4jSink(Neo4jSink):
+    """
+    sessions: Concurrent sessions (and threads)
+    batch_size: Codes per transaction
+    retries: Attempts after a transient error, before giving up
+    backoff: Seconds waited after the first transient error, doubled after each
+    """
+    def __init__(self, driver, sessions=4, batch_size=500, retries=5, backoff=0.1):
+        super().__init__(driver)
+        self.sessions = sessions
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = ParallelStats()
+
+    def _transaction(self, session, codes):
+        from neo4j.exceptions import TransientError
+        for attempt in range(self.retries + 1):
+            try:
+                session.write_transaction(self._run_chunk(codes))
+                self.stats._add(transactions=1)
+                return
+            except TransientError:
+                if attempt == self.retries:
+                    raise
+                self.stats._add(retries=1)
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def _write_partition(self, codes):
+        with self.driver.session() as session:
+            for start in range(0, len(codes), self.batch_size):
+                self._transaction(session, codes[start:start + self.batch_size])
+
+    def _write_parallel(self, pool, partitions):
+        # list() waits for every partition and raises the first error
+        list(pool.map(self._write_partition, partitions))
+
+    def write(self, codes):
+        nodes = [code for code in codes if isinstance(code, NodeCode)]
+        links = [code for code in codes if isinstance(code, LinkCode)]
+        others = [code for code in codes if not isinstance(code, (NodeCode, LinkCode))]
+        try:
+            with ThreadPoolExecutor(max_workers=self.sessions) as pool:
+                node_parts = [[] for _ in range(self.sessions)]
+                for code in nodes:
+                    node_parts[hash(code.properties["id"]) % self.sessions].append(code)
+                self._write_parallel(pool, [part for part in node_parts if part])
+                for wave in plan_links(links, self.sessions):
+                    self._write_parallel(pool, wave)
+                    self.stats.waves += 1
+                    if len(wave) == 1:
+                        self.stats.serial += len(wave[0])
+            if others:
+                self._write_partition(others)
+                self.stats.serial += len(others)
+        finally:
+            bump_graph_version(self.driver)
+
+    @contextmanager
+    def writer(self):
+        yield self.write
@@ -0,0 +1,186 @@
+"""
+Overlapped crawl/write pipeline
+
+Crawler threads crawl the components a part at a time (component.chunks(), or
+component._merges_and_links() for the components without parts) and put the codes
+to a bounded queue in batches, while a background writer drains the queue into Neo4j.
+Neo4j does not sit idle while we wait on Reddit, and the other way around.
+
+The nodes of a part are put before its relationships, in the order they were crawled,
+and there is a single writer, so a link is always run after the MERGEs of its nodes.
+
+The queue holds at most max_batches batches. A crawler with a full queue waits for the writer,
+which keeps the memory bounded: a crawler holds a single part besides the queue.
+The writer skips the node and relationship codes among the last `recent` ones it wrote,
+a duplicate seen earlier than that is written again, which changes nothing.
+
+praw.Reddit is not thread safe, so the components sharing an API client
+(the same praw.Reddit or ClientPool) are crawled one after the other by the same crawler.
+Give the components separate praw.Reddit instances to crawl them in parallel.
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from reddit_detective.codes import is_record_code
+from reddit_detective.export import _digest
+
+_DONE = None  # Put to the queue when every crawler is finished
+
+
+class PipelineStats:
+    """
+    crawl_stall: Total seconds the crawlers waited for the writer (queue was full)
+    write_stall: Seconds the writer waited for the crawlers (queue was empty)
+    """
+    def __init__(self):
+        self.batches = 0
+        self.codes = 0
+        self.duplicates = 0
+        self.crawl_stall = 0.0
+        self.write_stall = 0.0
+        self.write_time = 0.0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _add_crawl_stall(self, seconds):
+        with self._lock:
+            self.crawl_stall += seconds
+
+    def __str__(self):
+        return (f"PipelineStats(batches={self.batches}, codes={self.codes}, duplicates={self.duplicates}, "
+                f"crawl_stall={self.crawl_stall:.2f}s, write_stall={self.write_stall:.2f}s, "
+                f"write_time={self.write_time:.2f}s, elapsed={self.elapsed:.2f}s)")
+
+
+def _put(q, batch, stop, stats=None):
+    started = time.perf_counter()
+    while not stop.is_set():
+        try:
+            q.put(batch, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    if stats is not None:
+        stats._add_crawl_stall(time.perf_counter() - started)
+
+
+def _client(component):
+    """
+    Return the API client a component crawls with, None if it does not crawl
+    """
+    start = getattr(component, "start", None)
+    for obj in (component, start):
+        api = getattr(obj, "api", None)
+        if api is not None:
+            return api
+    # A starting point made from a praw object crawls with the client of the object
+    return getattr(getattr(start, "resp", None), "_reddit", None)
+
+
+def _crawl_groups(components):
+    # Components sharing a client, the ones that do not crawl are on their own
+    groups = {}
+    for i, component in enumerate(components):
+        client = _client(component)
+        groups.setdefault(("client", id(client)) if client is not None else i, []).append(component)
+    return list(groups.values())
+
+
+def _parts(component):
+    if hasattr(component, "chunks"):
+        return component.chunks()
+    return [component._merges_and_links()]
+
+
+def _crawl(components, q, stop, stats, batch_size):
+    pending = []
+    for component in components:
+        for merges, links in _parts(component):
+            pending += merges + links
+            while len(pending) >= batch_size:
+                if stop.is_set():
+                    return
+                _put(q, pending[:batch_size], stop, stats)
+                pending = pending[batch_size:]
+    if pending and not stop.is_set():
+        _put(q, pending, stop, stats)
+
+
+def _skip_written(batch, written, recent):
+    # Codes of the batch minus the node and relationship codes among the last `recent` written ones
+    codes = []
+    for code in batch:
+        if is_record_code(code):
+            key = _digest(code)
+            if key in written:
+                written.move_to_end(key)
+                continue
+            written[key] = True
+            if len(written) > recent:
+                written.popitem(last=False)
+        codes.append(code)
+    return codes
+
+
+def _write(q, write, stop, stats, errors, recent):
+    written = OrderedDict()
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                batch = q.get(timeout=0.1)
+            except queue.Empty:
+                stats.write_stall += time.perf_counter() - started
+                if stop.is_set():
+                    return  # A crawler failed
+                continue
+            stats.write_stall += time.perf_counter() - started
+            if batch is _DONE:
+                return
+            codes = _skip_written(batch, written, recent)
+            stats.duplicates += len(batch) - len(codes)
+            if not codes:
+                continue
+            started = time.perf_counter()
+            write(codes)
+            stats.write_time += time.perf_counter() - started
+            stats.batches += 1
+            stats.codes += len(codes)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+
+def run_pipeline(components, write, crawlers=4, batch_size=500, max_batches=8, recent=100_000):
+    """
+    Crawl the components with `crawlers` threads and run write(batch) for each batch
+    of codes in a background thread, return a PipelineStats
+    """
+    stats = PipelineStats()
+    q = queue.Queue(maxsize=max_batches)
+    stop = threading.Event()
+    errors = []
+    started = time.perf_counter()
+
+    writer = threading.Thread(target=_write, args=(q, write, stop, stats, errors, recent), daemon=True)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=crawlers) as pool:
+            futures = [pool.submit(_crawl, group, q, stop, stats, batch_size)
+                       for group in _crawl_groups(components)]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                stop.set()  # Stop the other crawlers and the writer too
+                raise
+    finally:
+        _put(q, _DONE, stop)
+        writer.join()
+        stats.elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return stats
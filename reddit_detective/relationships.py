@@ -1,10 +1,34 @@
+import heapq
+import time
 from typing import Union
-from itertools import chain
+from itertools import chain, count
 from typing import List
 
 from reddit_detective.data_models import Relationships
 from reddit_detective.data_models import Comment, Submission, Subreddit, Redditor
-from praw.models import MoreComments
+from reddit_detective.materialized import _materialize_codes, StaleCountersCode
+from reddit_detective.replied_to import _replied_to_codes
+
+_ITEMS_PER_CHUNK = 100  # Submissions (or comments) per part of chunks()
+
+
+class LinkCode(str):
+    """
+    The code of a relationship, which also keeps the relationship record it's made of
+    (see NodeCode in data_models)
+    """
+    def __new__(cls, first_id, second_id, rel_type, props):
+        code = super().__new__(cls, """
+MATCH (n1 {id: "%s"})
+MATCH (n2 {id: "%s"})
+WITH n1, n2
+MERGE ((n1)-[:%s %s]->(n2));
+""" % (first_id, second_id, rel_type, props))
+        code.first_id = first_id
+        code.second_id = second_id
+        code.rel_type = rel_type
+        code.props = props
+        return code
 
 
 def _link_nodes(first_id, second_id, rel_type, props_str):
@@ -17,12 +41,7 @@ def _link_nodes(first_id, second_id, rel_type, props_str):
         having the same type and props with node1 and node2. But node1 and node2 themselves
         won't be connected.
     """
-    return """
-MATCH (n1 {id: "%s"})
-MATCH (n2 {id: "%s"})
-WITH n1, n2
-MERGE ((n1)-[:%s %s]->(n2));
-""" % (first_id, second_id, rel_type, props_str)
+    return LinkCode(first_id, second_id, rel_type, props_str)
 
 
 def _search_submission(comment):
@@ -34,6 +53,41 @@ def _search_submission(comment):
     return comment_list
 
 
+def score_priority(comment, depth):
+    # Highest scored comments first
+    return comment.score
+
+
+def recency_priority(comment, depth):
+    # Newest comments first
+    return comment.properties["created_utc"]
+
+
+def depth_priority(comment, depth):
+    # Shallowest comments first (breadth first)
+    return -depth
+
+
+class CrawlReport:
+    """
+    What a budgeted CommentsReplies crawl did and did not fetch
+
+    requests: Number of requests spent on expanding replies
+    truncated: True if the crawl stopped due to max_requests or deadline
+    unexpanded: Ids of the comments whose replies were not fetched
+    unloaded: {id of the parent comment or submission: # of "load more" replies not fetched}
+    """
+    def __init__(self):
+        self.requests = 0
+        self.truncated = False
+        self.unexpanded = []
+        self.unloaded = {}
+
+    def __str__(self):
+        return (f"CrawlReport(requests={self.requests}, truncated={self.truncated}, "
+                f"unexpanded={len(self.unexpanded)}, unloaded={sum(self.unloaded.values())})")
+
+
 class Submissions:
     """
     Degree 1: Submissions
@@ -86,8 +140,24 @@ class Submissions:
         
         return subreddits + submissions + authors, subreddit_links + author_links
 
+    def _merges_and_links(self):
+        """
+        Node (MERGE) and relationship (link) codes, kept apart so that
+        callers can ship them as separate batches
+        """
+        return self._merge_and_link_submissions(self.start.submissions())
+
+    def chunks(self):
+        """
+        Yield (merges, links) a part of the crawl at a time, so that the codes of a part
+        can be written while the rest is crawled (see RedditNetwork.run_pipelined)
+        """
+        submissions = self.start.submissions()
+        for start in range(0, len(submissions), _ITEMS_PER_CHUNK):
+            yield self._merge_and_link_submissions(submissions[start:start + _ITEMS_PER_CHUNK])
+
     def code(self):
-        merges, links = self._merge_and_link_submissions(self.start.submissions())
+        merges, links = self._merges_and_links()
         return merges + links
 
 
@@ -97,23 +167,45 @@ class Comments(Submissions):
     Starting points: Subreddit, Submission, Redditor
         All of Degree 1
         Link redditors with submissions via comments (AUTHORED)
+
+    materialize_metrics=True also writes the counters analytics.metrics needs
+    to the nodes (see reddit_detective.materialized), otherwise each part marks the counters stale,
+    which RedditNetwork leaves out while the database has no counters
+    replied_to=True also writes weighted REPLIED_TO relationships between the redditors
+    (see reddit_detective.replied_to)
     """
-    def __init__(self, starting_point: Union[Subreddit, Submission, Redditor]):
+    def __init__(self, starting_point: Union[Subreddit, Submission, Redditor], materialize_metrics=False,
+                 replied_to=False):
         if "comments" not in starting_point.available_degrees:
             # if starting point is not Subreddit, Submission or Redditor:
             raise TypeError("the type of the starting point should be either "
                             "Subreddit, Submission or Redditor")
         self.start = starting_point
+        self.materialize_metrics = materialize_metrics
+        self.replied_to = replied_to
 
-    def comments(self):
-        # Return comments as a Python list
+    def _comment_groups(self):
+        """
+        Yield the comments a part at a time:
+        the comments of each submission of a Subreddit, _ITEMS_PER_CHUNK comments of a Submission or a Redditor
+        """
         if isinstance(self.start, Subreddit):
-            subs = self.start.submissions()
-            return list(chain.from_iterable([sub.comments() for sub in subs]))
+            for sub in self.start.submissions():
+                yield sub.comments()
         else:
-            return self.start.comments()
+            comments = self.start.comments()
+            for start in range(0, len(comments), _ITEMS_PER_CHUNK):
+                yield comments[start:start + _ITEMS_PER_CHUNK]
+
+    def comments(self):
+        # Return comments as a Python list
+        return list(chain.from_iterable(self._comment_groups()))
 
-    def _merge_and_link_comments(self, comment_list: List[Comment]):
+    def _merge_and_link_comments(self, comment_list: List[Comment], with_submissions=True):
+        """
+        with_submissions=False does not make Submission objects of the submissions of the comments,
+        for comments whose submissions are only known by id (e.g. dumps)
+        """
         comment_codes = []
         parent_links = []
         submissions = []
@@ -145,16 +237,36 @@ class Comments(Submissions):
                 props
             ))
 
-            if comment.submission_id not in submission_ids:
+            if with_submissions and comment.submission_id not in submission_ids:
                 submission_ids[comment.submission_id] = True
                 submissions.append(comment.submission)
         
         return comment_codes + author_codes, parent_links + author_links, submissions
     
-    def code(self):
-        comment_merges, comment_links, submissions = self._merge_and_link_comments(self.comments())
+    def _comment_codes(self, comments):
+        comment_merges, comment_links, submissions = self._merge_and_link_comments(comments)
         sub_merges, sub_links = self._merge_and_link_submissions(submissions)
-        return comment_merges + sub_merges + comment_links + sub_links
+        links = comment_links + sub_links
+        if self.materialize_metrics:
+            # Counters are counted from relationships, so they come after the links
+            links += _materialize_codes(comments)
+        elif comments:
+            links.append(StaleCountersCode())  # Comments are not counted, see reddit_detective.materialized
+        if self.replied_to:
+            # Needs the comments and the redditors, so it comes after the merges too
+            links += _replied_to_codes(comments, submissions)
+        return comment_merges + sub_merges, links
+
+    def _merges_and_links(self):
+        return self._comment_codes(self.comments())
+
+    def chunks(self):
+        for comments in self._comment_groups():
+            yield self._comment_codes(comments)
+
+    def code(self):
+        merges, links = self._merges_and_links()
+        return merges + links
 
 
 class CommentsReplies(Comments):
@@ -166,16 +278,48 @@ class CommentsReplies(Comments):
         All of Degree 2
         For all comments, get the list of replies
         Link comments to replies (which are also comments) with UNDER relationship
+
+    Budgeted crawl:
+        By default, the replies of every comment are fetched, which might take a lot of requests.
+        Giving max_requests, deadline or priority crawls the reply trees best first instead:
+            max_requests: Number of requests at most: refreshing a comment of a Redditor
+                (listings come without the reply trees) or loading "more comments" costs one,
+                walking the replies that are already loaded is free
+            deadline: Seconds the reply expansion can take at most
+            priority: A function of (Comment, depth) returning a number,
+                comments with higher numbers are expanded first.
+                See score_priority (default), recency_priority and depth_priority
+        Replies of replies are crawled too, until the budget is spent.
+        self.report (a CrawlReport) shows which parts of the trees were left out.
+        The comments of the starting point are fetched as usual, the budget covers the replies.
     """
-    def __init__(self, starting_point: Union[Subreddit, Submission, Redditor]):
+    def __init__(self, starting_point: Union[Subreddit, Submission, Redditor], materialize_metrics=False,
+                 max_requests=None, deadline=None, priority=None, replied_to=False):
         if "replies" not in starting_point.available_degrees:
             # if starting point is not Subreddit, Submission or Redditor:
             raise TypeError("the type of the starting point should be either "
                             "Subreddit, Submission or Redditor")
         self.start = starting_point
+        self.materialize_metrics = materialize_metrics
+        self.replied_to = replied_to
+        self.max_requests = max_requests
+        self.deadline = deadline
+        self.priority = priority
+        self.report = None
 
-    def comments(self):
-        # Return comments as a Python list
+    @property
+    def budgeted(self):
+        return self.max_requests is not None or self.deadline is not None or self.priority is not None
+
+    def _base_comments(self):
+        """
+        Return (comments whose replies are crawled, every comment found so far,
+        ids of the base comments from a listing, which come without their replies)
+
+        Comments of submissions come with their reply trees, the comments of a Redditor
+        come from a listing and need a refresh (a request each) to load theirs
+        """
+        listed = set()
         if isinstance(self.start, Subreddit):
             subs = self.start.submissions()
             base_comment_list = list(chain.from_iterable([sub.comments() for sub in subs]))
@@ -183,6 +327,7 @@ class CommentsReplies(Comments):
         elif isinstance(self.start, Redditor):
             full_comment_list = []
             comments = self.start.comments()
+            listed = {comment.properties["id"] for comment in comments}
             for comment in comments:
                 full_comment_list = full_comment_list + _search_submission(comment)
             # We are interested in the replies of submissions too
@@ -194,26 +339,106 @@ class CommentsReplies(Comments):
         else:
             base_comment_list = self.start.comments()
             full_comment_list = base_comment_list
+        return base_comment_list, full_comment_list, listed
+
+    def _comment_groups(self):
+        """
+        Yield the comments found from the starting point first, then each base comment with its replies
+        (the base comment comes again, so that the codes of the part find the author the replies replied to)
+        """
+        if self.budgeted:
+            yield self._budgeted_comments()
+            return
+        # Imported here, so that importing relationships does not import praw
+        from praw.models import MoreComments
+        base_comment_list, full_comment_list, _ = self._base_comments()
+        yield list(full_comment_list)
         for comment in base_comment_list:
             if isinstance(comment, MoreComments):
                 base_comment_list += comment.comments()
                 continue
-            try:
-                comment.refresh()
-                for reply in comment.replies:
-                    full_comment_list.append(reply)
-            except AttributeError:
-                for reply in comment.replies():
-                    full_comment_list.append(reply)
+            # Only the replies that are loaded already, a budgeted crawl refreshes the listed comments
+            yield [comment] + comment.replies()
+
+    def comments(self):
+        # Return comments as a Python list
+        groups = self._comment_groups()
+        full_comment_list = next(groups)
+        for group in groups:
+            full_comment_list += group[1:]  # The base comment is in the first group already
         return full_comment_list
 
-    def _merge_and_link_comments(self, comment_list: List[Comment]):
+    def _budgeted_comments(self):
+        from praw.models import MoreComments
+        priority = self.priority if self.priority is not None else score_priority
+        report = CrawlReport()
+        self.report = report
+        started = time.monotonic()
+        base_comment_list, full_comment_list, listed = self._base_comments()
+        full_comment_list = list(full_comment_list)
+
+        # Entries are (-priority, tie breaker, depth, Comment or MoreComments, parent id, refresh)
+        # MoreComments get the priority of their parent
+        # Comments of a listing come without their replies, they are refreshed first
+        heap = []
+        order = count()
+
+        def push(item, depth, parent_key, parent_id, refresh=False):
+            if isinstance(item, MoreComments):
+                heapq.heappush(heap, (parent_key, next(order), depth, item, parent_id, refresh))
+            else:
+                heapq.heappush(heap, (-priority(item, depth), next(order), depth, item, parent_id, refresh))
+
+        for comment in base_comment_list:
+            push(comment, 0, 0, None, refresh=comment.properties["id"] in listed)
+
+        left = []  # Entries needing a request when max_requests was spent, replies loaded already are walked still
+        while heap:
+            entry = heapq.heappop(heap)
+            key, _, depth, item, parent_id, refresh = entry
+            if self.deadline is not None and time.monotonic() - started >= self.deadline:
+                report.truncated = True
+                left.append(entry)
+                break
+            request = refresh or isinstance(item, MoreComments)
+            if request and self.max_requests is not None and report.requests >= self.max_requests:
+                report.truncated = True
+                left.append(entry)
+                continue
+            if request:
+                report.requests += 1
+            if isinstance(item, MoreComments):
+                children = [Comment.from_base_obj(comm) if not isinstance(comm, MoreComments) else comm
+                            for comm in item.comments()]
+                for child in children:
+                    if not isinstance(child, MoreComments):
+                        full_comment_list.append(child)
+                    push(child, depth, key, parent_id)
+                continue
+            if refresh:
+                item.refresh()
+            for reply in list(item.resp.replies):
+                if isinstance(reply, MoreComments):
+                    push(reply, depth + 1, key, item.properties["id"])
+                    continue
+                reply = Comment.from_base_obj(reply)
+                full_comment_list.append(reply)
+                push(reply, depth + 1, key, item.properties["id"])
+
+        for _, _, _, item, parent_id, _ in left + heap:
+            if isinstance(item, MoreComments):
+                parent_id = parent_id if parent_id is not None else item.parent_id.split("_", 1)[-1]
+                report.unloaded[parent_id] = report.unloaded.get(parent_id, 0) + item.count
+            else:
+                report.unexpanded.append(item.properties["id"])
+        return full_comment_list
+
+    def _merge_and_link_comments(self, comment_list: List[Comment], with_submissions=True):
         # to reduce duplication
         # and doing it this way performs better than
         # directly using the inherited method instead of overriding (?)
-        return super()._merge_and_link_comments(comment_list)
+        return super()._merge_and_link_comments(comment_list, with_submissions)
 
     def code(self):
-        comment_merges, comment_links, submissions = self._merge_and_link_comments(self.comments())
-        sub_merges, sub_links = self._merge_and_link_submissions(submissions)
-        return comment_merges + sub_merges + comment_links + sub_links
+        merges, links = self._merges_and_links()
+        return merges + links
@@ -0,0 +1,77 @@
+"""
+Redditor -REPLIED_TO-> Redditor relationships, derived at ingest time
+
+"Who replies to whom" means walking Redditor-AUTHORED-Comment-UNDER-(Comment or Submission)-AUTHORED-Redditor
+paths on every query. With Comments(..., replied_to=True) (or CommentsReplies), the crawl writes
+REPLIED_TO relationships between the redditors directly:
+
+    (replier:Redditor)-[:REPLIED_TO {weight}]->(parent author:Redditor)
+    weight: # comments of replier under a submission or a comment of the parent author
+
+Pairs are aggregated in memory from the parent ids and the authors the crawl already has,
+only the parents in the crawl are used (no extra requests). Replies to oneself are left out.
+Codes are written in bulk (UNWIND), up to _ROWS_PER_CODE pairs per code.
+
+Weights are incremented, not recounted: a comment that was counted is marked with
+replied_to_counted on its node, so merging the same comment again does not count it twice,
+and the comments of later crawls add up.
+"""
+_ROWS_PER_CODE = 500
+
+
+class RepliedToCode(str):
+    """
+    The code of a batch of REPLIED_TO pairs, which also keeps the pairs it's made of
+    as rows of ((replier id, parent author id), comment ids), see NodeCode in data_models
+    """
+    def __new__(cls, rows):
+        code = super().__new__(cls, _replied_to_code(rows))
+        code.rows = rows
+        return code
+
+
+def _replied_to_code(rows):
+    rows_str = ", ".join(
+        '{r: "%s", p: "%s", comments: [%s]}' % (replier, parent_author, ", ".join(f'"{id_}"' for id_ in comment_ids))
+        for (replier, parent_author), comment_ids in rows
+    )
+    return """
+UNWIND [%s] AS row
+MATCH (c:Comment) WHERE c.id IN row.comments AND c.replied_to_counted IS NULL
+WITH row, collect(c) AS new
+WHERE size(new) > 0
+MATCH (r:Redditor {id: row.r})
+MATCH (p:Redditor {id: row.p})
+MERGE (r)-[e:REPLIED_TO]->(p)
+ON CREATE SET e.weight = 0
+SET e.weight = e.weight + size(new)
+FOREACH (c IN new | SET c.replied_to_counted = true);
+""" % rows_str
+
+
+def _replied_to_codes(comments, submissions):
+    """
+    comments: Comment objects of a crawl
+    submissions: Submission objects those comments are under
+
+    To be run after the comments and their authors are merged
+    """
+    authors = {}  # Fullname (t1_ or t3_ prefixed id) -> id of the author
+    for sub in submissions:
+        if sub.author_accessible:
+            authors["t3_" + sub.properties["id"]] = sub.author_id
+    for comment in comments:
+        if comment.author_accessible:
+            authors["t1_" + comment.properties["id"]] = comment.author_id
+
+    pairs = {}  # (replier, parent author) -> {comment id: True}
+    for comment in comments:
+        if not comment.author_accessible:
+            continue
+        parent_author = authors.get(comment.parent_id)
+        if parent_author is None or parent_author == comment.author_id:
+            continue
+        pairs.setdefault((comment.author_id, parent_author), {})[comment.properties["id"]] = True
+
+    rows = [(pair, list(comment_ids)) for pair, comment_ids in pairs.items()]
+    return [RepliedToCode(rows[start:start + _ROWS_PER_CODE]) for start in range(0, len(rows), _ROWS_PER_CODE)]
@@ -0,0 +1,239 @@
+"""
+A "seen" index that persists across runs, to skip the codes written by earlier runs
+
+RedditNetwork deduplicates the codes of a run in memory, so a code is written again by every run.
+For crawls running for days, give the network a SeenIndex:
+
+    seen = SQLiteSeenIndex("seen.db")
+    net = RedditNetwork(driver, components, seen=seen)
+    net.run_cypher_code()  # Codes written by earlier runs are skipped without asking Neo4j
+
+A code is marked as seen once its transaction is committed.
+The index keeps a 16 byte digest per code instead of the code itself.
+A node whose properties changed has a different MERGE code, so it's written again.
+RedditNetwork only adds and skips node and relationship codes, other codes (counters, REPLIED_TO weights)
+depend on the graph they're run on, so they're run every time.
+
+Backends:
+    MemorySeenIndex: a set, does not persist (same as deduplicating in memory)
+    SQLiteSeenIndex: exact, on disk, bounded memory
+    BloomSeenIndex: a Bloom filter kept in memory and saved to a file.
+        A few bytes per code, no disk lookups, but with a false positive rate of error_rate:
+        that many new codes are skipped as if they were seen, and never written.
+        Out of N new nodes and relationships, error_rate * N are lost on average,
+        more once more than capacity codes were added (see BloomSeenIndex.false_positive_rate).
+        With exact=SQLiteSeenIndex(...), only the positives are checked on disk,
+        which keeps it exact (nothing is lost) and still skips the disk lookup for most new codes.
+        The filter is saved every flush_interval seconds and on close, codes added since the last save
+        are written again by the next run if the process dies.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+
+_BLOOM_MAGIC = b"RDBF"
+_BLOOM_HEADER = struct.Struct("<4sQQQ")  # magic, # of bits, # of hashes, # of keys added
+_SQLITE_BATCH = 500
+
+
+def code_key(code):
+    return hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+
+
+class SeenIndex(ABC):
+    """
+    Keys are bytes (see code_key)
+    """
+    @abstractmethod
+    def seen_keys(self, keys) -> set:
+        """
+        Return the subset of keys that were added before
+        """
+
+    @abstractmethod
+    def add_keys(self, keys):
+        pass
+
+    def flush(self):
+        """
+        Persist the index, if the backend needs it
+        """
+
+    def close(self):
+        self.flush()
+
+    def unseen(self, codes):
+        """
+        Return the codes that were not added before, in order
+        """
+        keys = [code_key(code) for code in codes]
+        seen = self.seen_keys(keys)
+        return [code for code, key in zip(codes, keys) if key not in seen]
+
+    def add(self, codes):
+        self.add_keys([code_key(code) for code in codes])
+
+    def __contains__(self, code):
+        key = code_key(code)
+        return key in self.seen_keys([key])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemorySeenIndex(SeenIndex):
+    def __init__(self):
+        self.keys = set()
+
+    def seen_keys(self, keys):
+        return {key for key in keys if key in self.keys}
+
+    def add_keys(self, keys):
+        self.keys.update(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class SQLiteSeenIndex(SeenIndex):
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def seen_keys(self, keys):
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[start:start + _SQLITE_BATCH]
+                rows = self._conn.execute(
+                    "SELECT key FROM seen WHERE key IN (%s)" % ",".join("?" * len(batch)), batch
+                )
+                found.update(bytes(row[0]) for row in rows)
+        return found
+
+    def add_keys(self, keys):
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", ((key,) for key in keys))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM seen").fetchone()[0]
+
+
+class BloomSeenIndex(SeenIndex):
+    """
+    path: File the filter is loaded from (if it exists) and saved to, None keeps it in memory
+    capacity: Number of keys the filter is sized for
+    error_rate: False positive rate when capacity keys are added (it grows beyond capacity)
+    exact: A SeenIndex to confirm the positives with, makes the index exact
+    flush_interval: Seconds between two saves of the filter at most, while keys are added
+    """
+    def __init__(self, path=None, capacity=10_000_000, error_rate=0.001, exact: SeenIndex = None,
+                 flush_interval=60):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate should be between 0 and 1")
+        self.path = path
+        self.exact = exact
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flushed = time.monotonic()
+        if path is not None and os.path.exists(path):
+            self._load(path)
+        else:
+            self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+            self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+            self.count = 0
+            self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _load(self, path):
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes, count = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter saved by BloomSeenIndex")
+            self.bits = bytearray(f.read())
+        if len(self.bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+        self.num_bits, self.num_hashes, self.count = num_bits, num_hashes, count
+
+    def _positions(self, key):
+        # Double hashing with the two halves of the digest
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _might_contain(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def seen_keys(self, keys):
+        with self._lock:
+            positives = {key for key in keys if self._might_contain(key)}
+        if self.exact is not None and positives:
+            return self.exact.seen_keys(positives)
+        return positives
+
+    def add_keys(self, keys):
+        keys = list(keys)
+        with self._lock:
+            bits = self.bits
+            for key in keys:
+                for pos in self._positions(key):
+                    bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += len(keys)
+            self._dirty = True
+        if self.exact is not None:
+            self.exact.add_keys(keys)
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def false_positive_rate(self):
+        """
+        Estimated false positive rate with the keys added so far,
+        the share of new codes that would be skipped as if they were seen
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def flush(self):
+        """
+        Save the filter to path, if keys were added since the last save
+        """
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        with self._lock:
+            if not self._dirty:
+                return
+            with open(tmp, "wb") as f:
+                f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.num_bits, self.num_hashes, self.count))
+                f.write(self.bits)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._dirty = False
+            self._flushed = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self.exact is not None:
+            self.exact.close()
+
+    def __len__(self):
+        return self.count
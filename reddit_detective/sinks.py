@@ -0,0 +1,197 @@
+"""
+Graph sinks: where RedditNetwork writes the node and relationship records of the components
+
+    Neo4jSink: Runs the codes on a Neo4j database (the default, RedditNetwork(driver, ...))
+    MemoryGraph: Keeps the graph in this process, no database needed
+
+    graph = MemoryGraph()
+    net = RedditNetwork(sink=graph, components=[Comments(Subreddit(api, "learnpython", limit=10))])
+    net.run_cypher_code()
+    interaction_score(graph, "some_user")  # analytics.metrics take the graph instead of a driver
+
+MemoryGraph interns the ids of the nodes to integers and keeps the relationships
+as arrays of neighbors per node and relationship type, in both directions.
+Records are merged by id like the MERGE codes with the constraints (see RedditNetwork.create_constraints):
+a node written again gets the new labels and properties, a relationship is written once.
+A relationship whose nodes are not in the graph is left out, as MATCH would do.
+REPLIED_TO relationships (see reddit_detective.replied_to) keep their weight in MemoryGraph.weights.
+
+Only the node and relationship records are understood. The counters of materialize_metrics
+are counted in MemoryGraph.ignored (the metrics walk the graph), other codes (e.g. karma, plain Cypher strings)
+raise a SinkError, and nothing of the chunk is written.
+"""
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from reddit_detective.analytics.cache import bump_graph_version
+from reddit_detective.data_models import NodeCode
+from reddit_detective.exceptions import SinkError
+from reddit_detective.materialized import CountersCode, StaleCountersCode
+from reddit_detective.relationships import LinkCode
+from reddit_detective.replied_to import RepliedToCode
+
+if TYPE_CHECKING:
+    from neo4j import BoltDriver
+
+
+class GraphSink(ABC):
+    @abstractmethod
+    def write(self, codes):
+        """
+        Write the codes (NodeCode, LinkCode or other Cypher) at once
+        """
+
+    @contextmanager
+    def writer(self):
+        """
+        Yield a function writing a chunk of codes at once, for writing many chunks in a row
+        """
+        yield self.write
+
+
+class Neo4jSink(GraphSink):
+    def __init__(self, driver: "BoltDriver"):
+        self.driver = driver
+
+    @staticmethod
+    def _run_chunk(chunk):
+        def run_chunk(tx):
+            for query in chunk:
+                tx.run(query)
+        return run_chunk
+
+    @contextmanager
+    def writer(self):
+        try:
+            with self.driver.session() as session:
+                yield lambda chunk: session.write_transaction(self._run_chunk(chunk))
+        finally:
+            # Even a partial write invalidates the cached analytics results
+            bump_graph_version(self.driver)
+
+    def write(self, codes):
+        with self.writer() as write:
+            write(codes)
+
+
+_MEMORY_CODES = (NodeCode, LinkCode, RepliedToCode, CountersCode, StaleCountersCode)
+
+
+class MemoryGraph(GraphSink):
+    def __init__(self):
+        self.index = {}  # Node id -> node
+        self.ids = []  # Node -> node id
+        self.labels = []  # Node -> set of labels
+        self.properties = []  # Node -> properties
+        self.ignored = 0  # Counter codes, left out
+        self._out = {}  # Relationship type -> node -> array of the nodes it points to
+        self._in = {}  # Relationship type -> node -> array of the nodes pointing to it
+        self._edges = set()
+        self.weights = {}  # (first node, second node) -> weight of the REPLIED_TO relationship
+        self._counted = set()  # Comments counted in the weights
+        self._lookups = {}  # (label, key) -> {value: [nodes]}, cleared on write
+
+    def _node(self, node_id):
+        node = self.index.get(node_id)
+        if node is None:
+            node = len(self.ids)
+            self.index[node_id] = node
+            self.ids.append(node_id)
+            self.labels.append(set())
+            self.properties.append({})
+        return node
+
+    @staticmethod
+    def _append(table, rel_type, node, neighbor):
+        adjacency = table.setdefault(rel_type, [])
+        while len(adjacency) <= node:
+            adjacency.append(array("l"))
+        adjacency[node].append(neighbor)
+
+    def _link(self, first, second, rel_type):
+        if (first, second, rel_type) in self._edges:
+            return
+        self._edges.add((first, second, rel_type))
+        self._append(self._out, rel_type, first, second)
+        self._append(self._in, rel_type, second, first)
+
+    def _replied_to(self, code):
+        for (replier, parent_author), comment_ids in code.rows:
+            first, second = self.index.get(replier), self.index.get(parent_author)
+            new = [id_ for id_ in comment_ids if id_ in self.index and id_ not in self._counted]
+            if first is None or second is None or not new:
+                continue
+            self._link(first, second, "REPLIED_TO")
+            self.weights[(first, second)] = self.weights.get((first, second), 0) + len(new)
+            self._counted.update(new)
+
+    def write(self, codes):
+        codes = list(codes)
+        for code in codes:
+            if not isinstance(code, _MEMORY_CODES):
+                raise SinkError(f"MemoryGraph can't write {type(code).__name__} codes (only nodes, relationships "
+                                f"and counters), run it on Neo4j: {code.strip()[:80]}")
+        for code in codes:
+            if isinstance(code, NodeCode):
+                node = self._node(code.properties["id"])
+                self.labels[node].update(code.types)
+                self.properties[node].update(code.properties)
+            elif isinstance(code, LinkCode):
+                first, second = self.index.get(code.first_id), self.index.get(code.second_id)
+                if first is not None and second is not None:
+                    self._link(first, second, code.rel_type)
+            elif isinstance(code, RepliedToCode):
+                self._replied_to(code)
+            else:
+                self.ignored += 1
+        self._lookups.clear()
+        bump_graph_version(self)
+
+    def node(self, node_id):
+        """
+        Return the properties of the node with the id, None if it's not in the graph
+        """
+        node = self.index.get(node_id)
+        return self.properties[node] if node is not None else None
+
+    def nodes(self, label=None):
+        return [node for node in range(len(self.ids)) if label is None or label in self.labels[node]]
+
+    def find(self, label, key, value):
+        """
+        Return the nodes of the label whose property key is value
+        """
+        lookup = self._lookups.get((label, key))
+        if lookup is None:
+            lookup = {}
+            for node in self.nodes(label):
+                lookup.setdefault(self.properties[node].get(key), []).append(node)
+            self._lookups[(label, key)] = lookup
+        return lookup.get(value, [])
+
+    @staticmethod
+    def _neighbors(table, rel_type, node):
+        adjacency = table.get(rel_type, [])
+        return adjacency[node] if node < len(adjacency) else array("l")
+
+    def successors(self, node, rel_type, label=None):
+        """
+        Nodes the node points to with rel_type relationships, only the ones with the label if given
+        """
+        neighbors = self._neighbors(self._out, rel_type, node)
+        return [n for n in neighbors if label is None or label in self.labels[n]]
+
+    def predecessors(self, node, rel_type, label=None):
+        """
+        Nodes pointing to the node with rel_type relationships, only the ones with the label if given
+        """
+        neighbors = self._neighbors(self._in, rel_type, node)
+        return [n for n in neighbors if label is None or label in self.labels[n]]
+
+    def node_count(self):
+        return len(self.ids)
+
+    def relationship_count(self):
+        return len(self._edges)
@@ -0,0 +1,190 @@
+"""
+Continuous ingestion of the new submissions and comments of a subreddit
+
+Instead of re-running Submissions/Comments on a timer, follow the streams of a subreddit
+(PRAW's subreddit.stream) and write the new items as they come, in micro-batches:
+
+    stream = net.stream(Subreddit(api, "learnpython", limit=None), batch_size=100, window=10)
+    # Blocks until stream.stop() is called from another thread, max_items/duration is reached
+    # or Ctrl+C. The items waiting in the current batch are written before returning.
+    print(stream.stats)
+
+A batch is written when it has batch_size items, or window seconds after its first item came.
+Items go through the same rules as the Submissions and Comments components:
+the submissions of new comments are merged too, and so are the authors and the subreddit.
+
+Metrics (stream.stats, a StreamStats):
+    throughput: Items written per second
+    lag: Seconds between the creation of an item on Reddit and its write, of the last batch
+    max_lag: Highest lag of a batch so far
+    backlog: Items received but not written yet
+"""
+import threading
+import time
+
+from reddit_detective.codes import unique_records
+from reddit_detective.data_models import Comment, Submission, Subreddit
+from reddit_detective.relationships import Comments
+
+
+class StreamStats:
+    def __init__(self):
+        self.submissions = 0
+        self.comments = 0
+        self.batches = 0
+        self.codes = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.backlog = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def items(self):
+        return self.submissions + self.comments
+
+    @property
+    def throughput(self):
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"StreamStats(submissions={self.submissions}, comments={self.comments}, batches={self.batches}, "
+                f"codes={self.codes}, throughput={self.throughput:.2f}/s, lag={self.lag:.2f}s, "
+                f"max_lag={self.max_lag:.2f}s, backlog={self.backlog}, elapsed={self.elapsed:.2f}s)")
+
+
+class _Batch(Comments):
+    """
+    Codes of a micro-batch, by the rules of the Submissions and Comments components
+    """
+    def __init__(self, submissions, comments, materialize_metrics=False):
+        self.submissions = submissions
+        self.comments_ = comments
+        self.materialize_metrics = materialize_metrics
+        self.replied_to = False
+
+    def comments(self):
+        return self.comments_
+
+    def _merges_and_links(self):
+        comment_merges, comment_links = super()._merges_and_links()
+        sub_merges, sub_links = self._merge_and_link_submissions(self.submissions)
+        return sub_merges + comment_merges, sub_links + comment_links
+
+
+class SubredditStream:
+    """
+    net: The RedditNetwork to write to (its seen index is used, if any)
+    subreddit: A Subreddit node
+    batch_size: Items per batch at most
+    window: Seconds an item waits for its batch to fill at most
+    submissions, comments: Streams to follow
+    skip_existing: Ignore the items created before the stream started
+        (PRAW streams start with the latest 100 items otherwise)
+    max_items, duration: Stop after that many items or seconds, None runs until stop()
+    """
+    def __init__(self, net, subreddit: Subreddit, batch_size=100, window=5.0, submissions=True, comments=True,
+                 skip_existing=False, max_items=None, duration=None, chunk_size=None, materialize_metrics=False):
+        if not submissions and not comments:
+            raise ValueError("the stream should follow submissions, comments or both")
+        self.net = net
+        self.subreddit = subreddit
+        self.batch_size = batch_size
+        self.window = window
+        self.follow_submissions = submissions
+        self.follow_comments = comments
+        self.skip_existing = skip_existing
+        self.max_items = max_items
+        self.duration = duration
+        self.chunk_size = chunk_size
+        self.materialize_metrics = materialize_metrics
+        self.stats = StreamStats()
+        self._stop = threading.Event()
+        self._submissions = []
+        self._comments = []
+        self._batch_started = None
+
+    def stop(self):
+        """
+        Stop the stream, the current batch is written before run() returns
+        """
+        self._stop.set()
+
+    def _streams(self):
+        # pause_after=-1 yields None whenever a request has no new items,
+        # so that the streams take turns and the time window is checked in between
+        stream = self.subreddit.resp.stream
+        streams = []
+        if self.follow_submissions:
+            streams.append((Submission, stream.submissions(pause_after=-1, skip_existing=self.skip_existing)))
+        if self.follow_comments:
+            streams.append((Comment, stream.comments(pause_after=-1, skip_existing=self.skip_existing)))
+        return streams
+
+    def _add(self, kind, item):
+        if self._batch_started is None:
+            self._batch_started = time.monotonic()
+        if kind is Submission:
+            self._submissions.append(Submission.from_base_obj(item, limit=None))
+        else:
+            self._comments.append(Comment.from_base_obj(item))
+        self.stats.backlog = len(self._submissions) + len(self._comments)
+
+    def _due(self):
+        if self.stats.backlog >= self.batch_size:
+            return True
+        return self._batch_started is not None and time.monotonic() - self._batch_started >= self.window
+
+    def _flush(self):
+        if not self._submissions and not self._comments:
+            return
+        submissions, comments = self._submissions, self._comments
+        self._submissions, self._comments = [], []
+        self._batch_started = None
+        merges, links = _Batch(submissions, comments, self.materialize_metrics)._merges_and_links()
+        codes = self.net._unseen(unique_records(merges + links))
+        self.net._run_query(codes, self.chunk_size, mark_seen=True)
+
+        now = time.time()
+        created = [node.properties["created_utc"] for node in submissions + comments]
+        self.stats.lag = now - min(created)
+        self.stats.max_lag = max(self.stats.max_lag, self.stats.lag)
+        self.stats.submissions += len(submissions)
+        self.stats.comments += len(comments)
+        self.stats.batches += 1
+        self.stats.codes += len(codes)
+        self.stats.backlog = 0
+
+    def _done(self):
+        if self._stop.is_set():
+            return True
+        if self.max_items is not None and self.stats.items + self.stats.backlog >= self.max_items:
+            return True
+        return self.duration is not None and time.monotonic() - self.stats.started >= self.duration
+
+    def run(self):
+        """
+        Follow the streams until stopped, returns the StreamStats
+        """
+        streams = self._streams()
+        try:
+            while not self._done():
+                for kind, stream in streams:
+                    for item in stream:
+                        if item is None:
+                            break  # No new items for now, take turns
+                        self._add(kind, item)
+                        if self._due() or self._done():
+                            break
+                    if self._due():
+                        self._flush()
+                    if self._done():
+                        break
+                self.stats.elapsed = time.monotonic() - self.stats.started
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # The items received are written whatever stopped the stream (e.g. a network error)
+            self._flush()
+            self.stats.elapsed = time.monotonic() - self.stats.started
+        return self.stats
@@ -0,0 +1,179 @@
+"""
+Off-graph storage for the long textual properties (comment bodies, submission texts, subreddit descriptions)
+
+By default, the whole text is a node property, so it's in every MERGE code and in the store of Neo4j,
+even for traversals that never look at it. Give the network a TextStore to keep the texts out of the graph:
+
+    texts = TextStore("texts.db")
+    net = RedditNetwork(driver, components, text_store=texts)
+    net.run_cypher_code()
+
+The texts go to a local SQLite file, compressed and keyed by their hash (the same text is stored once).
+Nodes keep, instead of e.g. the text property:
+    text_hash: Key of the text in the store
+    text_length: Number of characters
+    text_preview: The first preview characters (left out if preview=0)
+
+Resolve the texts only when needed:
+
+    texts.get(node["text_hash"])
+    texts.resolve(node)  # Properties of a node with the texts put back
+
+Texts are compressed with zstd if zstandard is installed (pip install reddit_detective[texts]),
+with zlib otherwise. Texts shorter than 64 bytes are stored as they are.
+"""
+import hashlib
+import sqlite3
+import threading
+import zlib
+
+from reddit_detective.data_models import NodeCode, _merge_code
+
+TEXT_FIELDS = ["text", "desc", "title"]
+_MIN_COMPRESSED = 64
+_SQLITE_BATCH = 500
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TextStore:
+    """
+    path: SQLite file the texts are kept in
+    fields: Properties moved to the store
+    preview: Characters of the text kept on the node, 0 for none
+    level: Compression level
+    """
+    def __init__(self, path, fields=None, preview=80, level=3):
+        self.path = path
+        self.fields = list(fields) if fields is not None else list(TEXT_FIELDS)
+        self.preview = preview
+        self.level = level
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts "
+            "(hash TEXT PRIMARY KEY, length INTEGER, codec TEXT, data BLOB) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        try:
+            import zstandard
+            self.codec = "zstd"
+            self._compressor = zstandard.ZstdCompressor(level=level)
+        except ImportError:
+            self.codec = "zlib"
+            self._compressor = None
+
+    def _compress(self, raw):
+        if len(raw) < _MIN_COMPRESSED:
+            return "raw", raw
+        if self.codec == "zstd":
+            return "zstd", self._compressor.compress(raw)
+        return "zlib", zlib.compress(raw, self.level)
+
+    @staticmethod
+    def _decompress(codec, data):
+        data = bytes(data)
+        if codec == "zstd":
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        return data
+
+    def put_many(self, texts):
+        """
+        Store the texts, returns their hashes in order
+        """
+        hashes = [text_hash(text) for text in texts]
+        rows = {}
+        for key, text in zip(hashes, texts):
+            if key not in rows:
+                codec, data = self._compress(text.encode("utf-8"))
+                rows[key] = (key, len(text), codec, data)
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO texts VALUES (?, ?, ?, ?)", rows.values())
+            self._conn.commit()
+        return hashes
+
+    def put(self, text):
+        return self.put_many([text])[0]
+
+    def get_many(self, hashes):
+        """
+        Return {hash: text} for the hashes in the store
+        """
+        hashes = list(hashes)
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _SQLITE_BATCH):
+                batch = hashes[start:start + _SQLITE_BATCH]
+                rows = self._conn.execute(
+                    "SELECT hash, codec, data FROM texts WHERE hash IN (%s)" % ",".join("?" * len(batch)), batch
+                ).fetchall()
+                for key, codec, data in rows:
+                    found[key] = self._decompress(codec, data).decode("utf-8")
+        return found
+
+    def get(self, key):
+        """
+        Return the text with the hash, None if it's not in the store
+        """
+        return self.get_many([key]).get(key)
+
+    def resolve(self, properties):
+        """
+        Return a copy of the properties of a node with the texts put back
+        (e.g. text instead of text_hash, text_length and text_preview)
+        """
+        props = dict(properties)
+        keys = {field: props[f"{field}_hash"] for field in self.fields if f"{field}_hash" in props}
+        texts = self.get_many(keys.values())
+        for field, key in keys.items():
+            for suffix in ["_hash", "_length", "_preview"]:
+                props.pop(field + suffix, None)
+            props[field] = texts.get(key)
+        return props
+
+    def _offloaded(self, properties, hashes):
+        props = {}
+        for key, value in properties.items():
+            if key in self.fields and isinstance(value, str):
+                props[f"{key}_hash"] = hashes[value]
+                props[f"{key}_length"] = len(value)
+                if self.preview:
+                    props[f"{key}_preview"] = value[:self.preview]
+            else:
+                props[key] = value
+        return props
+
+    def offload(self, codes):
+        """
+        Store the texts of the MERGE codes of nodes and return the codes with the texts replaced,
+        other codes are returned as they are
+        """
+        texts = [
+            value
+            for code in codes if isinstance(code, NodeCode)
+            for key, value in code.properties.items() if key in self.fields and isinstance(value, str)
+        ]
+        hashes = dict(zip(texts, self.put_many(texts)))
+        return [
+            _merge_code(code.types, self._offloaded(code.properties, hashes)) if isinstance(code, NodeCode) else code
+            for code in codes
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM texts").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
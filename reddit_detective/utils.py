@@ -1,5 +1,17 @@
+import hashlib
+import json
+
+
 def strip_punc(str_):
     str_ = str_.replace("\'", "")
     str_ = str_.replace("\"", "")
     str_ = str_.replace("\\", "")
     return str_
+
+
+def fingerprint(properties):
+    """
+    A compact hash of the properties of a node, the same properties give the same fingerprint
+    """
+    data = json.dumps(properties, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
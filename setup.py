@@ -31,11 +31,16 @@ setuptools.setup(
         "Topic :: Sociology",
         "Topic :: Education",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
     ],
-    python_requires=">=3.6",
-    install_requires=["praw", "neo4j"]
+    python_requires=">=3.7",
+    install_requires=["praw", "neo4j"],
+    extras_require={
+        "analytics": ["numpy", "scipy"],
+        "dumps": ["zstandard"],
+        "snapshots": ["msgpack"],
+        "texts": ["zstandard"]
+    }
 )
@@ -0,0 +1,57 @@
+import gc
+import weakref
+
+from neo4j import GraphDatabase
+
+from reddit_detective import RedditNetwork
+from reddit_detective.analytics import metrics
+from reddit_detective.analytics.cache import cache_info, cached, clear_cache, graph_version
+from reddit_detective.sinks import MemoryGraph
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def test_cache_hits():
+    clear_cache()
+    score = metrics.interaction_score(driver_, "Anub_Rekhan")
+    assert metrics.interaction_score(driver_, "Anub_Rekhan") == score
+    assert cache_info()["hits"] == 1
+    score, cyborgs = metrics.cyborg_score_user(driver_, "Anub_Rekhan")
+    cyborgs.append("not_a_comment")
+    assert "not_a_comment" not in metrics.cyborg_score_user(driver_, "Anub_Rekhan")[1]
+
+
+def test_cache_invalidation():
+    clear_cache()
+    metrics.interaction_score(driver_, "Anub_Rekhan")
+    version = graph_version(driver_)
+    RedditNetwork(driver=driver_, components=[]).run_cypher_code()
+    assert graph_version(driver_) == version + 1
+    metrics.interaction_score(driver_, "Anub_Rekhan")
+    assert cache_info()["misses"] == 2
+
+
+def test_cache_releases_graph():
+    @cached
+    def node_count(graph):
+        return graph.node_count()
+
+    graph = MemoryGraph()
+    assert node_count(graph) == 0
+    ref = weakref.ref(graph)
+    del graph
+    gc.collect()
+    assert ref() is None
+
+
+def run():
+    test_cache_hits()
+    test_cache_invalidation()
+    test_cache_releases_graph()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,21 @@
+from reddit_detective.clients import ClientPool
+from reddit_detective.data_models import Redditor
+from reddit_detective.relationships import Comments
+from tests import api_
+
+
+def test_client_pool():
+    pool = ClientPool([api_])
+    comments = Comments(Redditor(pool, "Anub_Rekhan", limit=2))
+    assert comments.code()
+    stats = pool.stats()
+    assert stats[0]["routed"] >= 1
+    assert stats[0]["remaining"] is not None
+
+
+def run():
+    test_client_pool()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from neo4j import GraphDatabase
+
+from reddit_detective import RedditNetwork
+from reddit_detective.crawl_snapshot import SnapshotWriter, snapshot_codes
+from reddit_detective.dumps import Dumps
+from reddit_detective.exceptions import SnapshotError
+from tests.test_dumps import _write_dump
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def test_snapshot_roundtrip():
+    with tempfile.TemporaryDirectory() as dir_:
+        dumps = Dumps(_write_dump(dir_))
+        path = os.path.join(dir_, "crawl.rds")
+        net = RedditNetwork(driver=driver_, components=[dumps])
+        counts = net.save_snapshot(path)
+        assert counts["nodes"] > 0 and counts["relationships"] > 0
+        # The loaded codes are the codes of the crawl
+        assert sorted(snapshot_codes(path)) == sorted(set(dumps.code()))
+        # With their types
+        assert {type(code) for code in snapshot_codes(path)} == {type(code) for code in dumps.code()}
+        assert net.load_snapshot(path, batch_size=2) > 0
+
+
+def test_truncated_snapshot():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "crawl.rds")
+        RedditNetwork(driver=driver_, components=[Dumps(_write_dump(dir_))]).save_snapshot(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:-4])
+        try:
+            list(snapshot_codes(path))
+            assert False, "a truncated snapshot should not be read"
+        except SnapshotError:
+            pass
+
+
+def test_interrupted_snapshot():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "crawl.rds")
+        try:
+            with SnapshotWriter(path) as writer:
+                writer.write(Dumps(_write_dump(dir_)).code())
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        # Written without the end frame
+        try:
+            list(snapshot_codes(path))
+            assert False, "an interrupted snapshot should not be read"
+        except SnapshotError:
+            pass
+
+
+def run():
+    test_snapshot_roundtrip()
+    test_truncated_snapshot()
+    test_interrupted_snapshot()
+
+
+if __name__ == '__main__':
+    run()
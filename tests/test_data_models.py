@@ -1,4 +1,6 @@
-from reddit_detective.data_models import Comment, Submission, Subreddit, Redditor
+from reddit_detective.data_models import (Comment, Submission, Subreddit, Redditor,
+                                          DictComment, DictSubmission, DictRedditor)
+from reddit_detective.exceptions import MissingFieldError
 from tests import api_
 
 """
@@ -68,12 +70,48 @@ def test_cypher_codes_node():
     assert sub.props_code() in sub.merge_code()
 
 
+def test_dict_base_objects():
+    comment = Comment.from_base_obj(DictComment({
+        "id": "gcltb0o", "created_utc": 1606000000.0, "body": "A comment",
+        "is_submitter": False, "stickied": False, "link_id": "t3_jhd0px",
+        "author": "Anub_Rekhan", "author_fullname": "t2_4e4e4", "replies": ""
+    }))
+    assert comment.properties["text"] == "A comment"
+    assert comment.submission_id == "jhd0px"
+    assert comment.author_id == "4e4e4"
+    assert comment.replies() == []
+    # Absent fields are left out of the properties
+    sub = Submission.from_base_obj(DictSubmission({"id": "jhd0px", "title": "A title"}), limit=None)
+    assert "created_utc" not in sub.merge_code()
+    assert sub.types == ["Submission"]
+    try:
+        Submission.from_base_obj(DictSubmission({"id": "jhd0px"}, strict=True), limit=None)
+        assert False, "Strict DictBase objects should raise MissingFieldError"
+    except MissingFieldError:
+        pass
+    # Comments of a DictSubmission are under it, a link_id alone gives a strict stub
+    parent = DictSubmission({"id": "jhd0px", "title": "A title", "author": "Anub_Rekhan",
+                             "comments": [{"id": "gcltb0o", "body": "A comment", "link_id": "t3_jhd0px"}]})
+    nested = Comment.from_base_obj(parent.comments[0])
+    assert nested.resp.submission is parent
+    assert nested.submission.properties["title"] == "A title"
+    try:
+        _ = comment.submission
+        assert False, "Stub submissions should raise MissingFieldError"
+    except MissingFieldError:
+        pass
+    red = Redditor.from_base_obj(DictRedditor({"name": "deleted", "is_suspended": True}), limit=None)
+    assert "Suspended" in red.types
+    assert red.submissions() == []
+
+
 def run():
     test_subreddit()
     test_submission()
     test_redditor()
     test_comment()
     test_cypher_codes_node()
+    test_dict_base_objects()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,72 @@
+import os
+import tempfile
+from neo4j import GraphDatabase
+
+from tests import api_
+from reddit_detective.data_models import NodeCode
+from reddit_detective.distributed import (WorkItem, SQLiteWorkQueue, FileWorkQueue,
+                                          Worker, Coordinator)
+from reddit_detective.relationships import LinkCode
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def _check_queue(queue):
+    coordinator = Coordinator(queue, driver_)
+    coordinator.submit([
+        WorkItem("Subreddit", "learnpython", "submissions", limit=2),
+        WorkItem("Redditor", "Anub_Rekhan", "comments", limit=2)
+    ])
+    # A worker dying right after leasing an item
+    assert queue.lease("dead-worker", lease_seconds=0) is not None
+    Worker(queue, api_).run(poll_interval=0, idle_timeout=0)
+    assert coordinator.done()
+    assert queue.counts()["done"] == 2
+    assert coordinator.merge(results_per_chunk=1) == 2
+    assert queue.results() == []
+
+
+def test_sqlite_queue():
+    with tempfile.TemporaryDirectory() as dir_:
+        _check_queue(SQLiteWorkQueue(os.path.join(dir_, "queue.db")))
+
+
+def test_file_queue():
+    with tempfile.TemporaryDirectory() as dir_:
+        _check_queue(FileWorkQueue(dir_))
+
+
+def test_result_types():
+    with tempfile.TemporaryDirectory() as dir_:
+        for queue in [SQLiteWorkQueue(os.path.join(dir_, "queue.db")), FileWorkQueue(os.path.join(dir_, "queue"))]:
+            queue.put(WorkItem("Subreddit", "learnpython", "submissions"))
+            item = queue.lease("worker", lease_seconds=60)
+            queue.complete(item, [NodeCode(["Subreddit"], {"id": "2r8ot", "name": "learnpython"})],
+                           [LinkCode("hfulq4", "2r8ot", "UNDER", {})])
+            _, merges, links = queue.results(limit=1)[0]
+            # Codes keep their types, e.g. for the parallel writer
+            assert isinstance(merges[0], NodeCode) and merges[0].properties["name"] == "learnpython"
+            assert isinstance(links[0], LinkCode) and links[0].rel_type == "UNDER"
+
+
+def test_max_attempts():
+    with tempfile.TemporaryDirectory() as dir_:
+        queue = SQLiteWorkQueue(os.path.join(dir_, "queue.db"), max_attempts=1)
+        queue.put(WorkItem("Submission", "jpt7s7", "replies"))
+        assert queue.lease("dead-worker", lease_seconds=0) is not None
+        assert queue.lease("worker", lease_seconds=0) is None
+        assert queue.counts()["failed"] == 1
+
+
+def run():
+    test_sqlite_queue()
+    test_file_queue()
+    test_result_types()
+    test_max_attempts()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+import tempfile
+from neo4j import GraphDatabase
+
+from reddit_detective import RedditNetwork
+from reddit_detective.dumps import Dumps, read_dump
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+_SUBMISSION = {
+    "id": "dumpsub1", "created_utc": "1600000000", "title": "A \"title\"", "selftext": "",
+    "archived": False, "stickied": False, "locked": False, "over_18": False,
+    "subreddit": "learnpython", "subreddit_id": "t5_2r8ot",
+    "author": "Anub_Rekhan", "author_fullname": "t2_4e4e4"
+}
+_COMMENT = {
+    "id": "dumpcom1", "created_utc": 1600000003, "body": "A comment", "stickied": False,
+    "link_id": "t3_dumpsub1", "parent_id": "t3_dumpsub1",
+    "subreddit": "learnpython", "subreddit_id": "t5_2r8ot", "author": "[deleted]"
+}
+
+
+def _write_dump(dir_):
+    path = os.path.join(dir_, "dump.ndjson.gz")
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps(_SUBMISSION) + "\n")
+        f.write("not json\n")
+        f.write(json.dumps(_COMMENT) + "\n")
+    return path
+
+
+def test_read_dump():
+    with tempfile.TemporaryDirectory() as dir_:
+        records = list(read_dump(_write_dump(dir_)))
+        assert len(records) == 2
+        assert records[0]["created_utc"] == 1600000000.0
+
+
+def test_dumps_code():
+    with tempfile.TemporaryDirectory() as dir_:
+        dumps = Dumps(_write_dump(dir_), records_per_chunk=1)
+        chunks = list(dumps.chunks())
+        assert len(chunks) == 2
+        code = dumps.code()
+        assert any("dumpsub1" in c and c.startswith("MERGE") for c in code)
+        assert any("dumpcom1" in c and c.startswith("MERGE") for c in code)
+        # Deleted authors are not merged
+        assert not any("[deleted]" in c for c in code)
+        # Partial subreddits and redditors are not merged
+        assert not any(c.startswith("MERGE (n:Subreddit") or c.startswith("MERGE (n:Redditor") for c in code)
+        assert dumps.partial > 0
+
+
+def test_load_dumps():
+    with tempfile.TemporaryDirectory() as dir_:
+        net = RedditNetwork(driver=driver_, components=[])
+        assert net.load_dumps([_write_dump(dir_)], records_per_chunk=1) == 2
+
+
+def run():
+    test_read_dump()
+    test_dumps_code()
+    test_load_dumps()
+
+
+if __name__ == '__main__':
+    run()
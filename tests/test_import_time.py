@@ -0,0 +1,39 @@
+import re
+import subprocess
+import sys
+
+# Importing the package and analytics should not import praw/neo4j, which take ~0.4s
+IMPORT_BUDGET_US = 150000
+
+
+def _import_times(statement):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+    times = {}
+    for line in out.splitlines():
+        # Top level imports only, nested ones are indented
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)", line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+def test_lazy_imports():
+    statement = ("import sys, reddit_detective, reddit_detective.analytics.metrics; "
+                 "assert 'praw' not in sys.modules and 'neo4j' not in sys.modules")
+    subprocess.run([sys.executable, "-c", statement], check=True)
+
+
+def test_import_budget():
+    times = _import_times("import reddit_detective; import reddit_detective.analytics.metrics")
+    total = times["reddit_detective"] + times["reddit_detective.analytics.metrics"]
+    assert total < IMPORT_BUDGET_US
+
+
+def test_lazy_attributes():
+    import reddit_detective
+    from reddit_detective.network import RedditNetwork
+    assert reddit_detective.RedditNetwork is RedditNetwork
+    assert "Comments" in dir(reddit_detective)
@@ -17,8 +17,20 @@ def test_karma():
     net.add_karma(api_)
 
 
+def test_stale_karma():
+    net = RedditNetwork(
+        driver=driver_,
+        components=[]
+    )
+    net.add_karma(api_, labels=["Subreddit"])
+    # Every subreddit was refreshed a moment ago
+    assert net.add_karma(api_, max_age=3600, labels=["Subreddit"]) == 0
+    net.add_karma(api_, created_within=48 * 3600, labels=["Submission", "Comment"])
+
+
 def run():
     test_karma()
+    test_stale_karma()
 
 
 if __name__ == '__main__':
@@ -4,7 +4,11 @@ from reddit_detective.analytics.metrics import (interaction_score, interaction_s
                                                 cyborg_score_user, cyborg_score_submission,
                                                 cyborg_score_subreddit)
 from reddit_detective.analytics.utils import (get_redditors, get_user_comments_times,
-                                              get_submission_comments_times, get_subreddit_comments_times)
+                                              get_submission_comments_times, get_subreddit_comments_times,
+                                              get_materialized)
+from reddit_detective import RedditNetwork, Comments
+from reddit_detective.data_models import Redditor
+from tests import api_
 
 driver_ = GraphDatabase.driver(
     "bolt://localhost:7687",
@@ -89,6 +93,32 @@ def test_cyborg_score_subreddit():
     assert isinstance(cyborgs, list)
 
 
+def test_materialized_metrics():
+    net = RedditNetwork(
+        driver=driver_,
+        components=[
+            Comments(Redditor(api_, "Anub_Rekhan", limit=5), materialize_metrics=True)
+        ]
+    )
+    net.run_cypher_code()
+    counts = get_materialized(driver_, "Redditor", "username", "Anub_Rekhan",
+                              ["comments_received", "comments_made", "total_comments", "cyborg_comments"])
+    assert counts is not None
+    assert counts["comments_made"] >= counts["total_comments"] >= counts["cyborg_comments"]
+    seconds = list(driver_.session().run("""
+MATCH (:Redditor {username: "Anub_Rekhan"})-[:AUTHORED]->(c:Comment)
+RETURN c.seconds_past AS seconds_past
+"""))
+    assert seconds and all(record["seconds_past"] is not None for record in seconds)
+    sc = interaction_score(driver_, "Anub_Rekhan")
+    assert 0 <= sc <= 1
+    score, cyborgs = cyborg_score_user(driver_, "Anub_Rekhan")
+    assert 0 <= score <= 1
+    assert isinstance(cyborgs, list)
+    # Read from the counters, no ids
+    assert cyborg_score_user(driver_, "Anub_Rekhan", ids=False) == (score, None)
+
+
 def run():
     test_get_users()
     test_get_user_comments_times()
@@ -99,6 +129,7 @@ def run():
     test_cyborg_score_user()
     test_cyborg_score_submission()
     test_cyborg_score_subreddit()
+    test_materialized_metrics()
 
 
 if __name__ == '__main__':
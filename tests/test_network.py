@@ -1,10 +1,16 @@
+import gzip
+import os
+import tempfile
 from neo4j import GraphDatabase
 from pprint import pprint
 from collections import Counter
 
 from tests import api_
 from reddit_detective import RedditNetwork, Comments, CommentsReplies
-from reddit_detective.data_models import Redditor, Submission
+from reddit_detective.checkpoint import Checkpoint
+from reddit_detective.data_models import NodeCode, Redditor, Submission, Subreddit
+from reddit_detective.exceptions import CheckpointError
+from reddit_detective.parallel import ParallelNeo4jSink
 
 driver_ = GraphDatabase.driver(
     "bolt://localhost:7687",
@@ -25,6 +31,126 @@ def test_network_creation():
     net.run_cypher_code()
 
 
+def test_chunked_run():
+    with tempfile.TemporaryDirectory() as dir_:
+        journal = os.path.join(dir_, "run.journal")
+        net = RedditNetwork(
+            driver=driver_,
+            components=[
+                Comments(Redditor(api_, "Anub_Rekhan", limit=5))
+            ]
+        )
+        net.run_cypher_code(chunk_size=10, checkpoint=journal)
+        # The journal is removed once every chunk is committed
+        assert not os.path.exists(journal)
+        net.add_karma(api_, chunk_size=10, checkpoint=journal)
+        assert not os.path.exists(journal)
+
+
+def test_checkpoint_resume():
+    with tempfile.TemporaryDirectory() as dir_:
+        checkpoint = Checkpoint(os.path.join(dir_, "run.journal"))
+        codes = [NodeCode(["Subreddit"], {"id": "2r8ot", "name": "learnpython"}), "MATCH (n) RETURN n;"]
+        checkpoint.start(codes, chunk_size=1)
+        checkpoint.commit(0)
+        resumed, chunk_size, committed = checkpoint.load()
+        assert resumed == codes and chunk_size == 1 and committed == {0}
+        assert isinstance(resumed[0], NodeCode) and resumed[0].properties["name"] == "learnpython"
+        # A crash while writing the plan leaves nothing to resume
+        open(checkpoint.path, "w").close()
+        try:
+            checkpoint.load()
+            assert False
+        except CheckpointError:
+            pass
+
+
+def test_pipelined_run():
+    net = RedditNetwork(
+        driver=driver_,
+        components=[
+            Comments(Redditor(api_, "Anub_Rekhan", limit=5)),
+            Comments(Redditor(api_, "BloodMooseSquirrel", limit=5))
+        ]
+    )
+    stats = net.run_pipelined(crawlers=2, batch_size=20, max_batches=2)
+    assert stats.codes > 0
+    assert stats.crawl_stall >= 0 and stats.write_stall >= 0
+
+
+def test_parallel_run():
+    sink = ParallelNeo4jSink(driver_, sessions=4, batch_size=50)
+    net = RedditNetwork(
+        driver=driver_,
+        components=[
+            Comments(Subreddit(api_, "learnpython", limit=5))
+        ],
+        sink=sink
+    )
+    net.run_cypher_code(chunk_size=500)
+    assert sink.stats.transactions > 0
+    assert sink.stats.waves > 0
+
+
+def test_skip_unchanged():
+    net = RedditNetwork(
+        driver=driver_,
+        components=[
+            Comments(Redditor(api_, "Anub_Rekhan", limit=5))
+        ]
+    )
+    net.run_cypher_code()
+    # Nothing changed in between, so every node is skipped
+    assert net.run_cypher_code(skip_unchanged=True) > 0
+    assert net.skipped > 0
+
+
+def test_cypher_export():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "network.cypher.gz")
+        net = RedditNetwork(
+            driver=driver_,
+            components=[
+                Comments(Redditor(api_, "Anub_Rekhan", limit=5)),
+                Comments(Redditor(api_, "Anub_Rekhan", limit=3))
+            ]
+        )
+        written = net.export_cypher(path, transaction_size=10)
+        with gzip.open(path, "rt") as f:
+            lines = f.read().splitlines()
+        assert lines[0].startswith("CREATE CONSTRAINT")
+        assert lines.count(":begin") == lines.count(":commit") == -(-written // 10)
+        # Only nodes and relationships are deduplicated, every counter epoch bump is kept
+        bumps = sum("MetricsEpoch" in code for code in net._codes())
+        assert bumps == 2
+        assert sum("MetricsEpoch" in line for line in lines) == bumps
+
+
+def test_stream():
+    net = RedditNetwork(driver=driver_, components=[])
+    stream = net.stream(Subreddit(api_, "AskReddit", limit=None), batch_size=20, window=5, max_items=30)
+    assert stream.stats.items >= 30
+    assert stream.stats.backlog == 0
+    assert stream.stats.batches >= 2
+
+
+def test_estimate():
+    net = RedditNetwork(
+        driver=driver_,
+        components=[
+            Comments(Redditor(api_, "Anub_Rekhan", limit=5)),
+            CommentsReplies(Subreddit(api_, "learnpython", limit=10), max_requests=20)
+        ]
+    )
+    est = net.estimate(trees=1)
+    assert len(est.components) == 2
+    assert est.requests == sum(comp.requests for comp in est.components)
+    assert est.nodes > 0 and est.relationships > 0 and est.seconds > 0
+    # Subreddit listings alone are 4 requests
+    assert est.components[1].requests > 4
+    pprint(str(est))
+
+
 def test_code_uniqueness():
     obj = CommentsReplies(Submission(api_, "jpt7s7", limit=None))
     net = RedditNetwork(
@@ -47,6 +173,14 @@ def test_code_uniqueness():
 def run():
     # test_code_uniqueness()
     test_network_creation()
+    test_chunked_run()
+    test_checkpoint_resume()
+    test_pipelined_run()
+    test_parallel_run()
+    test_cypher_export()
+    test_skip_unchanged()
+    test_stream()
+    test_estimate()
 
 
 if __name__ == '__main__':
@@ -1,5 +1,6 @@
-from reddit_detective.data_models import Redditor, Subreddit
-from reddit_detective.relationships import Comments, CommentsReplies, Submissions
+from reddit_detective.data_models import Redditor, Subreddit, Submission
+from reddit_detective.moderators import Moderators
+from reddit_detective.relationships import Comments, CommentsReplies, Submissions, recency_priority
 from tests import api_
 
 """
@@ -47,10 +48,44 @@ def test_replies():
     assert replies_red.code()
 
 
+def test_budgeted_replies():
+    sub = Submission(api_, "jpt7s7", limit=None)
+    replies = CommentsReplies(sub, max_requests=5, priority=recency_priority)
+    assert replies.comments()
+    assert replies.report.requests <= 5
+    if replies.report.truncated:
+        assert replies.report.unexpanded or replies.report.unloaded
+    assert replies.code()
+
+
+def test_replied_to():
+    replies = CommentsReplies(Submission(api_, "jpt7s7", limit=None), replied_to=True)
+    merges, links = replies._merges_and_links()
+    assert any("REPLIED_TO" in code for code in links)
+
+
+def test_moderators():
+    codes = Submissions(Subreddit(api_, "learnpython", limit=2)).code()
+    mods = Moderators.from_codes(api_, codes)
+    merges, links = mods._merges_and_links()
+    assert links and all("MODERATES" in link for link in links)
+    # Moderators that are in the crawl are not merged again
+    assert not any(code.properties["username"] in mods.known for code in merges)
+    # Without profiles, unknown moderators are left out instead of being merged with their id only
+    lean = Moderators.from_codes(api_, codes, fetch_profiles=False)
+    lean_merges, lean_links = lean._merges_and_links()
+    assert not lean_merges and len(lean_links) == len(links) - len(lean.unknown)
+    # Moderator lists are cached
+    assert lean.moderators() == mods.moderators()
+
+
 def run():
     test_submissions()
     test_comments()
     test_replies()
+    test_budgeted_replies()
+    test_replied_to()
+    test_moderators()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+from reddit_detective.seen import SQLiteSeenIndex, BloomSeenIndex
+
+codes = [f'MERGE (n:Comment {{id: "c{i}"}}) SET n.fingerprint = "0";' for i in range(1000)]
+
+
+def test_sqlite_seen():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "seen.db")
+        with SQLiteSeenIndex(path) as seen:
+            seen.add(codes[:500])
+        # Persists across runs
+        with SQLiteSeenIndex(path) as seen:
+            assert seen.unseen(codes) == codes[500:]
+            assert len(seen) == 500
+
+
+def test_bloom_seen():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "seen.bloom")
+        with BloomSeenIndex(path, capacity=1000, error_rate=0.01) as seen:
+            seen.add(codes[:500])
+        with BloomSeenIndex(path) as seen:
+            # No false negatives, a few false positives at most
+            unseen = seen.unseen(codes)
+            assert all(code in codes[500:] for code in unseen)
+            assert len(unseen) > 450
+        exact = SQLiteSeenIndex(os.path.join(dir_, "seen.db"))
+        with BloomSeenIndex(capacity=1000, error_rate=0.01, exact=exact) as seen:
+            seen.add(codes[:500])
+            assert seen.unseen(codes) == codes[500:]
+
+
+def run():
+    test_sqlite_seen()
+    test_bloom_seen()
+
+
+if __name__ == '__main__':
+    run()
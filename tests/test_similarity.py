@@ -0,0 +1,36 @@
+from neo4j import GraphDatabase
+
+from reddit_detective.analytics.similarity import activity_matrix, subreddit_overlap
+from reddit_detective.analytics.snapshot import GraphSnapshot
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def test_activity_matrix():
+    matrix, names = activity_matrix(driver_)
+    assert matrix.shape[1] == len(names)
+    snapshot_matrix, _ = activity_matrix(GraphSnapshot.from_driver(driver_))
+    assert snapshot_matrix.sum() == matrix.sum()
+
+
+def test_subreddit_overlap():
+    for metric in ["jaccard", "cosine"]:
+        overlaps = subreddit_overlap(driver_, metric=metric, top_k=3)
+        assert isinstance(overlaps, dict)
+        for name, others in overlaps.items():
+            assert len(others) <= 3
+            assert all(0 < score <= 1 + 1e-9 and other != name for other, score in others)
+    approximated = subreddit_overlap(driver_, top_k=3, minhash=64)
+    assert approximated.keys() == subreddit_overlap(driver_, top_k=3).keys()
+
+
+def run():
+    test_activity_matrix()
+    test_subreddit_overlap()
+
+
+if __name__ == '__main__':
+    run()
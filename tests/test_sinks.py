@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import tempfile
+
+from reddit_detective import RedditNetwork
+from reddit_detective.analytics.metrics import interaction_score, cyborg_score_submission
+from reddit_detective.analytics.utils import get_redditors, get_reply_weights
+from reddit_detective.dumps import Dumps
+from reddit_detective.exceptions import SinkError
+from reddit_detective.sinks import MemoryGraph
+from tests.test_dumps import _SUBMISSION, _COMMENT
+
+
+def _write_dump(dir_):
+    path = os.path.join(dir_, "dump.ndjson.gz")
+    comment = dict(_COMMENT, author="BloodMooseSquirrel", author_fullname="t2_5f5f5")
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps(_SUBMISSION) + "\n")
+        f.write(json.dumps(comment) + "\n")
+    return path
+
+
+def test_memory_graph():
+    with tempfile.TemporaryDirectory() as dir_:
+        graph = MemoryGraph()
+        net = RedditNetwork(sink=graph, components=[Dumps(_write_dump(dir_), partial_nodes=True)])
+        net.run_cypher_code()
+        assert graph.node("dumpsub1")["title"]
+        assert sorted(get_redditors(graph)) == ["Anub_Rekhan", "BloodMooseSquirrel"]
+        # The comment is the only one under the submission of Anub_Rekhan, 3 seconds after it
+        assert interaction_score(graph, "Anub_Rekhan") == 1
+        assert interaction_score(graph, "BloodMooseSquirrel") == 0
+        assert cyborg_score_submission(graph, "dumpsub1") == (1, ["dumpcom1"])
+        # Writing again merges instead of duplicating
+        nodes, relationships = graph.node_count(), graph.relationship_count()
+        net.run_cypher_code()
+        assert (graph.node_count(), graph.relationship_count()) == (nodes, relationships)
+
+
+def test_replied_to():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = _write_dump(dir_)
+        reply = dict(_COMMENT, id="dumpcom2", parent_id="t1_dumpcom1", author="Anub_Rekhan", author_fullname="t2_4e4e4")
+        with gzip.open(path, "at") as f:
+            f.write(json.dumps(reply) + "\n")
+        graph = MemoryGraph()
+        net = RedditNetwork(sink=graph, components=[Dumps(path, replied_to=True, partial_nodes=True)])
+        net.run_cypher_code()
+        assert get_reply_weights(graph, "BloodMooseSquirrel") == {"Anub_Rekhan": 1}
+        assert get_reply_weights(graph, "Anub_Rekhan") == {"BloodMooseSquirrel": 1}
+        assert get_reply_weights(graph, "Anub_Rekhan", incoming=True) == {"BloodMooseSquirrel": 1}
+        # Comments are counted once, however many times they're written
+        net.run_cypher_code()
+        assert get_reply_weights(graph, "Anub_Rekhan") == {"BloodMooseSquirrel": 1}
+
+
+def test_unknown_codes():
+    graph = MemoryGraph()
+    try:
+        graph.write(['MATCH (r:Redditor {id: "x"}) SET r.karma = 1;'])
+        assert False, "MemoryGraph should not drop the codes it can't write"
+    except SinkError:
+        pass
+
+
+def run():
+    test_memory_graph()
+    test_replied_to()
+    test_unknown_codes()
+
+
+if __name__ == '__main__':
+    run()
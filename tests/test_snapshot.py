@@ -0,0 +1,38 @@
+from neo4j import GraphDatabase
+
+from reddit_detective.analytics import metrics
+from reddit_detective.analytics.snapshot import GraphSnapshot
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def test_snapshot_metrics():
+    # The test database should include the test user, submission and subreddit
+    snapshot = GraphSnapshot.from_driver(driver_)
+    assert len(snapshot) > 0
+    assert snapshot.interaction_score("Anub_Rekhan") == metrics.interaction_score(driver_, "Anub_Rekhan")
+    assert snapshot.cyborg_score_user("Anub_Rekhan")[0] == metrics.cyborg_score_user(driver_, "Anub_Rekhan")[0]
+    assert snapshot.cyborg_score_submission("hfulq4")[0] == metrics.cyborg_score_submission(driver_, "hfulq4")[0]
+    assert snapshot.cyborg_score_subreddit("Python")[0] == metrics.cyborg_score_subreddit(driver_, "Python")[0]
+    assert len(snapshot.interaction_scores()) == len(snapshot.ids["Redditor"])
+
+
+def test_snapshot_reply_graph():
+    snapshot = GraphSnapshot.from_driver(driver_)
+    in_degree, out_degree = snapshot.degrees()
+    assert in_degree.sum() == out_degree.sum()
+    ranks = snapshot.pagerank()
+    assert abs(ranks.sum() - 1) < 1e-6
+    assert 0 <= snapshot.reciprocity() <= 1
+
+
+def run():
+    test_snapshot_metrics()
+    test_snapshot_reply_graph()
+
+
+if __name__ == '__main__':
+    run()
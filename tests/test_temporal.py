@@ -0,0 +1,42 @@
+from neo4j import GraphDatabase
+
+from reddit_detective.analytics.snapshot import GraphSnapshot
+from reddit_detective.analytics.temporal import activity_profiles
+
+driver_ = GraphDatabase.driver(
+    "bolt://localhost:7687",
+    auth=("neo4j", "testing")
+)
+
+
+def test_histograms():
+    for by in ["Subreddit", "Redditor"]:
+        profiles = activity_profiles(driver_, by=by)
+        assert profiles.hour_of_day().shape == (len(profiles), 24)
+        assert (profiles.hour_of_day().sum(axis=1) == profiles.counts).all()
+        assert (profiles.day_of_week().sum(axis=1) == profiles.counts).all()
+        timeline, _ = profiles.timeline(bin_seconds=3600)
+        assert timeline.sum() == profiles.counts.sum()
+        snapshot_profiles = activity_profiles(GraphSnapshot.from_driver(driver_), by=by)
+        assert snapshot_profiles.counts.sum() == profiles.counts.sum()
+
+
+def test_bursts_and_gaps():
+    profiles = activity_profiles(driver_, by="Subreddit")
+    peak, start, bursting = profiles.bursts(window=3600, factor=5, min_items=5)
+    assert (peak <= profiles.counts).all()
+    assert (peak == profiles.rolling_max(3600)).all()
+    assert (peak[bursting] >= 5).all()
+    gaps = profiles.gap_histogram()
+    assert (gaps.sum(axis=1) == (profiles.counts - 1).clip(0)).all()
+    medians = profiles.median_gaps()
+    assert (medians[profiles.counts > 1] >= 0).all()
+
+
+def run():
+    test_histograms()
+    test_bursts_and_gaps()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+from reddit_detective.data_models import _merge_code
+from reddit_detective.text_store import TextStore
+
+codes = [_merge_code(["Comment"], {"id": f"c{i}", "text": f"comment number {i % 10} " * 20}) for i in range(100)]
+
+
+def test_text_store():
+    with tempfile.TemporaryDirectory() as dir_:
+        path = os.path.join(dir_, "texts.db")
+        with TextStore(path, preview=10) as texts:
+            offloaded = texts.offload(codes)
+            # Same texts are stored once
+            assert len(texts) == 10
+        with TextStore(path, preview=10) as texts:
+            props = offloaded[3].properties
+            assert "text" not in props
+            assert props["text_length"] == len(codes[3].properties["text"])
+            assert props["text_preview"] == codes[3].properties["text"][:10]
+            assert texts.resolve(props) == codes[3].properties
+
+
+def run():
+    test_text_store()
+
+
+if __name__ == '__main__':
+    run()